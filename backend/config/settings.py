@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,12 +54,56 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# SQLite connection profiles, picked with the DATABASE_PROFILE environment
+# variable. 'production' (the default) is tuned for uploads running
+# alongside dashboard reads:
+# - WAL journaling, so readers see the last commit instead of waiting on (or
+#   failing with "database is locked" behind) an upload's write transaction;
+# - synchronous=NORMAL, which is durable in WAL mode except for the last
+#   commits before a power loss, plus a 64 MB page cache, 256 MB of mmap
+#   and in-memory temp tables;
+# - IMMEDIATE transactions and a 30 s busy timeout, so concurrent writers
+#   queue for the write lock rather than failing on a lock upgrade. An
+#   ingest commits chunk by chunk (core.ingest), so other writes wait for
+#   at most one INGEST_CHUNK_SIZE insert, or for its anomaly flagging and
+#   final trend rollup. Those two scale with the upload; on uploads of many
+#   millions of rows they can outlast the timeout, and a write queued behind
+#   them fails with "database is locked";
+# - connections kept for 10 minutes rather than opened per request.
+# 'basic' is Django's defaults. manage.py bench_sqlite compares the two.
+DATABASE_PROFILES = {
+    'basic': {},
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 30,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA temp_store=MEMORY'
+            ),
+        },
+    },
+}
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'production')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
     }
 }
+# Persistent connections pay off in a WSGI worker's long-lived threads.
+# Under ASGI, Django runs each request's sync code on a thread of its own,
+# which would leave its connection open behind it, so config/asgi.py sets
+# this to 0.
+if 'DATABASE_CONN_MAX_AGE' in os.environ:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ['DATABASE_CONN_MAX_AGE'])
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -82,13 +127,116 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.auth.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': ['rest_framework.filters.SearchFilter', 'rest_framework.filters.OrderingFilter'],
-}
\ No newline at end of file
+}
+
+# Token -> user lookups cached per process by core.auth: entries, and
+# seconds an entry is trusted. Saving or deleting a user, or logging out,
+# drops that user's entries in the process it happens in; other processes
+# notice within TOKEN_CACHE_TTL. Set either to 0 to disable the cache.
+TOKEN_CACHE_SIZE = 1_000
+TOKEN_CACHE_TTL = 60
+
+# Upload ingestion: rows parsed per pandas chunk, and rows per INSERT batch.
+INGEST_CHUNK_SIZE = 50_000
+INGEST_BATCH_SIZE = 5_000
+
+# Rows kept in the uniform sample that ingest-time quantiles come from.
+# Datasets up to this size get exact quantiles.
+STATS_SAMPLE_SIZE = 200_000
+
+# Outlier rules applied per type at ingest (core.anomalies): readings more
+# than ANOMALY_ZSCORE standard deviations from their type's mean, and
+# readings beyond ANOMALY_IQR_FACTOR * IQR outside its quartiles.
+ANOMALY_ZSCORE = 3.0
+ANOMALY_IQR_FACTOR = 1.5
+
+# Uploads are spooled to disk and ingested on a local thread pool. SQLite
+# allows one writer at a time, so more workers mostly just queue on the lock.
+# Set INGEST_ASYNC = False to ingest inline (e.g. in tests).
+INGEST_ASYNC = True
+INGEST_WORKERS = 1
+INGEST_SPOOL_DIR = BASE_DIR / 'media' / 'uploads'
+
+# Applied on the worker pool after every upload, and by `manage.py
+# apply_retention`. A dataset is removed once it breaks any limit; None
+# disables a limit. The newest dataset is always kept.
+RETENTION_POLICY = {
+    'keep_last': 5,
+    'max_age_days': None,
+    'max_total_rows': None,
+}
+
+# Where aggregates and charts read record columns from. Record rows
+# are always kept in the database; 'core.storage.ArrowRecordStore' also
+# writes a memory-mapped Arrow file per dataset under RECORD_STORE_DIR.
+RECORD_STORE = 'core.storage.ORMRecordStore'
+RECORD_STORE_DIR = BASE_DIR / 'media' / 'records'
+
+# Response cache (core.cache): an in-process LRU bounded by the pickled
+# bytes it holds. Entries are invalidated explicitly on upload and on
+# retention. Retention run from a separate process (manage.py
+# apply_retention) can only reach a shared backend - point this at a
+# FileBasedCache (or Redis) directory for that; in-process entries otherwise
+# last until RESPONSE_CACHE_TIMEOUT.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.BoundedLocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5_000,
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
+    }
+}
+
+# Seconds to cache history and summary responses.
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Full PDF reports (core.reports) are drawn in a process pool and kept
+# under REPORT_DIR until their dataset is removed. Set REPORT_ASYNC = False
+# to draw them inline on the request instead (e.g. in tests).
+REPORT_ASYNC = True
+REPORT_WORKERS = 2
+REPORT_DIR = BASE_DIR / 'media' / 'reports'
+# Rows listed in a report's records section; reportlab holds every page in
+# memory until the PDF is saved. Larger datasets get a note instead.
+REPORT_MAX_RECORDS = 50_000
+# Seconds after which an untouched render lock counts as abandoned.
+REPORT_LOCK_TIMEOUT = 10 * 60
+
+# Seconds to cache /api/dataset/<id>/aggregate/ results (None = forever).
+AGGREGATE_CACHE_TIMEOUT = 60 * 60
+
+# /api/dataset/<id>/scatter/ payload bounds: sampled points, and grid
+# cells per axis in bin mode.
+SCATTER_DEFAULT_POINTS = 2_000
+SCATTER_MAX_POINTS = 20_000
+SCATTER_DEFAULT_BINS = 50
+SCATTER_MAX_BINS = 256
+
+HISTOGRAM_DEFAULT_BINS = 10
+HISTOGRAM_MAX_BINS = 500
+TOP_N_DEFAULT = 5
+TOP_N_MAX = 100
+
+# Rows per page of the cursor-paginated record listing, and the largest
+# ?page_size= it accepts. Pages are one index seek each, so a large default
+# costs no more per row than a small one and saves round trips.
+RECORDS_PAGE_SIZE = 1_000
+RECORDS_MAX_PAGE_SIZE = 10_000
+
+# Rows fetched per database round trip (and encoded per block) when
+# streaming /api/dataset/<id>/export/.
+EXPORT_CHUNK_SIZE = 2_000
@@ -0,0 +1,95 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import cache as response_cache
+from .cache import dataset_namespace
+from .models import Dataset
+from .stats import STATS_VERSION
+from .storage import AGGREGATES, GROUP_FIELDS, NUMERIC_FIELDS, metric_name, record_store
+
+# Aggregates that the ingest-time stats (core.stats) already hold exactly.
+STATS_AGGREGATES = {'count', 'mean', 'min', 'max', 'std'}
+
+
+class AggregateQueryError(ValueError):
+    pass
+
+
+def parse_metrics(param):
+    """
+    Parse ``mean:flowrate,max:pressure,count`` into ``[(func, field), ...]``.
+    A bare ``count`` counts records.
+    """
+    if not param:
+        raise AggregateQueryError('metrics is required, e.g. metrics=mean:flowrate,max:pressure')
+    metrics = []
+    for item in param.split(','):
+        func, _, field = item.strip().partition(':')
+        if func not in AGGREGATES:
+            raise AggregateQueryError(f'Unknown aggregate "{func}". Choose from: {sorted(AGGREGATES)}')
+        if func == 'count' and not field:
+            field = None
+        elif field not in NUMERIC_FIELDS:
+            raise AggregateQueryError(f'Unknown field "{field}". Choose from: {NUMERIC_FIELDS}')
+        if (func, field) not in metrics:
+            metrics.append((func, field))
+    return metrics
+
+
+def parse_group_by(param):
+    if not param:
+        return None
+    if param not in GROUP_FIELDS:
+        raise AggregateQueryError(f'Cannot group by "{param}". Choose from: {GROUP_FIELDS}')
+    return param
+
+
+def _from_stats(stats, group_by, metrics):
+    def row(entry):
+        return {
+            metric_name(func, field): entry['count'] if not field else entry[field][func]
+            for func, field in metrics
+        }
+
+    if group_by is None:
+        return [row({'count': stats['count'], **stats['global']})]
+    return [{'type': type_, **row(stats['by_type'][type_])} for type_ in sorted(stats['by_type'])]
+
+
+def aggregate(dataset_id, group_by, metrics):
+    """
+    Aggregate a dataset's records, cached per dataset and query. Datasets
+    never change once ingested, so entries only go stale when one is deleted
+    (retention invalidates them).
+
+    Per-type or global count/mean/min/max/std are read from the stats
+    computed at ingest; anything else scans the record store.
+    """
+    return response_cache.get_or_set(
+        dataset_namespace(dataset_id), 'aggregate', _params(group_by, metrics),
+        lambda: _compute(dataset_id, group_by, metrics), settings.AGGREGATE_CACHE_TIMEOUT,
+    )
+
+
+async def aaggregate(dataset_id, group_by, metrics):
+    """aggregate() for async views; a miss is computed on a worker thread."""
+    return await response_cache.aget_or_set(
+        dataset_namespace(dataset_id), 'aggregate', _params(group_by, metrics),
+        lambda: sync_to_async(_compute)(dataset_id, group_by, metrics),
+        settings.AGGREGATE_CACHE_TIMEOUT,
+    )
+
+
+def _params(group_by, metrics):
+    return [
+        ('group_by', group_by or ''),
+        ('metrics', ','.join(f'{func}:{field}' for func, field in sorted(metrics, key=str))),
+    ]
+
+
+def _compute(dataset_id, group_by, metrics):
+    if group_by in (None, 'type') and all(func in STATS_AGGREGATES for func, _ in metrics):
+        dataset = Dataset.objects.only('stats', 'stats_version').get(pk=dataset_id)
+        if dataset.stats_version == STATS_VERSION and dataset.stats.get('count'):
+            return _from_stats(dataset.stats, group_by, metrics)
+    return record_store.aggregate(dataset_id, group_by, metrics)
@@ -0,0 +1,105 @@
+"""
+Outlier flags, set at ingest.
+
+Each record gets a small bitmask in ``EquipmentRecord.anomaly``, one bit per
+(field, method) rule in ``RULES``. Both methods compare a reading against
+its own type's distribution: the z-score rule against mean +/- k * std, the
+IQR rule against Tukey's fences (q1 - k * IQR, q3 + k * IQR). The per-type
+moments and quartiles come from the stats the ingest has just computed
+(core.stats), so the bounds for every type are one vectorized step over
+that table, and the flags are written with one set-based UPDATE per type
+that only touches the rows outside some bound. Quartiles are exact up to
+STATS_SAMPLE_SIZE rows and sampled beyond that.
+"""
+from collections import Counter
+
+import pandas as pd
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import EquipmentRecord
+
+FIELDS = ['pressure', 'temperature']
+METHODS = ['zscore', 'iqr']
+# (field, method) -> flag bit
+RULES = {(field, method): 1 << i for i, (field, method) in enumerate(
+    (field, method) for field in FIELDS for method in METHODS
+)}
+
+
+def rule_name(field, method):
+    return f'{field}_{method}'
+
+
+def flag_names(mask):
+    return [rule_name(field, method) for (field, method), bit in RULES.items() if mask & bit]
+
+
+def bounds(stats):
+    """
+    ``{type: {(field, method): (low, high)}}`` from detailed stats. Rules a
+    type has no spread for (a single record, or no quartiles) are left out.
+    """
+    by_type = stats.get('by_type', {})
+    if not by_type:
+        return {}
+    z, k = settings.ANOMALY_ZSCORE, settings.ANOMALY_IQR_FACTOR
+    limits = {}
+    for field in FIELDS:
+        frame = pd.DataFrame.from_dict({type_: entry[field] for type_, entry in by_type.items()}, orient='index')
+        frame = frame[['mean', 'std', 'p25', 'p75']].astype('float64')
+        iqr = frame['p75'] - frame['p25']
+        limits[(field, 'zscore')] = pd.DataFrame({
+            'low': frame['mean'] - z * frame['std'], 'high': frame['mean'] + z * frame['std'],
+        })
+        limits[(field, 'iqr')] = pd.DataFrame({'low': frame['p25'] - k * iqr, 'high': frame['p75'] + k * iqr})
+
+    result = {type_: {} for type_ in by_type}
+    for rule, frame in limits.items():
+        for type_, low, high in frame.dropna().itertuples():
+            result[type_][rule] = (low, high)
+    return result
+
+
+def flag_anomalies(dataset_id, stats):
+    """Set the anomaly flags of a dataset's records; returns count_anomalies()."""
+    records = EquipmentRecord.objects.filter(dataset_id=dataset_id)
+    # Clears earlier flags when a dataset is re-flagged.
+    records.filter(anomaly__gt=0).update(anomaly=0)
+    for type_, rules in bounds(stats).items():
+        outside = {
+            rule: Q(**{f'{rule[0]}__lt': low}) | Q(**{f'{rule[0]}__gt': high})
+            for rule, (low, high) in rules.items()
+        }
+        if not outside:
+            continue
+        mask = sum(
+            Case(When(condition, then=Value(RULES[rule])), default=Value(0), output_field=IntegerField())
+            for rule, condition in outside.items()
+        )
+        any_rule = Q()
+        for condition in outside.values():
+            any_rule |= condition
+        records.filter(type=type_).filter(any_rule).update(anomaly=mask)
+    return count_anomalies(dataset_id)
+
+
+def count_anomalies(dataset_id):
+    """Flagged records in total, per type and per rule, for summary_stats."""
+    # Flagged rows are few; tallying them here keeps the scan on the partial
+    # index, where a GROUP BY would have SQLite walk a (dataset, type) one.
+    rows = Counter(
+        EquipmentRecord.objects.filter(dataset_id=dataset_id, anomaly__gt=0).values_list('type', 'anomaly')
+    )
+    counts = {
+        'records': 0,
+        'by_type': {},
+        'by_rule': {rule_name(*rule): 0 for rule in RULES},
+        'rules': {'zscore': settings.ANOMALY_ZSCORE, 'iqr': settings.ANOMALY_IQR_FACTOR},
+    }
+    for (type_, mask), n in sorted(rows.items()):
+        counts['records'] += n
+        counts['by_type'][type_] = counts['by_type'].get(type_, 0) + n
+        for name in flag_names(mask):
+            counts['by_rule'][name] += n
+    return counts
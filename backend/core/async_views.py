@@ -0,0 +1,217 @@
+"""
+Async versions of the read endpoints a dashboard polls, under /api/async/.
+
+They return the same JSON, ETags and 304s as their synchronous
+counterparts, with page links pointing back at the async endpoint, and
+share their response cache entries (history pages apart, since their links
+differ). The querysets, filters and cursor paginator are the DRF viewsets'
+own, so filtering, ordering and cursors behave identically. Queries go
+through the async ORM and the response cache through its async API, so
+nothing here blocks the event loop.
+
+They are for deployments that have to run ASGI, not a faster way to serve
+the API: ``manage.py bench_asgi`` has them on par with the sync views
+under ASGI and well behind a threaded WSGI worker, warm or cold cache, at
+any concurrency. Under ASGI every request still takes about 18 thread
+hops (each hook of the sync-capable middleware, the request signals and
+each query), and SQLite queries never wait on a network, so there is no
+waiting for the event loop to overlap. Serve the API over WSGI where there
+is a choice.
+"""
+from functools import wraps
+from math import ceil
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import cache as response_cache
+from .aggregates import AggregateQueryError, aaggregate, parse_group_by, parse_metrics
+from .auth import aauthenticate
+from .cache import dataset_namespace
+from .conditional import HISTORY_STATE, dataset_tag, history_tag
+from .filters import parse_filters
+from .models import Dataset
+from .renderers import FastJSONRenderer
+from .serializers import DATASET_VALUES, RECORD_VALUES, dataset_rows
+from .views import DatasetDetailViewSet, HistoryViewSet
+
+NO_DATASET = 'No Dataset matches the given query.'
+
+
+def _json(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def token_required(view):
+    """Token authentication and DRF-style error responses for an async view."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await aauthenticate(request)
+            if user is None:
+                raise NotAuthenticated()
+            request.user = user
+            return await view(request, *args, **kwargs)
+        except APIException as e:
+            detail = e.detail if isinstance(e.detail, (dict, list)) else {'detail': e.detail}
+            response = _json(detail, e.status_code)
+            if e.status_code == 401:
+                response['WWW-Authenticate'] = 'Token'
+            return response
+    return wrapper
+
+
+async def _conditional(request, etag, last_modified, build):
+    """What the sync views get from django.views.decorators.http.condition."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await build()
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+async def _uploaded(dataset_pk):
+    return await Dataset.objects.filter(pk=dataset_pk).values_list('upload_timestamp', flat=True).afirst()
+
+
+def _viewset(cls, request, **kwargs):
+    """A DRF viewset instance, for its (lazy) queryset, filters and paginator."""
+    return cls(request=Request(request), args=(), kwargs=kwargs, format_kwarg=None, action='list')
+
+
+@require_GET
+@token_required
+async def history(request):
+    """GET /api/async/history/, as HistoryViewSet.list."""
+    tag = history_tag(await Dataset.objects.aaggregate(**HISTORY_STATE))
+
+    async def build():
+        view = _viewset(HistoryViewSet, request)
+
+        async def compute():
+            paginator = view.paginator
+            queryset = view.filter_queryset(view.get_queryset())
+            page_size = paginator.get_page_size(view.request)
+            count = await queryset.acount()
+            num_pages = max(1, ceil(count / page_size))
+            number = view.request.query_params.get(paginator.page_query_param, 1)
+            if number in paginator.last_page_strings:
+                number = num_pages
+            try:
+                number = int(number)
+            except ValueError:
+                raise NotFound(paginator.invalid_page_message)
+            if not 1 <= number <= num_pages:
+                raise NotFound(paginator.invalid_page_message)
+
+            offset = (number - 1) * page_size
+            rows = [row async for row in queryset.values(*DATASET_VALUES)[offset:offset + page_size]]
+            url = view.request.build_absolute_uri()
+            previous = None
+            if number > 1:
+                previous = remove_query_param(url, paginator.page_query_param) if number == 2 \
+                    else replace_query_param(url, paginator.page_query_param, number - 1)
+            return {
+                'count': count,
+                'next': replace_query_param(url, paginator.page_query_param, number + 1) if number < num_pages else None,
+                'previous': previous,
+                'results': dataset_rows(rows),
+            }
+
+        # Keyed like HistoryViewSet.list, dataset state included; the path
+        # keeps the pages (whose links point back here) apart from the sync
+        # endpoint's.
+        params = response_cache.query_params(request) + [
+            ('host', request.get_host()), ('path', request.path), ('state', tag),
+        ]
+        data = await response_cache.aget_or_set('history', 'history', params, compute, settings.RESPONSE_CACHE_TIMEOUT)
+        return _json(data)
+
+    return await _conditional(request, tag, None, build)
+
+
+@require_GET
+@token_required
+async def records(request, dataset_pk):
+    """GET /api/async/dataset/<id>/, as DatasetDetailViewSet.list (JSON only)."""
+    async def build():
+        view = _viewset(DatasetDetailViewSet, request, dataset_pk=dataset_pk)
+        paginator = view.paginator
+        queryset = view.filter_queryset(view.get_queryset())
+        if uploaded is None:
+            queryset = queryset.none()
+        rows = paginator.page_queryset(queryset.values(*RECORD_VALUES), view.request, view)
+        page = paginator.set_page([row async for row in rows])
+        data = paginator.get_paginated_response(page).data
+
+        # Count and summary exactly as in DatasetDetailViewSet.list.
+        params = view.request.query_params
+        first_page = not params.get(paginator.cursor_query_param)
+        want_count = params.get('count', '').lower() in ('1', 'true', 'yes')
+        filtered = bool(parse_filters(params))
+        if filtered and want_count:
+            data['count'] = await queryset.acount()
+        if first_page or (want_count and not filtered):
+            dataset = await Dataset.objects.only('summary_stats').filter(pk=dataset_pk).afirst()
+            if dataset is not None:
+                if not filtered:
+                    data['count'] = dataset.summary_stats.get('count', 0)
+                if first_page:
+                    data['summary'] = dataset.summary_stats
+        return _json(data)
+
+    uploaded = await _uploaded(dataset_pk)
+    if uploaded is None:
+        # No validators for a missing dataset; the listing is just empty.
+        return await build()
+    return await _conditional(request, dataset_tag(dataset_pk, uploaded), uploaded, build)
+
+
+@require_GET
+@token_required
+async def summary(request, dataset_pk):
+    """GET /api/async/dataset/<id>/summary/, as DatasetDetailViewSet.summary."""
+    async def build():
+        async def compute():
+            dataset = await Dataset.objects.only('summary_stats').filter(pk=dataset_pk).afirst()
+            if dataset is None:
+                raise NotFound(NO_DATASET)
+            return dataset.summary_stats
+
+        return _json(await response_cache.aget_or_set(
+            dataset_namespace(dataset_pk), 'summary', [], compute, settings.RESPONSE_CACHE_TIMEOUT,
+        ))
+
+    uploaded = await _uploaded(dataset_pk)
+    if uploaded is None:
+        raise NotFound(NO_DATASET)
+    return await _conditional(request, dataset_tag(dataset_pk, uploaded), uploaded, build)
+
+
+@require_GET
+@token_required
+async def aggregate(request, dataset_pk):
+    """GET /api/async/dataset/<id>/aggregate/, as DatasetDetailViewSet.aggregate."""
+    if not await Dataset.objects.filter(pk=dataset_pk).aexists():
+        raise NotFound(NO_DATASET)
+    try:
+        group_by = parse_group_by(request.GET.get('group_by'))
+        metrics = parse_metrics(request.GET.get('metrics'))
+    except AggregateQueryError as e:
+        return _json({'error': str(e)}, status=400)
+
+    return _json({
+        'dataset': int(dataset_pk),
+        'group_by': group_by,
+        'results': await aaggregate(dataset_pk, group_by, metrics),
+    })
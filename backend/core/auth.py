@@ -0,0 +1,128 @@
+"""
+Token authentication with an in-process cache of token -> user.
+
+DRF's TokenAuthentication joins authtoken_token and auth_user on every
+request, before any view code runs. CachedTokenAuthentication keeps the
+result of that lookup in a bounded LRU (TOKEN_CACHE_SIZE entries) for
+TOKEN_CACHE_TTL seconds, so a token seen recently costs a dict lookup.
+
+A user's entries are dropped when the user is saved or deleted (e.g.
+through /api/users/) and when their token is deleted (/api/logout/), by the
+signal receivers below. Those only reach the process they run in: in a
+multi-process deployment another worker keeps accepting a revoked token
+for at most TOKEN_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (expires, user, token)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def enabled(self):
+        return settings.TOKEN_CACHE_SIZE > 0 and settings.TOKEN_CACHE_TTL > 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + settings.TOKEN_CACHE_TTL, user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evict_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (_, user, _) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': settings.TOKEN_CACHE_SIZE,
+                'ttl': settings.TOKEN_CACHE_TTL,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled:
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        # Unknown or inactive tokens raise here and are never cached.
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+async def aauthenticate(request):
+    """
+    CachedTokenAuthentication for plain async views: the user named by a
+    request's ``Authorization: Token <key>`` header, None without one, and
+    AuthenticationFailed for an unknown token or an inactive user.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    key = auth[1]
+    if token_cache.enabled:
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached[0]
+    token = await Token.objects.select_related('user').filter(key=key).afirst()
+    if token is None:
+        raise AuthenticationFailed('Invalid token.')
+    if not token.user.is_active:
+        raise AuthenticationFailed('User inactive or deleted.')
+    if token_cache.enabled:
+        token_cache.set(key, token.user, token)
+    return token.user
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def _user_changed(sender, instance, **kwargs):
+    token_cache.evict_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def _token_deleted(sender, instance, **kwargs):
+    token_cache.evict_user(instance.user_id)
@@ -0,0 +1,227 @@
+"""
+Server-side cache for computed responses, on Django's cache framework.
+
+Entries are grouped in namespaces: ``history`` for the dataset list and
+``dataset:<id>`` for everything derived from one dataset (summary, report,
+aggregates, charts). Each namespace has a generation number stored in the
+cache and every key embeds it, so invalidating a namespace is one write:
+bump the generation and the old entries can no longer be reached; the LRU
+evicts them in time. Uploads invalidate ``history``; retention invalidates
+``history`` and each deleted dataset. Generations live in this process's
+cache, so history keys also embed the dataset state its ETag is built from,
+and writes made by other processes are seen too.
+
+Hits and misses are counted per endpoint in this process; see ``stats()``.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+_MISSING = object()
+
+_counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_counters_lock = threading.Lock()
+
+
+def _new_generation():
+    # Time-based, so a generation key that was evicted never comes back
+    # with a value an orphaned entry was stored under.
+    return time.time_ns()
+
+
+def generation(namespace):
+    key = f'generation:{namespace}'
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _new_generation(), None)
+        value = cache.get(key)
+    return value
+
+
+async def ageneration(namespace):
+    key = f'generation:{namespace}'
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, _new_generation(), None)
+        value = await cache.aget(key)
+    return value
+
+
+def invalidate(namespace):
+    cache.set(f'generation:{namespace}', _new_generation(), None)
+
+
+def dataset_namespace(dataset_id):
+    return f'dataset:{dataset_id}'
+
+
+def invalidate_history():
+    invalidate('history')
+
+
+def invalidate_dataset(dataset_id):
+    invalidate(dataset_namespace(dataset_id))
+
+
+def _key(namespace, generation, endpoint, params):
+    params = '&'.join(f'{key}={value}' for key, value in sorted(params))
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'{namespace}:{generation}:{endpoint}:{digest}'
+
+
+def make_key(namespace, endpoint, params=()):
+    return _key(namespace, generation(namespace), endpoint, params)
+
+
+async def amake_key(namespace, endpoint, params=()):
+    return _key(namespace, await ageneration(namespace), endpoint, params)
+
+
+def query_params(request, ignore=('format',)):
+    """A (DRF or Django) request's query string as sorted (key, value) pairs for make_key()."""
+    params = getattr(request, 'query_params', request.GET)
+    return sorted(
+        (key, value)
+        for key, values in params.lists() if key not in ignore
+        for value in values
+    )
+
+
+def get_or_set(namespace, endpoint, params, compute, timeout=DEFAULT_TIMEOUT):
+    key = make_key(namespace, endpoint, params)
+    value = cache.get(key, _MISSING)
+    hit = value is not _MISSING
+    if not hit:
+        value = compute()
+        cache.set(key, value, timeout)
+    _count(endpoint, hit)
+    return value
+
+
+async def aget_or_set(namespace, endpoint, params, compute, timeout=DEFAULT_TIMEOUT):
+    """
+    get_or_set() for async views, with ``compute`` a coroutine function.
+    The cache is called through its async API, so a backend that does I/O
+    (files, a cache server) never blocks the event loop.
+    """
+    key = await amake_key(namespace, endpoint, params)
+    value = await cache.aget(key, _MISSING)
+    hit = value is not _MISSING
+    if not hit:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    _count(endpoint, hit)
+    return value
+
+
+def _count(endpoint, hit):
+    with _counters_lock:
+        _counters[endpoint]['hits' if hit else 'misses'] += 1
+
+
+def stats():
+    with _counters_lock:
+        endpoints = {name: dict(counts) for name, counts in sorted(_counters.items())}
+    hits = sum(counts['hits'] for counts in endpoints.values())
+    misses = sum(counts['misses'] for counts in endpoints.values())
+    for counts in endpoints.values():
+        counts['hit_rate'] = round(counts['hits'] / ((counts['hits'] + counts['misses']) or 1), 4)
+    report = {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / ((hits + misses) or 1), 4),
+        'endpoints': endpoints,
+    }
+    if hasattr(cache, 'usage'):
+        report['backend'] = cache.usage()
+    return report
+
+
+def reset_stats():
+    with _counters_lock:
+        _counters.clear()
+
+
+_sizes = {}
+
+
+class BoundedLocMemCache(LocMemCache):
+    """
+    LocMemCache bounded by the bytes it holds as well as by entry count.
+
+    Values are stored pickled, so their size is known exactly. When a write
+    takes the total over ``OPTIONS['MAX_BYTES']``, least recently used
+    entries are evicted until it fits again (LocMemCache already keeps its
+    entries in LRU order). A value larger than the whole budget isn't stored.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', 64 * 1024 * 1024))
+        self._usage = _sizes.setdefault(name, {'sizes': {}, 'bytes': 0, 'evictions': 0})
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._delete(key)
+        if len(value) > self._max_bytes:
+            return
+        super()._set(key, value, timeout)
+        self._usage['sizes'][key] = len(value)
+        self._usage['bytes'] += len(value)
+        while self._usage['bytes'] > self._max_bytes:
+            lru_key, _ = self._cache.popitem()
+            self._forget(lru_key)
+            self._usage['evictions'] += 1
+
+    def _forget(self, key):
+        self._expire_info.pop(key, None)
+        self._usage['bytes'] -= self._usage['sizes'].pop(key, 0)
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            self._clear_usage()
+            super()._cull()
+            return
+        for _ in range(len(self._cache) // self._cull_frequency):
+            key, _ = self._cache.popitem()
+            self._forget(key)
+            self._usage['evictions'] += 1
+
+    def _delete(self, key):
+        deleted = super()._delete(key)
+        if deleted:
+            self._usage['bytes'] -= self._usage['sizes'].pop(key, 0)
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if key in self._cache:
+                self._usage['bytes'] += len(self._cache[key]) - self._usage['sizes'].get(key, 0)
+                self._usage['sizes'][key] = len(self._cache[key])
+        return value
+
+    def _clear_usage(self):
+        self._usage['sizes'].clear()
+        self._usage['bytes'] = 0
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._clear_usage()
+
+    def usage(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._usage['bytes'],
+                'max_bytes': self._max_bytes,
+                'max_entries': self._max_entries,
+                'evictions': self._usage['evictions'],
+            }
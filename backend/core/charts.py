@@ -0,0 +1,188 @@
+"""
+Chart data computed server-side, sized by the request rather than by the
+dataset. Every function streams the dataset through the record store in
+chunks, so memory stays flat however many records there are.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import cache as response_cache
+from .cache import dataset_namespace
+from .models import Dataset, EquipmentRecord
+from .stats import STATS_VERSION
+from .storage import NUMERIC_FIELDS, record_store
+
+
+class ChartQueryError(ValueError):
+    pass
+
+
+def parse_field(param, name, default):
+    field = param or default
+    if field not in NUMERIC_FIELDS:
+        raise ChartQueryError(f'Unknown field "{field}" for {name}. Choose from: {NUMERIC_FIELDS}')
+    return field
+
+
+def parse_int(param, name, default, maximum):
+    if param in (None, ''):
+        return default
+    try:
+        value = int(param)
+    except ValueError:
+        raise ChartQueryError(f'{name} must be an integer')
+    if value < 1:
+        raise ChartQueryError(f'{name} must be positive')
+    return min(value, maximum)
+
+
+def field_ranges(dataset, fields):
+    """(min, max) per field, from the ingest-time stats when they exist."""
+    if dataset.stats_version == STATS_VERSION and dataset.stats.get('count'):
+        return {field: (dataset.stats['global'][field]['min'], dataset.stats['global'][field]['max']) for field in fields}
+    metrics = [(func, field) for field in fields for func in ('min', 'max')]
+    row = record_store.aggregate(dataset.pk, None, metrics)[0]
+    return {field: (row[f'min_{field}'], row[f'max_{field}']) for field in fields}
+
+
+def _quotas(type_counts, max_points):
+    """
+    Split max_points across types in proportion to their size, but give
+    every type a few points so small types stay visible on the chart.
+    """
+    total = sum(type_counts.values())
+    if total <= max_points:
+        return dict(type_counts)
+    floor = max_points // (4 * len(type_counts))
+    spare = max_points - floor * len(type_counts)
+    return {
+        type_: min(count, floor + int(spare * count / total))
+        for type_, count in type_counts.items()
+    }
+
+
+def scatter_sample(dataset, x, y, max_points, size=None):
+    """
+    Stratified random sample of (x, y[, size]) points, per type.
+
+    Each type keeps the rows with the smallest random keys seen so far
+    (bottom-k), which is a uniform sample of that type. The generator is
+    seeded with the dataset id, so the same request gives the same points.
+    """
+    quotas = pd.Series(_quotas(dataset.summary_stats.get('type_distribution', {}), max_points), dtype='int64')
+    columns = list(dict.fromkeys(['type', x, y] + ([size] if size else [])))
+    rng = np.random.default_rng(dataset.pk)
+
+    sample = None
+    for chunk in record_store.iter_chunks(dataset.pk, columns):
+        chunk = chunk.assign(_key=rng.random(len(chunk)))
+        sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+        rank = sample.groupby('type', sort=False)['_key'].rank(method='first')
+        sample = sample[rank <= sample['type'].map(quotas).fillna(0)].reset_index(drop=True)
+
+    if sample is None:
+        sample = pd.DataFrame(columns=columns + ['_key'])
+    sample = sample.sort_values(['type', '_key'])
+    points = {'x': sample[x].tolist(), 'y': sample[y].tolist(), 'type': sample['type'].tolist()}
+    if size:
+        points['size'] = sample[size].tolist()
+    return {
+        'mode': 'sample',
+        'x': x,
+        'y': y,
+        'size': size,
+        'total': dataset.summary_stats.get('count', 0),
+        'returned': len(sample),
+        'points': points,
+    }
+
+
+def bin_edges(low, high, bins):
+    if low is None:
+        low, high = 0.0, 1.0
+    elif low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def scatter_bins(dataset, x, y, bins):
+    """2D density grid of x against y with ``bins`` x ``bins`` cells."""
+    ranges = field_ranges(dataset, [x, y])
+    edges = [bin_edges(*ranges[field], bins) for field in (x, y)]
+
+    counts = np.zeros((bins, bins), dtype=np.int64)
+    for chunk in record_store.iter_chunks(dataset.pk, [x, y]):
+        grid, _, _ = np.histogram2d(chunk[x].to_numpy(), chunk[y].to_numpy(), bins=edges)
+        counts += grid.astype(np.int64)
+
+    return {
+        'mode': 'bin',
+        'x': x,
+        'y': y,
+        'total': dataset.summary_stats.get('count', 0),
+        'x_edges': edges[0].tolist(),
+        'y_edges': edges[1].tolist(),
+        # counts[i][j] is the number of records in x bin i and y bin j.
+        'counts': counts.tolist(),
+    }
+
+
+def scatter(dataset_id, params):
+    x = parse_field(params.get('x'), 'x', 'flowrate')
+    y = parse_field(params.get('y'), 'y', 'pressure')
+    size = parse_field(params.get('size'), 'size', None) if params.get('size') else None
+    mode = params.get('mode') or 'sample'
+    if mode not in ('sample', 'bin'):
+        raise ChartQueryError('mode must be "sample" or "bin"')
+    max_points = parse_int(params.get('max_points'), 'max_points', settings.SCATTER_DEFAULT_POINTS, settings.SCATTER_MAX_POINTS)
+    bins = parse_int(params.get('bins'), 'bins', settings.SCATTER_DEFAULT_BINS, settings.SCATTER_MAX_BINS)
+
+    def compute():
+        dataset = Dataset.objects.only('summary_stats', 'stats', 'stats_version').get(pk=dataset_id)
+        if mode == 'bin':
+            return scatter_bins(dataset, x, y, bins)
+        return scatter_sample(dataset, x, y, max_points, size)
+
+    if mode == 'bin':
+        params = [('mode', mode), ('x', x), ('y', y), ('bins', bins)]
+    else:
+        params = [('mode', mode), ('x', x), ('y', y), ('size', size or ''), ('max_points', max_points)]
+    return response_cache.get_or_set(
+        dataset_namespace(dataset_id), 'scatter', params, compute, settings.AGGREGATE_CACHE_TIMEOUT,
+    )
+
+
+def histogram(dataset_id, params):
+    field = parse_field(params.get('field'), 'field', 'flowrate')
+    bins = parse_int(params.get('bins'), 'bins', settings.HISTOGRAM_DEFAULT_BINS, settings.HISTOGRAM_MAX_BINS)
+
+    def compute():
+        dataset = Dataset.objects.only('summary_stats', 'stats', 'stats_version').get(pk=dataset_id)
+        edges = bin_edges(*field_ranges(dataset, [field])[field], bins)
+        counts = record_store.histogram(dataset.pk, field, edges)
+        return {
+            'field': field,
+            'total': dataset.summary_stats.get('count', 0),
+            'edges': edges.tolist(),
+            'counts': counts.tolist(),
+        }
+
+    return response_cache.get_or_set(
+        dataset_namespace(dataset_id), 'histogram', [('field', field), ('bins', bins)], compute,
+        settings.AGGREGATE_CACHE_TIMEOUT,
+    )
+
+
+def extremes(dataset_id, params, descending):
+    """
+    The n records with the highest (or lowest) value of a field. Ordered by
+    the (dataset, field) index, so this reads n index entries, not the
+    whole dataset.
+    """
+    field = parse_field(params.get('field'), 'field', 'flowrate')
+    n = parse_int(params.get('n'), 'n', settings.TOP_N_DEFAULT, settings.TOP_N_MAX)
+    # Ties break on id in the same direction, which the index also covers.
+    order = [f'-{field}', '-id'] if descending else [field, 'id']
+    records = EquipmentRecord.objects.filter(dataset_id=dataset_id).order_by(*order)[:n]
+    return field, n, records
@@ -0,0 +1,166 @@
+"""
+Comparison of two datasets, e.g. snapshots of consecutive shifts.
+
+Both datasets are read from the record store as columns and matched on
+``equipment_name`` with a single pandas outer merge. A name that appears
+more than once in a dataset is paired by order of appearance (the first
+with the first, and so on). The diff is cached per pair like the other
+dataset computations, so paging through it does not redo the merge.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import cache as response_cache
+from .cache import dataset_namespace
+from .storage import NUMERIC_FIELDS, record_store
+
+STATUSES = ['changed', 'added', 'removed', 'unchanged']
+DEFAULT_STATUSES = ['changed', 'added', 'removed']
+DELTA_FIELDS = [f'{field}_delta' for field in NUMERIC_FIELDS]
+# Readings are CSV decimals; this drops float noise from b - a.
+DELTA_DECIMALS = 6
+
+FRAME_COLUMNS = ['equipment_name', 'status', 'type_a', 'type_b'] + [
+    f'{field}{suffix}' for field in NUMERIC_FIELDS for suffix in ('_a', '_b')
+]
+RESULT_COLUMNS = ['equipment_name', 'status', 'type_a', 'type_b'] + [
+    f'{field}{suffix}' for field in NUMERIC_FIELDS for suffix in ('_a', '_b', '_delta')
+]
+
+
+class CompareQueryError(ValueError):
+    pass
+
+
+def parse_statuses(param):
+    if not param:
+        return DEFAULT_STATUSES
+    statuses = [value.strip() for value in param.split(',') if value.strip()]
+    unknown = [value for value in statuses if value not in STATUSES]
+    if unknown:
+        raise CompareQueryError(f'Unknown status "{unknown[0]}". Choose from: {STATUSES}')
+    return statuses
+
+
+def parse_ordering(param):
+    """``equipment_name`` (default), or ``<field>_delta`` for the largest changes first."""
+    if not param or param == 'equipment_name':
+        return 'equipment_name'
+    if param not in DELTA_FIELDS:
+        raise CompareQueryError(f'Cannot order by "{param}". Choose from: {["equipment_name"] + DELTA_FIELDS}')
+    return param
+
+
+def _read(dataset_id):
+    frame = record_store.read(dataset_id)
+    frame['occurrence'] = frame.groupby('equipment_name', sort=False).cumcount()
+    return frame
+
+
+def diff(a, b):
+    """
+    Per-equipment rows, sorted by equipment_name: name, status, both types
+    and both readings. Deltas are left to ``rows()``/``select()`` so the
+    cached frame stays small.
+    """
+    left, right = _read(a), _read(b)
+    # Merging on integer codes is several times faster than on the strings;
+    # sorted codes also leave the result in name order.
+    codes, names = pd.factorize(pd.concat([left['equipment_name'], right['equipment_name']]), sort=True)
+    left['key'], right['key'] = codes[:len(left)], codes[len(left):]
+    merged = left.drop(columns='equipment_name').merge(
+        right.drop(columns='equipment_name'), on=['key', 'occurrence'], how='outer',
+        suffixes=('_a', '_b'), indicator=True, sort=True,
+    )
+    merged.insert(0, 'equipment_name', names.take(merged['key'].to_numpy()))
+
+    side = merged.pop('_merge')
+    changed = merged['type_a'] != merged['type_b']
+    for field in NUMERIC_FIELDS:
+        changed |= _delta(merged, field) != 0
+    merged['status'] = pd.Categorical(np.select(
+        [side == 'left_only', side == 'right_only', changed],
+        ['removed', 'added', 'changed'],
+        'unchanged',
+    ), categories=STATUSES)
+    for column in ('type_a', 'type_b'):
+        merged[column] = merged[column].astype('category')
+    return merged[FRAME_COLUMNS].reset_index(drop=True)
+
+
+def _delta(frame, field):
+    return (frame[f'{field}_b'] - frame[f'{field}_a']).round(DELTA_DECIMALS)
+
+
+def type_shifts(frame):
+    """Per-type record counts and column means on both sides, with deltas."""
+    shifts = {}
+    sides = {
+        side: frame[frame[f'type_{side}'].notna()].groupby(f'type_{side}')
+        for side in ('a', 'b')
+    }
+    counts = {side: grouped.size() for side, grouped in sides.items()}
+    means = {
+        side: grouped[[f'{field}_{side}' for field in NUMERIC_FIELDS]].mean()
+        for side, grouped in sides.items()
+    }
+    for type_ in sorted(set(counts['a'].index) | set(counts['b'].index)):
+        count_a = int(counts['a'].get(type_, 0))
+        count_b = int(counts['b'].get(type_, 0))
+        entry = {'count_a': count_a, 'count_b': count_b, 'count_delta': count_b - count_a}
+        for field in NUMERIC_FIELDS:
+            mean_a = means['a'][f'{field}_a'].get(type_) if count_a else None
+            mean_b = means['b'][f'{field}_b'].get(type_) if count_b else None
+            entry[field] = {
+                'mean_a': _plain(mean_a),
+                'mean_b': _plain(mean_b),
+                'delta': _plain(round(mean_b - mean_a, DELTA_DECIMALS)) if count_a and count_b else None,
+            }
+        shifts[type_] = entry
+    return shifts
+
+
+def compare(a, b, b_uploaded):
+    """
+    The cached comparison of datasets ``a`` and ``b``: the diff frame,
+    per-status counts and per-type shifts. ``b``'s upload time is part of
+    the key since only ``a``'s namespace is invalidated with it.
+    """
+    def compute():
+        frame = diff(a, b)
+        counts = frame['status'].value_counts()
+        return {
+            'frame': frame,
+            'summary': {status: int(counts.get(status, 0)) for status in STATUSES},
+            'type_shifts': type_shifts(frame),
+        }
+
+    params = [('b', b), ('b_uploaded', b_uploaded.timestamp())]
+    return response_cache.get_or_set(
+        dataset_namespace(a), 'compare', params, compute, settings.AGGREGATE_CACHE_TIMEOUT,
+    )
+
+
+def select(frame, statuses, ordering):
+    """Rows of the diff with one of ``statuses``, in ``ordering``."""
+    if set(statuses) != set(STATUSES):
+        frame = frame[frame['status'].isin(statuses)]
+    if ordering != 'equipment_name':
+        # Largest change first; added/removed units (no delta) go last.
+        key = _delta(frame, ordering[:-len('_delta')]).abs()
+        frame = frame.iloc[np.argsort(-key.fillna(-1).to_numpy(), kind='stable')]
+    return frame
+
+
+def _plain(value):
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def rows(frame):
+    """A slice of the diff as JSON-ready dicts (missing values as None)."""
+    frame = frame.assign(**{f'{field}_delta': _delta(frame, field) for field in NUMERIC_FIELDS})[RESULT_COLUMNS]
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
@@ -0,0 +1,90 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) for dataset resources.
+
+A dataset and its records never change once ingested, so the dataset id and
+upload timestamp identify every representation of it. Views decorated here
+look those up with a single primary-key query and answer a matching
+If-None-Match (or If-Modified-Since) with 304 before doing any real work.
+"""
+from django.db.models import Count, Max
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from .models import Dataset
+from .reports import cached_report
+
+
+def _format(request):
+    # JSON, Arrow and the browsable API share URLs; each gets its own tag.
+    renderer = getattr(request, 'accepted_renderer', None)
+    return getattr(renderer, 'format', None) or 'json'
+
+
+def dataset_last_modified(request, dataset_pk=None, **kwargs):
+    if not hasattr(request, '_dataset_uploaded'):
+        request._dataset_uploaded = (
+            Dataset.objects.filter(pk=dataset_pk).values_list('upload_timestamp', flat=True).first()
+        )
+    return request._dataset_uploaded
+
+
+def dataset_tag(dataset_pk, uploaded, fmt='json'):
+    # The timestamp tells a dataset apart from a later one that reuses its id.
+    return f'"dataset-{dataset_pk}-{uploaded.timestamp():.6f}-{fmt}"'
+
+
+def dataset_etag(request, dataset_pk=None, **kwargs):
+    uploaded = dataset_last_modified(request, dataset_pk)
+    if uploaded is None:
+        return None
+    return dataset_tag(dataset_pk, uploaded, _format(request))
+
+
+def report_etag(request, dataset_pk=None, **kwargs):
+    # Only a finished report has a representation to validate; the 202
+    # progress responses in between must not be cached as one.
+    uploaded = dataset_last_modified(request, dataset_pk)
+    if uploaded is None or not cached_report(dataset_pk, uploaded):
+        return None
+    return dataset_etag(request, dataset_pk)
+
+
+def report_last_modified(request, dataset_pk=None, **kwargs):
+    return dataset_last_modified(request, dataset_pk) if report_etag(request, dataset_pk) else None
+
+
+HISTORY_STATE = {'n': Count('id'), 'last_id': Max('id'), 'last_upload': Max('upload_timestamp')}
+
+
+def history_tag(state, fmt='json'):
+    """``state`` is Dataset.objects.aggregate(**HISTORY_STATE)."""
+    last_upload = state['last_upload'].timestamp() if state['last_upload'] else 0
+    return f'"history-{state["n"]}-{state["last_id"] or 0}-{last_upload:.6f}-{fmt}"'
+
+
+def history_state(request):
+    """The request's HISTORY_STATE, read once for both the ETag and the response cache key."""
+    if not hasattr(request, '_history_state'):
+        request._history_state = Dataset.objects.aggregate(**HISTORY_STATE)
+    return request._history_state
+
+
+def history_etag(request, *args, **kwargs):
+    """Changes whenever a dataset is added or removed."""
+    return history_tag(history_state(request), _format(request))
+
+
+dataset_conditional = method_decorator([
+    vary_on_headers('Accept'),
+    condition(etag_func=dataset_etag, last_modified_func=dataset_last_modified),
+])
+
+report_conditional = method_decorator(
+    condition(etag_func=report_etag, last_modified_func=report_last_modified),
+)
+
+history_conditional = method_decorator([
+    vary_on_headers('Accept'),
+    condition(etag_func=history_etag),
+])
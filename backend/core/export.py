@@ -0,0 +1,127 @@
+"""
+Streaming export of a dataset's records.
+
+Rows come off a server-side iterator a chunk at a time and each chunk is
+encoded into one block of text, so memory stays flat whatever the dataset
+size and the first bytes go out as soon as the first chunk is read.
+
+A whole dataset exported as CSV (no filters, upload order) is read from
+the record store instead (core.storage): with ArrowRecordStore, straight
+off the memory-mapped file. NDJSON and Arrow exports carry the record
+ids, which only the database holds, so they always read the table.
+"""
+import csv
+import io
+import json
+
+import pyarrow as pa
+from django.conf import settings
+
+from .ingest import CSV_FIELDS
+from .storage import record_store
+
+EXPORT_FIELDS = ['id', 'equipment_name', 'type', 'flowrate', 'pressure', 'temperature']
+# CSV exports use the upload headers, so an export can be uploaded again.
+CSV_HEADER = list(CSV_FIELDS)
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+# Numeric columns as float64 buffers a client can wrap in NumPy without a
+# copy; type is dictionary-encoded (a handful of categories).
+ARROW_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('equipment_name', pa.string()),
+    ('type', pa.dictionary(pa.int32(), pa.string())),
+    ('flowrate', pa.float64()),
+    ('pressure', pa.float64()),
+    ('temperature', pa.float64()),
+])
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an Accept-Encoding header lists gzip with a non-zero q, e.g.
+    ``gzip, deflate`` but not ``gzip;q=0`` or ``x-gzip-not``.
+    """
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        if name.lower() != 'gzip':
+            continue
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def iter_rows(queryset, fields):
+    rows = queryset.values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == settings.EXPORT_CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue().encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+
+
+def stream_csv(queryset):
+    return _csv(iter_rows(queryset, [CSV_FIELDS[header] for header in CSV_HEADER]))
+
+
+def stream_dataset_csv(dataset_id):
+    """stream_csv() of all of a dataset's records, in upload order, from the record store."""
+    fields = [CSV_FIELDS[header] for header in CSV_HEADER]
+    frames = record_store.iter_chunks(dataset_id, fields, settings.EXPORT_CHUNK_SIZE)
+    return _csv(zip(*(frame[field].tolist() for field in fields)) for frame in frames)
+
+
+def stream_ndjson(queryset):
+    for batch in iter_rows(queryset, EXPORT_FIELDS):
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in batch).encode()
+
+
+def record_batch(rows):
+    """Rows of EXPORT_FIELDS values as one Arrow record batch."""
+    columns = list(zip(*rows)) or [[] for _ in EXPORT_FIELDS]
+    arrays = []
+    for field, values in zip(ARROW_SCHEMA, columns):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.record_batch(arrays, schema=ARROW_SCHEMA)
+
+
+def arrow_stream(batches, metadata=None):
+    """Write batches as an Arrow IPC stream, yielding bytes as they are ready."""
+    schema = ARROW_SCHEMA.with_metadata(metadata) if metadata else ARROW_SCHEMA
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+def stream_arrow(queryset):
+    return arrow_stream(record_batch(batch) for batch in iter_rows(queryset, EXPORT_FIELDS))
@@ -0,0 +1,45 @@
+"""
+Filtering for the dataset records endpoint.
+
+    ?type=Pump                      type equality (comma-separate for several)
+    ?pressure__gt=8                 numeric ranges: __gt, __gte, __lt, __lte
+    ?flowrate__gte=10&flowrate__lte=50
+    ?ordering=-pressure             id or a numeric field; - for descending
+
+Every combination maps onto an index: (dataset, <field>) for a range or
+ordering on its own, (dataset, type, <field>) once a type is fixed too, and
+(dataset, type) for type with the default id order.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .storage import NUMERIC_FIELDS
+
+RANGE_LOOKUPS = ['gt', 'gte', 'lt', 'lte']
+ORDERING_FIELDS = ['id'] + NUMERIC_FIELDS
+
+
+def parse_filters(params):
+    """Turn query params into ORM lookups; raises ValidationError on bad input."""
+    lookups = {}
+    types = [value for value in params.get('type', '').split(',') if value]
+    if len(types) == 1:
+        lookups['type'] = types[0]
+    elif types:
+        lookups['type__in'] = types
+
+    for field in NUMERIC_FIELDS:
+        for lookup in RANGE_LOOKUPS:
+            param = f'{field}__{lookup}'
+            if params.get(param) in (None, ''):
+                continue
+            try:
+                lookups[param] = float(params[param])
+            except ValueError:
+                raise ValidationError({'error': f'{param} must be a number'})
+    return lookups
+
+
+class RecordFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        return queryset.filter(**parse_filters(request.query_params))
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Dataset, EquipmentRecord
+from .stats import STATS_VERSION, StatsAccumulator
+from .storage import COLUMNS, record_store
+from .trends import record_trend
+from .anomalies import flag_anomalies
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+TEXT_COLUMNS = ['Equipment Name', 'Type']
+RECORD_FIELDS = ['dataset', 'equipment_name', 'type', 'flowrate', 'pressure', 'temperature']
+
+# CSV header -> record field
+CSV_FIELDS = {
+    'Equipment Name': 'equipment_name',
+    'Type': 'type',
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+}
+
+
+class IngestError(Exception):
+    """Raised when an uploaded CSV fails validation. Maps to a 400 response."""
+
+
+class DuplicateUpload(Exception):
+    """Raised by ingest_csv when another dataset already holds the upload's content hash."""
+
+    def __init__(self, dataset):
+        super().__init__(f'Identical to dataset {dataset.pk}')
+        self.dataset = dataset
+
+
+def validate_chunk(chunk):
+    missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise IngestError(f'Missing columns. Required: {REQUIRED_COLUMNS}')
+
+    for col in TEXT_COLUMNS:
+        if chunk[col].isnull().any():
+            raise IngestError(f'Column {col} contains empty values')
+        chunk[col] = chunk[col].astype(str)
+
+    # numeric validation
+    for col in NUMERIC_COLUMNS:
+        numeric = pd.to_numeric(chunk[col], errors='coerce')
+        # to_numeric reads "inf" and "-inf" as numbers; they can't be
+        # averaged into the summary or stored in its JSON.
+        if not np.isfinite(numeric).all():
+            raise IngestError(f'Column {col} contains non-numeric values')
+        chunk[col] = numeric.astype('float64')
+    return chunk.rename(columns=CSV_FIELDS)[COLUMNS]
+
+
+def insert_chunk(dataset_id, chunk):
+    """
+    Insert one validated chunk with batched executemany.
+
+    bulk_create() builds a model instance per row and re-packs its fields,
+    which costs more than the INSERT itself at upload sizes. Feeding plain
+    column tuples straight to the cursor keeps the batching but skips that.
+    """
+    opts = EquipmentRecord._meta
+    columns = [opts.get_field(name).column for name in RECORD_FIELDS]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(opts.db_table),
+        ', '.join(connection.ops.quote_name(col) for col in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    rows = list(zip(
+        [dataset_id] * len(chunk),
+        chunk['equipment_name'].tolist(),
+        chunk['type'].tolist(),
+        chunk['flowrate'].tolist(),
+        chunk['pressure'].tolist(),
+        chunk['temperature'].tolist(),
+    ))
+    batch_size = settings.INGEST_BATCH_SIZE
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def read_chunks(file, chunk_size=None):
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    try:
+        yield from pd.read_csv(
+            file,
+            chunksize=chunk_size,
+            dtype={'Equipment Name': str, 'Type': str},
+        )
+    except pd.errors.EmptyDataError:
+        raise IngestError('Uploaded file is empty')
+
+
+def validate_header(file):
+    """Check the header row up front so a wrong schema fails before queueing."""
+    try:
+        header = pd.read_csv(file, nrows=0)
+    except pd.errors.EmptyDataError:
+        raise IngestError('Uploaded file is empty')
+    finally:
+        file.seek(0)
+    validate_chunk(header)
+
+
+def ingest_csv(file, filename, chunk_size=None, progress=None, content_hash=None, replace=False):
+    """
+    Stream a CSV upload into a new Dataset.
+
+    The file is read in fixed-size chunks; every chunk is validated,
+    inserted and folded into the summary stats before the next one is
+    read, so peak memory depends on the chunk size rather than the file
+    size.
+
+    The dataset is created with ``ready=False`` and each chunk commits on
+    its own, so the SQLite write lock is held for one chunk at a time and
+    other writes (job status, tokens, user edits) queue behind a chunk
+    rather than behind the whole upload. Dataset.objects doesn't return the
+    dataset until the last step, which in one transaction rolls its records
+    up into the per-equipment trend table (core.trends), stores the stats
+    and marks it ready. If anything fails, the dataset and whatever records
+    were committed are deleted, so a bad row anywhere in the file leaves
+    nothing behind. Outliers are flagged against the finished per-type
+    stats (core.anomalies) just before that last step.
+
+    ``progress`` is called with the running row count after every chunk,
+    outside any transaction. If ``content_hash`` is already held by another
+    dataset, DuplicateUpload is raised before anything is read, and again
+    at the last step if an identical upload finished in the meantime; with
+    ``replace`` (a forced re-ingest) the hash moves to the new dataset
+    instead. Only the last step takes the hash, so of two identical uploads
+    queued together only the first is kept.
+    """
+    if content_hash and not replace:
+        existing = Dataset.objects.filter(content_hash=content_hash).first()
+        if existing:
+            raise DuplicateUpload(existing)
+
+    stats = StatsAccumulator()
+    dataset = Dataset.all_objects.create(filename=filename, ready=False)
+    writer = None
+    try:
+        writer = record_store.open_writer(dataset.pk)
+        for chunk in read_chunks(file, chunk_size):
+            chunk = validate_chunk(chunk)
+            with transaction.atomic():
+                insert_chunk(dataset.pk, chunk)
+            writer.write(chunk)
+            stats.update(chunk)
+            if progress:
+                progress(stats.count)
+
+        writer.close()
+        dataset.stats = stats.detailed()
+        dataset.summary_stats = stats.as_dict()
+        with transaction.atomic():
+            dataset.summary_stats['anomalies'] = flag_anomalies(dataset.pk, dataset.stats)
+        with transaction.atomic():
+            if content_hash:
+                existing = Dataset.objects.filter(content_hash=content_hash).first()
+                if existing and not replace:
+                    raise DuplicateUpload(existing)
+                if existing:
+                    Dataset.objects.filter(pk=existing.pk).update(content_hash=None)
+            record_trend(dataset)
+            dataset.content_hash = content_hash
+            dataset.stats_version = STATS_VERSION
+            dataset.ready = True
+            dataset.save(update_fields=['summary_stats', 'stats', 'stats_version', 'content_hash', 'ready'])
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        record_store.delete(dataset.pk)
+        # Records go in one DELETE, as in core.retention.
+        with transaction.atomic():
+            EquipmentRecord.objects.filter(dataset_id=dataset.pk).delete()
+            Dataset.all_objects.filter(pk=dataset.pk).delete()
+        raise
+    return dataset
@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import invalidate_history
+from .ingest import DuplicateUpload, IngestError, ingest_csv
+from .models import Dataset, IngestJob
+from .retention import apply_retention
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INGEST_WORKERS,
+                thread_name_prefix='ingest',
+            )
+    return _executor
+
+
+def spool_upload(file, job_id):
+    """
+    Copy the upload to disk so the worker can read it after the request ends,
+    hashing the bytes on the way through. Returns ``(path, sha256 hexdigest)``.
+    """
+    spool_dir = Path(settings.INGEST_SPOOL_DIR)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    path = spool_dir / f'job_{job_id}.csv'
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in file.chunks():
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _resolve_duplicate(job, dataset):
+    now = timezone.now()
+    _update(
+        job.pk,
+        phase=IngestJob.PHASE_DONE,
+        deduplicated=True,
+        dataset=dataset,
+        rows_processed=dataset.summary_stats.get('count', 0),
+        started_at=job.started_at or now,
+        finished_at=now,
+    )
+
+
+def submit_upload(file, user=None, force=False):
+    """
+    Queue an upload for ingestion. Unless ``force`` is set, a file whose
+    bytes match an existing dataset resolves to that dataset straight away
+    and nothing is parsed or inserted. The worker checks again before it
+    ingests, for an identical upload queued ahead of this one.
+    """
+    job = IngestJob.objects.create(
+        filename=file.name,
+        created_by=user if user and user.is_authenticated else None,
+    )
+    path, content_hash = spool_upload(file, job.pk)
+
+    existing = None if force else Dataset.objects.filter(content_hash=content_hash).first()
+    if existing:
+        _remove(path)
+        _resolve_duplicate(job, existing)
+        job.refresh_from_db()
+        return job
+
+    if settings.INGEST_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(run_job, job.pk, path, content_hash, force))
+    else:
+        run_job(job.pk, path, content_hash, force)
+        job.refresh_from_db()
+    return job
+
+
+def _update(job_id, **fields):
+    IngestJob.objects.filter(pk=job_id).update(**fields)
+
+
+_retention_pending = threading.Event()
+
+
+def schedule_retention():
+    """Queue a retention pass on the worker pool, coalescing repeat requests."""
+    if settings.INGEST_ASYNC:
+        if _retention_pending.is_set():
+            return
+        _retention_pending.set()
+        get_executor().submit(_run_retention)
+    else:
+        apply_retention()
+
+
+def _run_retention():
+    _retention_pending.clear()
+    close_old_connections()
+    try:
+        apply_retention()
+    except Exception:
+        logger.exception('Retention pass failed')
+    finally:
+        close_old_connections()
+
+
+def run_job(job_id, path, content_hash=None, force=False):
+    close_old_connections()
+    try:
+        job = IngestJob.objects.get(pk=job_id)
+        _update(job_id, phase=IngestJob.PHASE_INGESTING, started_at=timezone.now())
+
+        def progress(rows):
+            # Called between the ingest's chunk transactions, so this is a
+            # short write of its own that status polls see straight away.
+            _update(job_id, rows_processed=rows)
+
+        with open(path, 'rb') as f:
+            try:
+                dataset = ingest_csv(f, job.filename, progress=progress, content_hash=content_hash, replace=force)
+            except DuplicateUpload as e:
+                # An identical upload was ingested after this one was queued.
+                _resolve_duplicate(job, e.dataset)
+                return
+            except IntegrityError:
+                # ...or took the hash between the check and the save of the
+                # ingest's last step (databases without SQLite's IMMEDIATE
+                # transactions); the unique hash catches it.
+                existing = Dataset.objects.filter(content_hash=content_hash).first()
+                if not existing:
+                    raise
+                _resolve_duplicate(job, existing)
+                return
+
+        _update(
+            job_id,
+            phase=IngestJob.PHASE_DONE,
+            dataset=dataset,
+            rows_processed=dataset.summary_stats.get('count', 0),
+            finished_at=timezone.now(),
+        )
+        invalidate_history()
+        schedule_retention()
+    except IngestError as e:
+        _update(job_id, phase=IngestJob.PHASE_FAILED, error=str(e), finished_at=timezone.now())
+    except Exception as e:
+        logger.exception('Ingest job %s failed', job_id)
+        _update(job_id, phase=IngestJob.PHASE_FAILED, error=str(e), finished_at=timezone.now())
+    finally:
+        _remove(path)
+        if settings.INGEST_ASYNC:
+            close_old_connections()
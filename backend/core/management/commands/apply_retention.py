@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete datasets that fall outside the retention policy (settings.RETENTION_POLICY).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-last', type=int, help='Keep only the N most recent datasets.')
+        parser.add_argument('--max-age-days', type=float, help='Drop datasets uploaded more than N days ago.')
+        parser.add_argument('--max-total-rows', type=int, help='Keep the newest datasets up to N records in total.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without deleting.')
+
+    def handle(self, *args, **options):
+        report = apply_retention(
+            dry_run=options['dry_run'],
+            keep_last=options['keep_last'],
+            max_age_days=options['max_age_days'],
+            max_total_rows=options['max_total_rows'],
+        )
+        verb = 'Would remove' if report['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['datasets']} datasets / {report['records']} records "
+            f"in {report['seconds']:.3f}s"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.anomalies import flag_anomalies
+from core.cache import invalidate_dataset
+from core.models import Dataset
+from core.stats import STATS_VERSION
+
+
+class Command(BaseCommand):
+    help = ('Flag outliers for datasets ingested before anomaly flags existed, '
+            'or re-flag every dataset with --force (e.g. after changing ANOMALY_* settings).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-flag datasets that already have flags.')
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.order_by('id').only('id', 'filename', 'stats', 'stats_version', 'summary_stats')
+        if not options['force']:
+            datasets = datasets.exclude(summary_stats__has_key='anomalies')
+
+        updated = 0
+        for dataset in datasets.iterator():
+            if dataset.stats_version != STATS_VERSION:
+                self.stdout.write(self.style.WARNING(
+                    f'{dataset.pk} {dataset.filename}: stats are out of date, run backfill_stats first'
+                ))
+                continue
+            with transaction.atomic():
+                counts = flag_anomalies(dataset.pk, dataset.stats)
+                dataset.summary_stats['anomalies'] = counts
+                dataset.save(update_fields=['summary_stats'])
+            invalidate_dataset(dataset.pk)
+            updated += 1
+            self.stdout.write(f'{dataset.pk} {dataset.filename}: {counts["records"]} anomalous records')
+
+        self.stdout.write(self.style.SUCCESS(f'Flagged anomalies for {updated} datasets'))
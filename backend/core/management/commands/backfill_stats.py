@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Dataset
+from core.stats import STATS_VERSION, compute_stats
+from core.storage import record_store
+
+
+class Command(BaseCommand):
+    help = f'Compute per-type statistics (schema v{STATS_VERSION}) for datasets ingested before they existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recompute datasets that are already up to date.')
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.order_by('id').only('id', 'filename')
+        if not options['force']:
+            datasets = datasets.filter(stats_version__lt=STATS_VERSION)
+
+        updated = 0
+        for dataset in datasets.iterator():
+            stats = compute_stats(record_store.iter_chunks(dataset.pk))
+            Dataset.objects.filter(pk=dataset.pk).update(
+                stats=stats.detailed(),
+                stats_version=STATS_VERSION,
+            )
+            updated += 1
+            self.stdout.write(f'{dataset.pk} {dataset.filename}: {stats.count} records')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled stats for {updated} datasets'))
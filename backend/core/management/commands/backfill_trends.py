@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Dataset, EquipmentTrend
+from core.trends import record_trend
+
+
+class Command(BaseCommand):
+    help = 'Build per-equipment trend rows for datasets ingested before the trend table existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild datasets that already have trend rows.')
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.order_by('id').only('id', 'filename', 'upload_timestamp')
+        if not options['force']:
+            datasets = datasets.exclude(trend_points__isnull=False)
+
+        updated = 0
+        for dataset in datasets.iterator():
+            with transaction.atomic():
+                EquipmentTrend.objects.filter(dataset=dataset).delete()
+                units = record_trend(dataset)
+            updated += 1
+            self.stdout.write(f'{dataset.pk} {dataset.filename}: {units} units')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled trends for {updated} datasets'))
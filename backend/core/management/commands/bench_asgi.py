@@ -0,0 +1,199 @@
+"""
+Load test of the dashboard reads: the sync views behind a threaded WSGI
+worker and behind the ASGI handler, and the async views (/api/async/),
+at rising concurrency. ``warm`` runs are served from the response cache
+after a first pass fills it; ``cold`` runs swap in a dummy cache, so every
+request computes its response from the database.
+"""
+import asyncio
+import io
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from core.auth import token_cache
+from core.ingest import ingest_csv
+from core.management.commands.bench_sqlite import use_profile, wsgi_caller
+from core.synthetic import synthetic_csv
+
+# The dashboard's reads, with {prefix} /api or /api/async and {id} the dataset.
+READ_PATHS = [
+    '{prefix}/history/',
+    '{prefix}/dataset/{id}/summary/',
+    '{prefix}/dataset/{id}/?page_size=100',
+    '{prefix}/dataset/{id}/aggregate/?group_by=type&metrics=mean:flowrate,mean:pressure,count',
+]
+
+
+def asgi_caller(token):
+    """``call(url)`` -> (status, seconds) through Django's ASGI handler, on the running loop."""
+    application = get_asgi_application()
+    headers = [(b'host', b'localhost'), (b'authorization', f'Token {token}'.encode())]
+
+    async def call(url):
+        path, _, query = url.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        body_read = False
+        disconnected = asyncio.Event()
+        status = []
+
+        async def receive():
+            nonlocal body_read
+            if not body_read:
+                body_read = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The handler listens for a disconnect until the response is sent.
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        return status[0], time.perf_counter() - started
+
+    return call
+
+
+class Command(BaseCommand):
+    help = ('Load-test the dashboard reads in one process: the sync views through the WSGI handler '
+            'on a fixed thread pool (a threaded WSGI worker), the sync views through the ASGI handler, '
+            'and the async views (/api/async/) through the ASGI handler, at rising concurrency, '
+            'with the response cache warm and cold.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128],
+                            help='Clients issuing requests back to back.')
+        parser.add_argument('--requests', type=int, default=2_000, help='Requests per measurement.')
+        parser.add_argument('--threads', type=int, default=8, help='Threads of the WSGI worker.')
+        parser.add_argument('--rows', type=int, default=50_000, help='Rows in the dataset read.')
+        parser.add_argument('--cache', nargs='+', choices=['warm', 'cold'], default=['warm', 'cold'],
+                            help='warm: responses come from the cache; cold: every request hits the database.')
+
+    def handle(self, *args, **options):
+        original = connections.settings['default']
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']), \
+                    tempfile.TemporaryDirectory() as tmp:
+                use_profile(settings.DATABASE_PROFILE, Path(tmp) / 'bench.sqlite3')
+                call_command('migrate', verbosity=0)
+                cache.clear()
+                token_cache.clear()
+                token = Token.objects.create(user=User.objects.create_user('bench_asgi')).key
+                dataset = ingest_csv(io.BytesIO(synthetic_csv(options['rows'], seed=0)), 'bench_asgi.csv')
+                connections.close_all()
+                rows = self.run(token, dataset.pk, options)
+        finally:
+            request_logger.setLevel(level)
+            connections.close_all()
+            connections.settings['default'] = original
+            try:
+                del connections['default']
+            except AttributeError:
+                pass
+
+        self.stdout.write(
+            f'{"cache":>5} {"server":>12} {"clients":>7} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>6}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["cache"]:>5} {row["server"]:>12} {row["clients"]:>7} {row["requests_per_second"]:>8.0f} '
+                f'{row["p50_ms"]:>8.1f} {row["p99_ms"]:>8.1f} {row["errors"]:>6}'
+            )
+
+    def run(self, token, dataset_id, options):
+        def urls(prefix):
+            return [path.format(prefix=prefix, id=dataset_id) for path in READ_PATHS]
+
+        wsgi = wsgi_caller(token)
+        pool = ThreadPoolExecutor(options['threads'])
+        loop = asyncio.new_event_loop()
+
+        async def via_wsgi(url):
+            # Timed here, so waiting for a free thread counts too.
+            started = time.perf_counter()
+            status, _, _ = await loop.run_in_executor(pool, wsgi, 'get', url)
+            return status, time.perf_counter() - started
+
+        async def setup_asgi():
+            return asgi_caller(token)
+
+        asgi = loop.run_until_complete(setup_asgi())
+        servers = [
+            ('wsgi', via_wsgi, urls('/api')),
+            ('asgi sync', asgi, urls('/api')),
+            ('asgi async', asgi, urls('/api/async')),
+        ]
+        database = connections.settings['default']
+        conn_max_age = database['CONN_MAX_AGE']
+        rows = []
+        try:
+            for mode in options['cache']:
+                caches = settings.CACHES if mode == 'warm' else {
+                    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                }
+                with override_settings(CACHES=caches):
+                    for name, call, paths in servers:
+                        # As config/asgi.py does: no persistent connections under ASGI.
+                        database['CONN_MAX_AGE'] = 0 if name.startswith('asgi') else conn_max_age
+                        for clients in options['concurrency']:
+                            # A first pass fills the token cache and, if warm, the response cache.
+                            loop.run_until_complete(load(call, paths, clients, len(paths) * clients))
+                            rows.append({'cache': mode, 'server': name, 'clients': clients, **loop.run_until_complete(
+                                load(call, paths, clients, options['requests'])
+                            )})
+        finally:
+            database['CONN_MAX_AGE'] = conn_max_age
+            pool.shutdown()
+            loop.close()
+        return rows
+
+
+async def load(call, paths, clients, total):
+    """``clients`` concurrent loops sharing ``total`` requests over ``paths``."""
+    latencies, errors = [], 0
+    issued = 0
+
+    async def client():
+        nonlocal issued, errors
+        while issued < total:
+            url = paths[issued % len(paths)]
+            issued += 1
+            status, elapsed = await call(url)
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        'errors': errors,
+    }
@@ -0,0 +1,57 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.auth import token_cache
+from core.models import Dataset
+
+
+class Command(BaseCommand):
+    help = ('Requests per second on GET /api/dataset/<id>/summary/ with plain token authentication '
+            '(TOKEN_CACHE_TTL = 0) against the cached token lookup of core.auth.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2_000, help='Requests per run.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best is reported.')
+
+    def handle(self, *args, **options):
+        # The user, token and dataset live in a transaction that is rolled back.
+        with transaction.atomic():
+            user = User.objects.create_user('bench_auth')
+            token = Token.objects.create(user=user)
+            dataset = Dataset.objects.create(filename='bench_auth.csv', summary_stats={'total_count': 0})
+            client = Client(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+            url = f'/api/dataset/{dataset.pk}/summary/'
+            self.run(client, url, options['requests'], options['repeat'])
+            transaction.set_rollback(True)
+        token_cache.clear()
+
+    def run(self, client, url, n, repeat):
+        def measure():
+            token_cache.clear()
+            client.get(url)  # warms the response cache (and the token cache)
+            queries = []
+            # The test client's request_started handler resets the query
+            # log, so count statements as they are executed instead.
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                assert client.get(url).status_code == 200
+            best = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for _ in range(n):
+                    client.get(url)
+                best = min(best, time.perf_counter() - started)
+            return n / best, len(queries)
+
+        with override_settings(TOKEN_CACHE_TTL=0):
+            plain_rps, plain_queries = measure()
+        cached_rps, cached_queries = measure()
+
+        self.stdout.write(f'{"auth":>8} {"req/s":>8} {"ms/req":>7} {"queries/req":>12}')
+        for name, rps, queries in (('plain', plain_rps, plain_queries), ('cached', cached_rps, cached_queries)):
+            self.stdout.write(f'{name:>8} {rps:>8.0f} {1000 / rps:>7.3f} {queries:>12}')
+        self.stdout.write(f'speedup {cached_rps / plain_rps:.2f}x')
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.ingest import insert_chunk
+from core.models import Dataset, EquipmentRecord
+from core.renderers import FastJSONRenderer
+from core.serializers import RECORD_VALUES, EquipmentRecordSerializer
+from core.synthetic import synthetic_records
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = ('Time a page of records through EquipmentRecordSerializer + JSONRenderer against '
+            'the values() + FastJSONRenderer read path, and check the bytes match.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best is reported.')
+        parser.add_argument('--dataset', type=int, help='Read an existing dataset instead of synthetic records.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        # Synthetic records are inserted inside a transaction that is rolled back.
+        with transaction.atomic():
+            if options['dataset']:
+                dataset_id = options['dataset']
+                if not Dataset.objects.filter(pk=dataset_id).exists():
+                    raise CommandError(f'Dataset {dataset_id} does not exist')
+            else:
+                dataset_id = Dataset.objects.create(filename='bench_serialization.csv').pk
+                insert_chunk(dataset_id, synthetic_records(sizes[-1]))
+            self.run(dataset_id, sizes, options['repeat'])
+            transaction.set_rollback(True)
+
+    def run(self, dataset_id, sizes, repeat):
+        records = EquipmentRecord.objects.filter(dataset_id=dataset_id).order_by('id')
+
+        def serializer_path(n):
+            data = EquipmentRecordSerializer(records[:n], many=True).data
+            return JSONRenderer().render({'results': data})
+
+        def values_path(n):
+            return FastJSONRenderer().render({'results': list(records.values(*RECORD_VALUES)[:n])})
+
+        self.stdout.write(f'{"rows":>8} {"serializer ms":>14} {"values ms":>10} {"speedup":>8}  identical')
+        for n in sizes:
+            slow, expected = best_of(repeat, lambda: serializer_path(n))
+            fast, actual = best_of(repeat, lambda: values_path(n))
+            self.stdout.write(
+                f'{n:>8} {slow * 1000:>14.1f} {fast * 1000:>10.1f} {slow / fast:>7.1f}x  {actual == expected}'
+            )
+            if actual != expected:
+                raise CommandError(f'Output differs at {n} rows')
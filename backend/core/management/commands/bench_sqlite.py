@@ -0,0 +1,225 @@
+import json
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import django
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.auth import token_cache
+from core.synthetic import synthetic_csv
+
+# Paths a dashboard polls, with {id} the dataset on screen.
+READ_PATHS = [
+    '/api/history/',
+    '/api/dataset/{id}/summary/',
+    '/api/dataset/{id}/stats/',
+    '/api/dataset/{id}/?page_size=100',
+]
+
+
+def use_profile(profile, path):
+    """Point the default connection of every thread at ``path`` with ``profile``'s settings."""
+    connections.close_all()
+    base = settings.DATABASES['default']
+    connections.settings['default'] = {
+        **base, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {},
+        **settings.DATABASE_PROFILES[profile], 'NAME': str(path),
+    }
+    try:
+        del connections['default']
+    except AttributeError:
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent CSV uploads alongside dashboard reads through the WSGI handler, once '
+            'per DATABASE_PROFILES entry on a fresh SQLite file, and report throughput and latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=list(settings.DATABASE_PROFILES))
+        parser.add_argument('--uploaders', type=int, default=2, help='Threads uploading.')
+        parser.add_argument('--uploads', type=int, default=3, help='Uploads per uploading thread.')
+        parser.add_argument('--rows', type=int, default=50_000, help='Rows per uploaded CSV.')
+        parser.add_argument('--readers', type=int, default=4, help='Processes polling dashboard endpoints.')
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options['profiles'] if name not in settings.DATABASE_PROFILES]
+        if unknown:
+            raise CommandError(f'Unknown profile "{unknown[0]}". Choose from: {list(settings.DATABASE_PROFILES)}')
+        csvs = [synthetic_csv(options['rows'], seed) for seed in range(options['uploaders'] * options['uploads'])]
+        seed_csv = synthetic_csv(options['rows'], seed=len(csvs))
+
+        original = connections.settings['default']
+        # Uploads ingest on the request thread, so the upload latency is the
+        # ingest; retention is off so the dataset being read stays put.
+        overrides = override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['localhost'], INGEST_ASYNC=False,
+            RETENTION_POLICY={'keep_last': None, 'max_age_days': None, 'max_total_rows': None},
+        )
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        results = []
+        try:
+            with overrides, tempfile.TemporaryDirectory() as tmp:
+                for profile in options['profiles']:
+                    use_profile(profile, Path(tmp) / f'{profile}.sqlite3')
+                    call_command('migrate', verbosity=0)
+                    cache.clear()
+                    token_cache.clear()
+                    results += self.run(profile, csvs, seed_csv, options)
+        finally:
+            request_logger.setLevel(level)
+            connections.close_all()
+            connections.settings['default'] = original
+            try:
+                del connections['default']
+            except AttributeError:
+                pass
+
+        self.stdout.write(
+            f'{"profile":>10} {"kind":>6} {"ok":>6} {"errors":>6} {"req/s":>8} {"rows/s":>9} '
+            f'{"p50 ms":>8} {"p99 ms":>8}'
+        )
+        for row in results:
+            self.stdout.write(
+                f'{row["profile"]:>10} {row["kind"]:>6} {row["ok"]:>6} {row["errors"]:>6} '
+                f'{row["requests_per_second"]:>8.1f} {row["rows_per_second"] or 0:>9.0f} '
+                f'{row["p50_ms"]:>8.1f} {row["p99_ms"]:>8.1f}'
+            )
+
+    def run(self, profile, csvs, seed_csv, options):
+        path = connections.settings['default']['NAME']
+        token = Token.objects.create(user=User.objects.create_user('bench_sqlite')).key
+        call = wsgi_caller(token)
+
+        def upload(content, name):
+            status, body, elapsed = call('post', '/api/upload/', {'file': SimpleUploadedFile(name, content)})
+            ok = status < 300 and json.loads(body).get('phase') == 'done'
+            return ok, body, elapsed
+
+        ok, body, _ = upload(seed_csv, 'seed.csv')
+        if not ok:
+            raise CommandError(f'Seed upload failed: {body[:500]!r}')
+        dataset_id = json.loads(body)['dataset']
+        connections.close_all()
+
+        timings, errors, lock = [], 0, threading.Lock()
+
+        def uploader(index):
+            nonlocal errors
+            try:
+                for n in range(options['uploads']):
+                    ok, _, elapsed = upload(csvs[index * options['uploads'] + n], f'bench-{index}-{n}.csv')
+                    with lock:
+                        if ok:
+                            timings.append(elapsed)
+                        else:
+                            errors += 1
+            finally:
+                connections.close_all()
+
+        # Readers run in their own processes, as a dashboard's requests would
+        # reach other server workers; as threads here they would compete
+        # with the ingest for the GIL. They poll until the stop file appears.
+        stop = Path(path).with_suffix('.stop')
+        pool = ProcessPoolExecutor(options['readers'], mp_context=get_context('spawn'), initializer=django.setup) \
+            if options['readers'] else None
+        try:
+            ready = [Path(path).with_suffix(f'.ready{i}') for i in range(options['readers'])]
+            futures = [pool.submit(reader, profile, path, token, dataset_id, i, ready[i], stop)
+                       for i in range(options['readers'])]
+            while not all(flag.exists() for flag in ready):
+                for future in futures:
+                    if future.done():
+                        future.result()  # a reader that died raises here
+                time.sleep(0.05)
+
+            threads = [threading.Thread(target=uploader, args=(i,)) for i in range(options['uploaders'])]
+            started = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            finished = time.time()
+            stop.touch()
+            reads = [row for future in futures for row in future.result() if started <= row[0] <= finished]
+        finally:
+            stop.touch()
+            if pool:
+                pool.shutdown()
+        elapsed = finished - started
+
+        read_timings = [latency for _, ok, latency in reads if ok]
+        return [
+            summarise(profile, 'upload', timings, errors, elapsed, options['rows']),
+            summarise(profile, 'read', read_timings, len(reads) - len(read_timings), elapsed),
+        ]
+
+
+def summarise(profile, kind, timings, errors, elapsed, rows=None):
+    latencies = np.array(timings) * 1000
+    return {
+        'profile': profile,
+        'kind': kind,
+        'ok': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / elapsed,
+        'rows_per_second': len(latencies) * rows / elapsed if rows else None,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+    }
+
+
+def wsgi_caller(token):
+    """``call(method, path, data)`` -> (status, body, seconds) through the WSGI handler."""
+    factory = RequestFactory(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {token}')
+    application = WSGIHandler()
+
+    def call(method, path, data=None):
+        request = getattr(factory, method)(path, data)
+        started = time.perf_counter()
+        status = []
+        response = application(request.environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+        body = b''.join(response)
+        # Fires request_finished, which closes the connection unless CONN_MAX_AGE keeps it.
+        response.close()
+        return status[0], body, time.perf_counter() - started
+
+    return call
+
+
+def reader(profile, path, token, dataset_id, index, ready, stop):
+    """Poll READ_PATHS until ``stop`` exists; returns (finished at, ok, seconds) per request."""
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    use_profile(profile, path)
+    urls = [url.format(id=dataset_id) for url in READ_PATHS]
+    rows = []
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+        call = wsgi_caller(token)
+        try:
+            n = index
+            while not stop.exists():
+                status, _, elapsed = call('get', urls[n % len(urls)])
+                rows.append((time.time(), status == 200, elapsed))
+                n += 1
+                if n == index + 1:
+                    ready.touch()
+        finally:
+            connections.close_all()
+    return rows
@@ -0,0 +1,319 @@
+import json
+import logging
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import django
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from core.auth import token_cache
+from core.ingest import ingest_csv, insert_chunk, read_chunks, validate_chunk
+from core.management.commands.bench_sqlite import use_profile, wsgi_caller
+from core.models import Dataset
+from core.reports import render_report
+from core.retention import apply_retention
+from core.synthetic import write_csv
+
+# Bump when a benchmark changes what it measures, so old files aren't compared against it.
+SUITE_VERSION = 1
+
+BENCHMARKS = [
+    'parse', 'validate', 'insert', 'ingest',
+    'page_first', 'page_walk', 'summary_cold', 'summary_warm',
+    'report', 'retention',
+]
+# Benchmarks whose work grows with the dataset, reported in rows/s as well.
+PER_ROW = {'parse', 'validate', 'insert', 'ingest', 'report', 'retention'}
+WALK_PAGES = 10
+WALK_PAGE_SIZE = 1_000
+
+
+class Command(BaseCommand):
+    help = ('Time each stage of the backend on synthetic datasets: CSV parse, validation, record '
+            'insert, full ingest, record paging, summary, PDF report and retention. Each row count '
+            'runs on a fresh SQLite file with the current DATABASE_PROFILE. Results are written as '
+            'JSON and can be compared with an earlier run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                            help='Dataset sizes to run.')
+        parser.add_argument('--types', type=int, default=5, help='Distinct equipment types.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best is compared.')
+        parser.add_argument('--skip', nargs='+', default=[], choices=BENCHMARKS, metavar='BENCHMARK',
+                            help=f'Benchmarks to leave out, of: {", ".join(BENCHMARKS)}.')
+        parser.add_argument('--output', help='Results file (default: media/bench/<timestamp>.json).')
+        parser.add_argument('--compare', metavar='BASELINE', help='Results file to compare against.')
+        parser.add_argument('--max-slowdown', type=float,
+                            help='With --compare, fail if any benchmark is this many times slower.')
+        parser.add_argument('--load', metavar='RESULTS',
+                            help='Compare an existing results file instead of running the suite.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        if options['types'] < 1:
+            raise CommandError('--types must be at least 1')
+        if min(options['rows']) < 1:
+            raise CommandError('--rows must be at least 1')
+        if options['max_slowdown'] and not options['compare']:
+            raise CommandError('--max-slowdown needs --compare')
+        baseline = load_results(options['compare']) if options['compare'] else None
+
+        if options['load']:
+            results = load_results(options['load'])
+        else:
+            results = self.run_suite(options)
+            output = Path(options['output'] or Path(settings.BASE_DIR) / 'media' / 'bench'
+                          / f'{datetime.now():%Y%m%d-%H%M%S}.json')
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f'Results written to {output}')
+
+        if baseline:
+            self.compare(baseline, results, options['max_slowdown'])
+
+    def run_suite(self, options):
+        results = {
+            'suite_version': SUITE_VERSION,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'environment': environment(),
+            'parameters': {key: options[key] for key in ('rows', 'types', 'seed', 'repeat', 'skip')},
+            'results': [],
+        }
+        self.stdout.write(f'{"benchmark":>13} {"rows":>9} {"best ms":>10} {"median ms":>10} {"rows/s":>11}')
+
+        original = connections.settings['default']
+        # Retention only runs when the suite calls it.
+        overrides = override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['localhost'],
+            RETENTION_POLICY={'keep_last': None, 'max_age_days': None, 'max_total_rows': None},
+        )
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            with overrides, tempfile.TemporaryDirectory() as tmp:
+                for rows in sorted(options['rows']):
+                    use_profile(settings.DATABASE_PROFILE, Path(tmp) / f'bench-{rows}.sqlite3')
+                    call_command('migrate', verbosity=0)
+                    cache.clear()
+                    token_cache.clear()
+                    csv = Path(tmp) / f'bench-{rows}.csv'
+                    write_csv(csv, rows, options['seed'], options['types'])
+                    for name, timings in self.run(rows, csv, Path(tmp), options):
+                        results['results'].append(self.record(name, rows, timings))
+                    csv.unlink()
+                    connections.close_all()
+        finally:
+            request_logger.setLevel(level)
+            connections.close_all()
+            connections.settings['default'] = original
+            try:
+                del connections['default']
+            except AttributeError:
+                pass
+        return results
+
+    def run(self, rows, csv, tmp, options):
+        """Yield (benchmark, [seconds per run]) for one dataset size."""
+        repeat, skip = options['repeat'], set(options['skip'])
+
+        def chunks():
+            with open(csv, 'rb') as f:
+                yield from read_chunks(f)
+
+        if 'parse' not in skip:
+            yield 'parse', [clock(lambda: sum(len(chunk) for chunk in chunks())) for _ in range(repeat)]
+
+        if 'validate' not in skip:
+            def validate():
+                elapsed = 0.0
+                for chunk in chunks():
+                    elapsed += clock(lambda: validate_chunk(chunk))
+                return elapsed
+            yield 'validate', [validate() for _ in range(repeat)]
+
+        if 'insert' not in skip:
+            # The executemany insert ingest uses; rolled back after each run.
+            def insert():
+                elapsed = 0.0
+                with transaction.atomic():
+                    dataset_id = Dataset.objects.create(filename='bench-insert.csv').pk
+                    for chunk in chunks():
+                        chunk = validate_chunk(chunk)
+                        elapsed += clock(lambda: insert_chunk(dataset_id, chunk))
+                    transaction.set_rollback(True)
+                return elapsed
+            yield 'insert', [insert() for _ in range(repeat)]
+
+        # Everything below reads or deletes ingested datasets; ingest runs
+        # (untimed) even when skipped.
+        def ingest():
+            with open(csv, 'rb') as f:
+                return ingest_csv(f, csv.name)
+
+        if 'ingest' not in skip:
+            yield 'ingest', [clock(ingest) for _ in range(repeat)]
+        else:
+            ingest()
+        dataset_id = Dataset.objects.latest('id').pk
+
+        token = Token.objects.create(user=User.objects.create_user(f'bench-{rows}')).key
+        call = wsgi_caller(token)
+
+        def get(path):
+            status, body, elapsed = call('get', path)
+            if status != 200:
+                raise CommandError(f'GET {path} returned {status}: {body[:500]!r}')
+            return json.loads(body), elapsed
+
+        if 'page_first' not in skip:
+            yield 'page_first', [get(f'/api/dataset/{dataset_id}/?page_size=100')[1] for _ in range(repeat)]
+
+        if 'page_walk' not in skip:
+            # Following `next` through the first WALK_PAGES pages of the dataset.
+            def walk():
+                elapsed, path = 0.0, f'/api/dataset/{dataset_id}/?page_size={WALK_PAGE_SIZE}'
+                for _ in range(WALK_PAGES):
+                    page, seconds = get(path)
+                    elapsed += seconds
+                    if not page['next']:
+                        break
+                    parts = urlsplit(page['next'])
+                    path = f'{parts.path}?{parts.query}'
+                return elapsed
+            yield 'page_walk', [walk() for _ in range(repeat)]
+
+        summary = f'/api/dataset/{dataset_id}/summary/'
+        if 'summary_cold' not in skip:
+            def cold():
+                cache.clear()
+                return get(summary)[1]
+            yield 'summary_cold', [cold() for _ in range(repeat)]
+
+        if 'summary_warm' not in skip:
+            get(summary)
+            yield 'summary_warm', [get(summary)[1] for _ in range(repeat)]
+
+        if 'report' not in skip:
+            path = tmp / f'report-{dataset_id}.pdf'
+
+            def report():
+                path.unlink(missing_ok=True)
+                return clock(lambda: render_report(dataset_id, path))
+            yield 'report', [report() for _ in range(repeat)]
+            path.unlink(missing_ok=True)
+
+        if 'retention' not in skip:
+            # Each run deletes the oldest of two or more datasets.
+            def retention():
+                datasets = Dataset.objects.count()
+                if datasets < 2:
+                    ingest()
+                    datasets += 1
+                return clock(lambda: apply_retention(keep_last=datasets - 1))
+            yield 'retention', [retention() for _ in range(repeat)]
+
+    def record(self, name, rows, timings):
+        best, median = min(timings), float(np.median(timings))
+        result = {
+            'benchmark': name,
+            'rows': rows,
+            'best_seconds': best,
+            'median_seconds': median,
+            'runs': timings,
+            'rows_per_second': rows / best if name in PER_ROW and best else None,
+        }
+        rate = f'{result["rows_per_second"]:>11.0f}' if result['rows_per_second'] else f'{"":>11}'
+        self.stdout.write(f'{name:>13} {rows:>9} {best * 1000:>10.1f} {median * 1000:>10.1f} {rate}')
+        return result
+
+    def compare(self, baseline, results, max_slowdown):
+        if baseline.get('suite_version') != results.get('suite_version'):
+            self.stdout.write(self.style.WARNING(
+                f'Suite versions differ ({baseline.get("suite_version")} vs {results.get("suite_version")}); '
+                'some benchmarks may not be comparable.'
+            ))
+        before = {(row['benchmark'], row['rows']): row['best_seconds'] for row in baseline['results']}
+        self.stdout.write(f'\nCompared with {baseline["environment"].get("git_commit") or "baseline"} '
+                          f'({baseline["created_at"]}), best of each run:')
+        self.stdout.write(f'{"benchmark":>13} {"rows":>9} {"before ms":>10} {"after ms":>10} {"ratio":>7}')
+        slower = []
+        for row in results['results']:
+            old = before.get((row['benchmark'], row['rows']))
+            if old is None:
+                continue
+            ratio = row['best_seconds'] / old if old else math.inf
+            flag = ''
+            if max_slowdown and ratio > max_slowdown:
+                slower.append(f'{row["benchmark"]} ({row["rows"]} rows) {ratio:.2f}x')
+                flag = '  slower'
+            self.stdout.write(
+                f'{row["benchmark"]:>13} {row["rows"]:>9} {old * 1000:>10.1f} '
+                f'{row["best_seconds"] * 1000:>10.1f} {ratio:>6.2f}x{flag}'
+            )
+        if slower:
+            raise CommandError(f'Slower than {max_slowdown}x the baseline: {", ".join(slower)}')
+
+
+def clock(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def load_results(path):
+    try:
+        results = json.loads(Path(path).read_text())
+    except (OSError, ValueError) as e:
+        raise CommandError(f'Cannot read results file {path}: {e}')
+    if 'results' not in results:
+        raise CommandError(f'{path} is not a bench_suite results file')
+    return results
+
+
+def environment():
+    """What a result depends on besides the code: versions, hardware and settings."""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=settings.BASE_DIR, capture_output=True,
+                                  text=True, timeout=10, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    status = git('status', '--porcelain')
+    return {
+        'git_commit': git('rev-parse', 'HEAD'),
+        'git_dirty': bool(status) if status is not None else None,
+        'python': sys.version.split()[0],
+        'django': django.get_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'database_profile': settings.DATABASE_PROFILE,
+        'record_store': settings.RECORD_STORE,
+        'ingest_chunk_size': settings.INGEST_CHUNK_SIZE,
+        'ingest_batch_size': settings.INGEST_BATCH_SIZE,
+    }
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.synthetic import write_csv
+
+
+class Command(BaseCommand):
+    help = ('Write a synthetic equipment CSV (Equipment Name, Type, Flowrate, Pressure, Temperature) '
+            'for load tests and benchmarks. Rows are generated in chunks, so large files fit in memory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the CSV to write.')
+        parser.add_argument('--rows', type=int, default=10_000)
+        parser.add_argument('--types', type=int, default=5, help='Distinct equipment types.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1:
+            raise CommandError('--rows must be at least 1')
+        if options['types'] < 1:
+            raise CommandError('--types must be at least 1')
+
+        started = time.perf_counter()
+        size = write_csv(options['output'], options['rows'], options['seed'], options['types'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Wrote {options["rows"]} rows ({options["types"]} types, {size / 2**20:.1f} MB) '
+            f'to {options["output"]} in {elapsed:.1f}s'
+        )
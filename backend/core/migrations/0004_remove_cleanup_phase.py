@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_dataset_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestjob',
+            name='phase',
+            field=models.CharField(choices=[('queued', 'Queued'), ('ingesting', 'Ingesting'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_cleanup_phase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='stats',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='stats_version',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+    ]
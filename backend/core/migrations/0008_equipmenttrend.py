@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_record_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_name', models.CharField(max_length=255)),
+                ('uploaded_at', models.DateTimeField()),
+                ('type', models.CharField(max_length=100)),
+                ('readings', models.PositiveIntegerField()),
+                ('flowrate', models.FloatField()),
+                ('pressure', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trend_points', to='core.dataset')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['equipment_name', 'uploaded_at'], name='trend_name_time_idx')],
+            },
+        ),
+    ]
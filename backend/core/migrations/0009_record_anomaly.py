@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_equipmenttrend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentrecord',
+            name='anomaly',
+            field=models.PositiveSmallIntegerField(db_default=0),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(condition=models.Q(('anomaly__gt', 0)), fields=['dataset', 'id'], name='record_anomaly_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# SQLite only: an FTS5 index over the trend table's equipment_name and type,
+# kept in step by triggers (external content, so the text isn't stored
+# twice). Other databases fall back to a plain prefix match in
+# core.search.
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_equipment_search USING fts5(
+        equipment_name, type,
+        content='core_equipmenttrend', content_rowid='id',
+        tokenize='unicode61', prefix='1 2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER core_equipment_search_insert AFTER INSERT ON core_equipmenttrend BEGIN
+        INSERT INTO core_equipment_search (rowid, equipment_name, type)
+        VALUES (new.id, new.equipment_name, new.type);
+    END
+    """,
+    """
+    CREATE TRIGGER core_equipment_search_delete AFTER DELETE ON core_equipmenttrend BEGIN
+        INSERT INTO core_equipment_search (core_equipment_search, rowid, equipment_name, type)
+        VALUES ('delete', old.id, old.equipment_name, old.type);
+    END
+    """,
+    "INSERT INTO core_equipment_search (core_equipment_search) VALUES ('rebuild')",
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS core_equipment_search_delete',
+    'DROP TRIGGER IF EXISTS core_equipment_search_insert',
+    'DROP TABLE IF EXISTS core_equipment_search',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_record_anomaly'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:51
+
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_equipment_search'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='dataset',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='ready',
+            field=models.BooleanField(default=True),
+        ),
+    ]
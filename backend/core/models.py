@@ -1,9 +1,28 @@
+from django.conf import settings
 from django.db import models
 
+class ReadyDatasetManager(models.Manager):
+    """Datasets whose ingest has finished; see Dataset.ready."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(ready=True)
+
 class Dataset(models.Model):
     filename = models.CharField(max_length=255)
     upload_timestamp = models.DateTimeField(auto_now_add=True)
     summary_stats = models.JSONField(default=dict)
+    # SHA-256 of the uploaded bytes; re-uploads of the same file resolve here.
+    content_hash = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
+    # Per-type and global min/max/std/quantiles; see core.stats.STATS_VERSION.
+    stats = models.JSONField(default=dict)
+    stats_version = models.PositiveSmallIntegerField(default=0, db_index=True)
+    # False while an upload is still being ingested (core.ingest commits its
+    # records chunk by chunk). Dataset.objects only returns ready datasets;
+    # all_objects, the default manager, returns every one.
+    ready = models.BooleanField(default=True)
+
+    all_objects = models.Manager()
+    objects = ReadyDatasetManager()
 
     def __str__(self):
         return f"{self.filename} ({self.upload_timestamp})"
@@ -15,6 +34,77 @@ class EquipmentRecord(models.Model):
     flowrate = models.FloatField()
     pressure = models.FloatField()
     temperature = models.FloatField()
+    # Bitmask of the outlier rules this reading breaks (core.anomalies). A
+    # database default, since ingest inserts rows with raw SQL.
+    anomaly = models.PositiveSmallIntegerField(db_default=0)
+
+    class Meta:
+        # (dataset, <column>) lets top-N walk the index instead of sorting,
+        # and lets histograms count buckets from the index alone. The
+        # (dataset, type[, <column>]) ones serve the records filters: a type,
+        # optionally with a range or ordering on one column (core.filters).
+        indexes = [
+            models.Index(fields=['dataset', 'flowrate'], name='record_dataset_flowrate_idx'),
+            models.Index(fields=['dataset', 'pressure'], name='record_dataset_pressure_idx'),
+            models.Index(fields=['dataset', 'temperature'], name='record_dataset_temp_idx'),
+            models.Index(fields=['dataset', 'type'], name='record_dataset_type_idx'),
+            models.Index(fields=['dataset', 'type', 'flowrate'], name='record_type_flowrate_idx'),
+            models.Index(fields=['dataset', 'type', 'pressure'], name='record_type_pressure_idx'),
+            models.Index(fields=['dataset', 'type', 'temperature'], name='record_type_temp_idx'),
+            # Partial: holds only the flagged few, for the anomalies listing.
+            models.Index(fields=['dataset', 'id'], condition=models.Q(anomaly__gt=0), name='record_anomaly_idx'),
+        ]
 
     def __str__(self):
         return f"{self.equipment_name} - {self.type}"
+
+class EquipmentTrend(models.Model):
+    """
+    One unit's readings in one upload: the per-dataset rollup of its
+    records (core.trends), written at ingest. Following a unit across
+    uploads reads this table alone, by (equipment_name, uploaded_at).
+    """
+    equipment_name = models.CharField(max_length=255)
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='trend_points')
+    # Copy of dataset.upload_timestamp, so trend reads never join.
+    uploaded_at = models.DateTimeField()
+    type = models.CharField(max_length=100)
+    # Records with this name in the dataset; the readings are their means.
+    readings = models.PositiveIntegerField()
+    flowrate = models.FloatField()
+    pressure = models.FloatField()
+    temperature = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['equipment_name', 'uploaded_at'], name='trend_name_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipment_name} @ {self.uploaded_at}"
+
+class IngestJob(models.Model):
+    PHASE_QUEUED = 'queued'
+    PHASE_INGESTING = 'ingesting'
+    PHASE_DONE = 'done'
+    PHASE_FAILED = 'failed'
+    PHASE_CHOICES = [
+        (PHASE_QUEUED, 'Queued'),
+        (PHASE_INGESTING, 'Ingesting'),
+        (PHASE_DONE, 'Done'),
+        (PHASE_FAILED, 'Failed'),
+    ]
+
+    filename = models.CharField(max_length=255)
+    phase = models.CharField(max_length=20, choices=PHASE_CHOICES, default=PHASE_QUEUED)
+    rows_processed = models.BigIntegerField(default=0)
+    deduplicated = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    dataset = models.ForeignKey(Dataset, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.pk}: {self.filename} ({self.phase})"
@@ -0,0 +1,72 @@
+import json
+import re
+
+import orjson
+import pyarrow as pa
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .export import ARROW_MEDIA_TYPE
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Selects the export format (?format= or Accept). The export view streams
+    the body itself and DatasetDetailViewSet.handle_exception renders errors
+    as JSON, so this only encodes whatever else reaches it.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class ArrowRenderer(ExportRenderer):
+    """Renders a pyarrow Table as an Arrow IPC stream."""
+    media_type = ARROW_MEDIA_TYPE
+    format = 'arrow'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, pa.Table):
+            return super().render(data, accepted_media_type, renderer_context)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, data.schema) as writer:
+            writer.write_table(data)
+        return sink.getvalue().to_pybytes()
+
+
+# orjson spells some floats differently from json.dumps: exponents without
+# a sign (1e16 vs 1e+16) and small values without one (0.00001 vs 1e-05).
+# Output that might contain either goes through the stdlib encoder instead.
+_FLOAT_SPELLING = re.compile(rb'[:,\[]-?(?:\d+\.?\d*e|0\.0000)')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer output, byte for byte, encoded with orjson.
+
+    Compact output only; indented (browsable) rendering and anything orjson
+    can't encode or might spell differently fall back to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _FLOAT_SPELLING.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these two, which are valid JSON but not valid JavaScript.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,422 @@
+"""
+Full-dataset PDF reports.
+
+A report has a summary page, per-type statistics tables, charts, and the
+dataset's records laid out page by page. reportlab keeps every page in
+memory until the file is saved, so the listing stops after
+``REPORT_MAX_RECORDS`` rows and says so; the CSV export has the rest.
+Drawing one for a large
+dataset takes a while, so it happens in a process pool (reportlab is pure
+Python and would otherwise hold the GIL on a request thread) and the
+finished file is kept on disk under ``REPORT_DIR``, named after the dataset,
+its upload time and ``REPORT_VERSION``. Bumping the version makes every
+stored report stale. A render first claims the report with an exclusive
+lock file next to it, so only one process draws it at a time; the others
+wait for the file (inline) or report the holder's progress, which it
+writes next to the report, where ``status()`` reads it from any process.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import close_old_connections
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from . import charts
+from .export import iter_rows
+from .models import Dataset, EquipmentRecord
+from .storage import NUMERIC_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout below changes.
+REPORT_VERSION = 3
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 50
+LINE = 14
+RECORD_COLUMNS = [('Equipment Name', 50), ('Type', 250), ('Flowrate', 370), ('Pressure', 450), ('Temperature', 530)]
+STAT_COLUMNS = ['count', 'mean', 'std', 'min', 'p50', 'max']
+
+_executor = None
+_executor_lock = threading.Lock()
+# dataset id -> future, for reports this process has queued.
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def report_dir():
+    return Path(settings.REPORT_DIR)
+
+
+def report_path(dataset_id, uploaded):
+    # The upload time tells a dataset apart from a later one reusing its id.
+    return report_dir() / f'dataset_{dataset_id}_{uploaded.timestamp():.6f}_v{REPORT_VERSION}.pdf'
+
+
+def _progress_path(path):
+    return path.with_suffix('.progress')
+
+
+def _lock_path(path):
+    return path.with_suffix('.lock')
+
+
+def _held(lock):
+    # The holder touches its lock as it goes; one left untouched for
+    # REPORT_LOCK_TIMEOUT belongs to a render that died.
+    try:
+        return time.time() - lock.stat().st_mtime < settings.REPORT_LOCK_TIMEOUT
+    except FileNotFoundError:
+        return False
+
+
+def _claim(lock, token):
+    """Create ``lock`` holding ``token``; False while another render holds it."""
+    for _ in range(2):
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if _held(lock):
+                return False
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+            continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        return True
+    return False
+
+
+def _owns(lock, token):
+    try:
+        return lock.read_text() == token
+    except OSError:
+        return False
+
+
+def cached_report(dataset_id, uploaded):
+    path = report_path(dataset_id, uploaded)
+    return path if path.exists() else None
+
+
+def delete_reports(dataset_id):
+    """Remove every stored report of a dataset, whatever its version."""
+    for path in report_dir().glob(f'dataset_{dataset_id}_*'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.REPORT_WORKERS,
+                # Spawned workers start from a bare interpreter and set Django
+                # up themselves; forked ones would share the parent's
+                # database connections.
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+    return _executor
+
+
+def request_report(dataset_id, uploaded):
+    """
+    Start drawing a dataset's report unless it is already stored, queued or
+    being drawn by another process. Returns the path once the file exists,
+    otherwise None. Without REPORT_ASYNC the report is drawn inline (or
+    waited for, if another process has claimed it) and the path always
+    returned.
+    """
+    path = cached_report(dataset_id, uploaded)
+    if path:
+        return path
+    path = report_path(dataset_id, uploaded)
+    if not settings.REPORT_ASYNC:
+        while not render_report(dataset_id, str(path)) and not path.exists():
+            time.sleep(1)
+        return path
+    if _held(_lock_path(path)):
+        # status() reads the other process's progress.
+        return None
+
+    with _pending_lock:
+        future = _pending.get(dataset_id)
+        if future is not None:
+            return None
+        future = _pending[dataset_id] = get_executor().submit(
+            render_report, dataset_id, str(report_path(dataset_id, uploaded)),
+        )
+    future.add_done_callback(lambda f: _finished(dataset_id, f))
+    return None
+
+
+def _finished(dataset_id, future):
+    # Failures stay in _pending until status() has reported them once.
+    if future.exception() is None:
+        with _pending_lock:
+            if _pending.get(dataset_id) is future:
+                del _pending[dataset_id]
+    else:
+        logger.error('Report for dataset %s failed', dataset_id, exc_info=future.exception())
+        if isinstance(future.exception(), BrokenProcessPool):
+            # A worker died; start a fresh pool for the next request.
+            global _executor
+            with _executor_lock:
+                _executor = None
+
+
+def status(dataset_id, uploaded):
+    """Progress of a report being drawn: rows done, total, and any error."""
+    future = _pending.get(dataset_id)
+    if future is not None and future.done() and future.exception() is not None:
+        with _pending_lock:
+            if _pending.get(dataset_id) is future:
+                del _pending[dataset_id]
+        return {'status': 'failed', 'error': str(future.exception())}
+
+    try:
+        progress = json.loads(_progress_path(report_path(dataset_id, uploaded)).read_text())
+    except (OSError, ValueError):
+        # Waiting for a free worker.
+        return {'status': 'queued', 'rows_done': 0, 'rows_total': None, 'percent': 0.0}
+    total = progress['rows_total']
+    progress['percent'] = round(100 * progress['rows_done'] / total, 1) if total else 0.0
+    return {'status': 'rendering', **progress}
+
+
+def render_report(dataset_id, path):
+    """
+    Draw the report into ``path``; runs in a pool worker. Returns False,
+    without drawing, while another render holds the report's lock.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock = _lock_path(path)
+    # Scratch files carry the render's own token, so concurrent renders of
+    # the same report never write or remove each other's.
+    token = uuid.uuid4().hex
+    if not _claim(lock, token):
+        return False
+    close_old_connections()
+    partial = path.with_name(f'{path.stem}.{token}.part')
+    progress_file = _progress_path(path)
+    try:
+        if path.exists():
+            # Finished by another process just before the claim.
+            return True
+        dataset = Dataset.objects.get(pk=dataset_id)
+        total = min(dataset.summary_stats.get('count', 0), settings.REPORT_MAX_RECORDS)
+
+        def progress(done):
+            tmp = path.with_name(f'{path.stem}.{token}.progress')
+            tmp.write_text(json.dumps({'rows_done': done, 'rows_total': total}))
+            os.replace(tmp, progress_file)
+            os.utime(lock)
+
+        progress(0)
+        pdf = canvas.Canvas(str(partial), pagesize=letter, pageCompression=1)
+        pdf.setTitle(f'Report for {dataset.filename}')
+        _draw_summary(pdf, dataset)
+        _draw_type_stats(pdf, dataset)
+        _draw_charts(pdf, dataset)
+        _draw_records(pdf, dataset, progress)
+        pdf.save()
+        os.replace(partial, path)
+        return True
+    finally:
+        leftovers = [partial]
+        if _owns(lock, token):
+            leftovers += [progress_file, lock]
+        for leftover in leftovers:
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        close_old_connections()
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:,.2f}'
+    return f'{value:,}'
+
+
+def _heading(pdf, text, y, size=14):
+    pdf.setFont('Helvetica-Bold', size)
+    pdf.drawString(MARGIN, y, text)
+    pdf.setFont('Helvetica', 10)
+    return y - LINE * 2
+
+
+def _footer(pdf, dataset):
+    pdf.setFont('Helvetica', 8)
+    pdf.drawString(MARGIN, 30, dataset.filename)
+    pdf.drawRightString(PAGE_WIDTH - MARGIN, 30, f'Page {pdf.getPageNumber()}')
+    pdf.setFont('Helvetica', 10)
+
+
+def _new_page(pdf, dataset):
+    _footer(pdf, dataset)
+    pdf.showPage()
+    pdf.setFont('Helvetica', 10)
+    return PAGE_HEIGHT - MARGIN
+
+
+def _draw_summary(pdf, dataset):
+    stats = dataset.summary_stats
+    y = _heading(pdf, f'Report for Dataset: {dataset.filename}', PAGE_HEIGHT - MARGIN, size=16)
+    pdf.drawString(MARGIN, y, f'Uploaded: {dataset.upload_timestamp:%Y-%m-%d %H:%M:%S %Z}')
+    y -= LINE
+    pdf.drawString(MARGIN, y, f'Records: {_fmt(stats.get("count"))}')
+    y -= LINE * 2
+
+    y = _heading(pdf, 'Summary Statistics', y, size=12)
+    for field in NUMERIC_FIELDS:
+        pdf.drawString(MARGIN + 20, y, f'Avg {field.capitalize()}: {_fmt(stats.get(f"avg_{field}"))}')
+        y -= LINE
+    y -= LINE
+
+    y = _heading(pdf, 'Type Distribution', y, size=12)
+    for type_, count in stats.get('type_distribution', {}).items():
+        if y < MARGIN + LINE:
+            y = _new_page(pdf, dataset)
+        pdf.drawString(MARGIN + 20, y, type_)
+        pdf.drawRightString(MARGIN + 300, y, _fmt(count))
+        y -= LINE
+    _new_page(pdf, dataset)
+
+
+def _draw_type_stats(pdf, dataset):
+    by_type = dataset.stats.get('by_type', {})
+    if not by_type:
+        return
+    y = _heading(pdf, 'Statistics by Type', PAGE_HEIGHT - MARGIN)
+    column_x = [MARGIN + 130 + i * 65 for i in range(len(STAT_COLUMNS))]
+    for field in NUMERIC_FIELDS:
+        if y < MARGIN + LINE * (len(by_type) + 4):
+            y = _new_page(pdf, dataset)
+        pdf.setFont('Helvetica-Bold', 11)
+        pdf.drawString(MARGIN, y, field.capitalize())
+        y -= LINE
+        pdf.setFont('Helvetica-Bold', 9)
+        pdf.drawString(MARGIN, y, 'Type')
+        for x, column in zip(column_x, STAT_COLUMNS):
+            pdf.drawRightString(x + 50, y, column)
+        y -= LINE
+        pdf.setFont('Helvetica', 9)
+        rows = [(type_, entry[field]) for type_, entry in by_type.items()]
+        rows.append(('All', dataset.stats['global'][field]))
+        for type_, described in rows:
+            if y < MARGIN + LINE:
+                y = _new_page(pdf, dataset)
+            pdf.drawString(MARGIN, y, type_[:24])
+            for x, column in zip(column_x, STAT_COLUMNS):
+                pdf.drawRightString(x + 50, y, _fmt(described.get(column)))
+            y -= LINE
+        y -= LINE
+    _new_page(pdf, dataset)
+
+
+def _bar_chart(title, labels, series, width=500, height=200):
+    drawing = Drawing(width, height + 30)
+    chart = VerticalBarChart()
+    chart.x, chart.y = 40, 30
+    chart.width, chart.height = width - 60, height - 30
+    chart.data = series
+    chart.categoryAxis.categoryNames = labels
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.angle = 30 if len(labels) > 8 else 0
+    chart.categoryAxis.labels.boxAnchor = 'ne' if len(labels) > 8 else 'n'
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.bars[0].fillColor = colors.HexColor('#4e79a7')
+    drawing.add(chart)
+    drawing.add(String(width / 2, height + 10, title, fontSize=11, textAnchor='middle'))
+    return drawing
+
+
+def _draw_charts(pdf, dataset):
+    distribution = dataset.summary_stats.get('type_distribution', {})
+    if not distribution:
+        return
+    drawings = [_bar_chart('Records by Type', list(distribution), [list(distribution.values())])]
+
+    by_type = dataset.stats.get('by_type', {})
+    for field in NUMERIC_FIELDS:
+        if by_type:
+            drawings.append(_bar_chart(
+                f'Mean {field.capitalize()} by Type', list(by_type),
+                [[entry[field]['mean'] or 0 for entry in by_type.values()]],
+            ))
+        histogram = charts.histogram(dataset.pk, {'field': field, 'bins': 20})
+        labels = [f'{edge:.0f}' for edge in histogram['edges'][:-1]]
+        drawings.append(_bar_chart(f'{field.capitalize()} Distribution', labels, [histogram['counts']]))
+
+    y = PAGE_HEIGHT - MARGIN
+    for drawing in drawings:
+        if y - drawing.height < MARGIN:
+            y = _new_page(pdf, dataset)
+        y -= drawing.height
+        renderPDF.draw(drawing, pdf, MARGIN, y)
+        y -= LINE
+    _new_page(pdf, dataset)
+
+
+def _record_header(pdf, y):
+    pdf.setFont('Helvetica-Bold', 9)
+    for title, x in RECORD_COLUMNS:
+        if x > 300:
+            pdf.drawRightString(x + 30, y, title)
+        else:
+            pdf.drawString(x, y, title)
+    pdf.setFont('Helvetica', 9)
+    return y - LINE
+
+
+def _draw_records(pdf, dataset, progress):
+    limit = settings.REPORT_MAX_RECORDS
+    count = dataset.summary_stats.get('count', 0)
+    y = _heading(pdf, 'Records', PAGE_HEIGHT - MARGIN)
+    if count > limit:
+        pdf.drawString(MARGIN, y, f'Showing the first {_fmt(limit)} of {_fmt(count)} records; '
+                                  f'the CSV export has all of them.')
+        y -= LINE * 2
+    y = _record_header(pdf, y)
+    queryset = EquipmentRecord.objects.filter(dataset_id=dataset.pk).order_by('id')[:limit]
+    fields = ['equipment_name', 'type'] + NUMERIC_FIELDS
+    done = 0
+    for batch in iter_rows(queryset, fields):
+        for name, type_, *values in batch:
+            if y < MARGIN:
+                y = _record_header(pdf, _new_page(pdf, dataset))
+            pdf.drawString(RECORD_COLUMNS[0][1], y, name[:36])
+            pdf.drawString(RECORD_COLUMNS[1][1], y, type_[:20])
+            for (_, x), value in zip(RECORD_COLUMNS[2:], values):
+                pdf.drawRightString(x + 30, y, f'{value:.2f}')
+            y -= LINE
+        done += len(batch)
+        progress(done)
+    _footer(pdf, dataset)
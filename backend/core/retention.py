@@ -0,0 +1,99 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_dataset, invalidate_history
+from .models import Dataset, EquipmentRecord
+from .reports import delete_reports
+from .storage import record_store
+
+logger = logging.getLogger(__name__)
+
+# A dataset still not ready after this long belongs to an ingest whose
+# process died mid-upload (a failed ingest deletes its own).
+ABANDONED_INGEST_AGE = timedelta(days=1)
+
+
+def get_policy(**overrides):
+    policy = {'keep_last': None, 'max_age_days': None, 'max_total_rows': None}
+    policy.update(settings.RETENTION_POLICY)
+    policy.update({key: value for key, value in overrides.items() if value is not None})
+    return policy
+
+
+def select_expired(policy):
+    """
+    Return the ids of datasets the policy no longer keeps, newest first.
+
+    A dataset is dropped once it falls outside *any* of the configured
+    limits. The newest dataset is always kept.
+    """
+    rows = list(
+        Dataset.objects.order_by('-upload_timestamp', '-id')
+        .values_list('id', 'upload_timestamp', 'summary_stats__count')
+    )
+    cutoff = None
+    if policy['max_age_days'] is not None:
+        cutoff = timezone.now() - timedelta(days=policy['max_age_days'])
+
+    expired = []
+    total_rows = 0
+    for position, (dataset_id, uploaded, count) in enumerate(rows):
+        total_rows += count or 0
+        if position == 0:
+            continue
+        if policy['keep_last'] is not None and position >= policy['keep_last']:
+            expired.append(dataset_id)
+        elif cutoff is not None and uploaded < cutoff:
+            expired.append(dataset_id)
+        elif policy['max_total_rows'] is not None and total_rows > policy['max_total_rows']:
+            expired.append(dataset_id)
+    return expired
+
+
+def select_abandoned():
+    """Ids of datasets left behind, not ready, by an interrupted ingest."""
+    cutoff = timezone.now() - ABANDONED_INGEST_AGE
+    return list(Dataset.all_objects.filter(ready=False, upload_timestamp__lt=cutoff).values_list('id', flat=True))
+
+
+def apply_retention(dry_run=False, **overrides):
+    """
+    Delete every dataset the retention policy no longer keeps.
+
+    Records go in one set-based DELETE rather than through the per-object
+    cascade collector, then the datasets themselves. Returns a report of
+    what was removed and how long it took. Datasets abandoned by an
+    interrupted ingest are removed along with them.
+    """
+    started = time.perf_counter()
+    policy = get_policy(**overrides)
+    expired = select_expired(policy) + select_abandoned()
+    report = {'policy': policy, 'datasets': len(expired), 'records': 0, 'dry_run': dry_run}
+
+    if expired and dry_run:
+        report['records'] = EquipmentRecord.objects.filter(dataset_id__in=expired).count()
+    elif expired:
+        with transaction.atomic():
+            # Nothing hangs off EquipmentRecord, so Django fast-deletes this
+            # as a single DELETE ... WHERE dataset_id IN (...).
+            report['records'], _ = EquipmentRecord.objects.filter(dataset_id__in=expired).delete()
+            _, deleted = Dataset.all_objects.filter(id__in=expired).only('id').delete()
+            report['datasets'] = deleted.get(Dataset._meta.label, 0)
+        invalidate_history()
+        for dataset_id in expired:
+            record_store.delete(dataset_id)
+            delete_reports(dataset_id)
+            invalidate_dataset(dataset_id)
+
+    report['seconds'] = round(time.perf_counter() - started, 4)
+    if expired and not dry_run:
+        logger.info(
+            'Retention removed %d datasets / %d records in %.3fs',
+            report['datasets'], report['records'], report['seconds'],
+        )
+    return report
@@ -0,0 +1,115 @@
+"""
+Search over equipment names and types.
+
+The unit of search is a trend row (core.trends): one equipment name in one
+dataset, so a hit says where a unit appears without touching the record
+table. On SQLite the rows are indexed by the FTS5 table
+``core_equipment_search`` (migration 0010), which triggers keep in step
+with ``core_equipmenttrend`` as ingest and retention add and remove rows.
+Every word of the query matches as a prefix, in either column. Results are
+ranked with an exact name first, then by bm25 (a name hit weighs more than
+a type hit), then shortest name (the closest prefix match), then newest
+upload first.
+
+Other databases get a prefix match on ``equipment_name`` (or an exact
+``type``), ranked the same way apart from bm25.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Length
+
+from .models import EquipmentTrend
+from .trends import TREND_VALUES
+
+TERM = re.compile(r'\w+')
+# bm25 column weights: equipment_name, type.
+NAME_WEIGHT, TYPE_WEIGHT = 4.0, 1.0
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def match_expression(q):
+    terms = TERM.findall(q or '')
+    if not terms:
+        raise SearchQueryError('q must contain at least one letter or digit, e.g. q=Pump-1')
+    # Quoted, so FTS5 operators in the input are taken literally.
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class FTSResults:
+    """Lazily counted, lazily sliced ranked hits, for Django's Paginator."""
+
+    def __init__(self, q, dataset_id=None):
+        self.q = q
+        self.match = match_expression(q)
+        self.dataset_id = dataset_id
+
+    def _where(self):
+        sql = 'core_equipment_search MATCH %s'
+        params = [self.match]
+        if self.dataset_id is not None:
+            sql += ' AND t.dataset_id = %s'
+            params.append(self.dataset_id)
+        return sql, params
+
+    def count(self):
+        where, params = self._where()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM core_equipment_search '
+                'JOIN core_equipmenttrend t ON t.id = core_equipment_search.rowid '
+                f'WHERE {where}',
+                params,
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        where, params = self._where()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT t.id, bm25(core_equipment_search, {NAME_WEIGHT}, {TYPE_WEIGHT}) AS score '
+                'FROM core_equipment_search '
+                'JOIN core_equipmenttrend t ON t.id = core_equipment_search.rowid '
+                f'WHERE {where} '
+                'ORDER BY t.equipment_name = %s COLLATE NOCASE DESC, score, length(t.equipment_name), '
+                't.equipment_name, t.uploaded_at DESC, t.id '
+                'LIMIT %s OFFSET %s',
+                params + [self.q.strip(), page.stop - page.start, page.start],
+            )
+            hits = cursor.fetchall()
+        # The page's rows by primary key, through the ORM for field conversion.
+        rows = EquipmentTrend.objects.in_bulk([pk for pk, _ in hits])
+        results = []
+        for pk, score in hits:
+            row = {'equipment_name': rows[pk].equipment_name}
+            row.update((field, getattr(rows[pk], field)) for field in TREND_VALUES)
+            # bm25 is lower-is-better; flip it so clients read a relevance.
+            row['score'] = -score
+            results.append(row)
+        return results
+
+
+def prefix_results(q, dataset_id=None):
+    terms = TERM.findall(q or '')
+    if not terms:
+        raise SearchQueryError('q must contain at least one letter or digit, e.g. q=Pump-1')
+    q = q.strip()
+    points = EquipmentTrend.objects.filter(Q(equipment_name__istartswith=q) | Q(type__iexact=q))
+    if dataset_id is not None:
+        points = points.filter(dataset_id=dataset_id)
+    exact = Case(When(equipment_name__iexact=q, then=Value(1)), default=Value(0), output_field=IntegerField())
+    return points.annotate(exact=exact).order_by('-exact', Length('equipment_name'), 'equipment_name', '-uploaded_at', 'id').values('equipment_name', *TREND_VALUES)
+
+
+def search(q, dataset_id=None):
+    """Ranked hits for ``q``, as a sliceable sequence of trend-row dicts."""
+    if connection.vendor == 'sqlite':
+        return FTSResults(q, dataset_id)
+    return prefix_results(q, dataset_id)
@@ -1,21 +1,77 @@
 from rest_framework import serializers
-from .models import Dataset, EquipmentRecord
+from django.utils import timezone
+from .models import Dataset, EquipmentRecord, IngestJob
 
 class EquipmentRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = EquipmentRecord
         fields = '__all__'
 
+# Read paths that build rows straight from values() (record listing,
+# history) use these to emit the same keys, in the same order, with the
+# same formatting as the serializers, without model instances or per-field
+# serialization.
+RECORD_VALUES = list(EquipmentRecordSerializer().fields)
+DATASET_VALUES = ['id', 'filename', 'upload_timestamp', 'summary_stats', 'content_hash']
+_timestamp = serializers.DateTimeField()
+
+
+def dataset_rows(rows):
+    """DatasetSerializer output for Dataset.values(*DATASET_VALUES) rows."""
+    return [
+        {
+            'id': row['id'],
+            'filename': row['filename'],
+            'upload_timestamp': _timestamp.to_representation(row['upload_timestamp']),
+            'summary_stats': row['summary_stats'],
+            'record_count': row['summary_stats'].get('count', 0),
+            'content_hash': row['content_hash'],
+        }
+        for row in rows
+    ]
+
+def trend_rows(rows):
+    """Trend points for EquipmentTrend.values(*core.trends.TREND_VALUES) rows."""
+    return [
+        {
+            'dataset': row['dataset_id'],
+            'uploaded_at': _timestamp.to_representation(row['uploaded_at']),
+            'type': row['type'],
+            'readings': row['readings'],
+            'flowrate': row['flowrate'],
+            'pressure': row['pressure'],
+            'temperature': row['temperature'],
+        }
+        for row in rows
+    ]
+
 class DatasetSerializer(serializers.ModelSerializer):
     record_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Dataset
-        fields = ['id', 'filename', 'upload_timestamp', 'summary_stats', 'record_count']
+        fields = ['id', 'filename', 'upload_timestamp', 'summary_stats', 'record_count', 'content_hash']
 
     def get_record_count(self, obj):
         return obj.summary_stats.get('count', 0)
 
+class IngestJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.SerializerMethodField()
+
+    class Meta:
+        model = IngestJob
+        fields = ['id', 'filename', 'phase', 'rows_processed', 'rows_per_second', 'error',
+                  'dataset', 'deduplicated', 'created_at', 'started_at', 'finished_at']
+
+    def get_rows_per_second(self, obj):
+        if not obj.started_at:
+            return None
+        end = obj.finished_at or timezone.now()
+        elapsed = (end - obj.started_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        return round(obj.rows_processed / elapsed, 1)
+
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
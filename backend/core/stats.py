@@ -0,0 +1,154 @@
+"""
+Summary statistics computed while a dataset streams in.
+
+Count, mean, std, min and max are exact: every chunk is reduced with one
+vectorized group-by per ``type`` and folded into the running totals with
+the parallel variance update (Chan et al.), and the global figures are a
+merge of the per-type ones. Quantiles need the whole distribution, so
+they come from a bounded uniform sample of rows (bottom-k on a random
+key). While a dataset has no more rows than ``STATS_SAMPLE_SIZE`` the
+sample holds every row and the quantiles are exact too.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .storage import NUMERIC_FIELDS
+
+STATS_VERSION = 2
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+MOMENTS = ['count', 'mean', 'm2', 'min', 'max']
+
+
+def _quantile_key(q):
+    return f'p{round(q * 100):02d}'
+
+
+def _merge_moments(a, b):
+    """Merge two per-type moment frames (index: type, columns: MOMENTS)."""
+    if a is None:
+        return b
+    a, b = a.align(b, join='outer')
+    for frame in (a, b):
+        frame[['count', 'mean', 'm2']] = frame[['count', 'mean', 'm2']].fillna(0.0)
+    count = a['count'] + b['count']
+    delta = b['mean'] - a['mean']
+    safe = count.where(count > 0, 1.0)
+    return pd.DataFrame({
+        'count': count,
+        'mean': a['mean'] + delta * b['count'] / safe,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['count'] * b['count'] / safe,
+        'min': np.fmin(a['min'], b['min']),
+        'max': np.fmax(a['max'], b['max']),
+    })
+
+
+def _chunk_moments(chunk, field):
+    grouped = chunk.groupby('type', sort=False)[field]
+    frame = grouped.agg(['count', 'mean', 'var', 'min', 'max'])
+    frame['m2'] = frame.pop('var').fillna(0.0) * (frame['count'] - 1)
+    return frame[MOMENTS].astype('float64')
+
+
+def _describe(count, mean, m2, min_, max_, quantiles):
+    count = int(count)
+    described = {
+        'count': count,
+        'mean': float(mean) if count else None,
+        'std': float(np.sqrt(m2 / (count - 1))) if count > 1 else None,
+        'min': float(min_) if count else None,
+        'max': float(max_) if count else None,
+    }
+    for q in QUANTILES:
+        value = quantiles.get(q) if quantiles is not None else None
+        described[_quantile_key(q)] = None if value is None or pd.isna(value) else float(value)
+    return described
+
+
+class StatsAccumulator:
+    """Running statistics, merged one chunk (record field names) at a time."""
+
+    def __init__(self, sample_size=None, seed=None):
+        self.sample_size = sample_size or settings.STATS_SAMPLE_SIZE
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.moments = dict.fromkeys(NUMERIC_FIELDS)
+        self.sample = None
+
+    def update(self, chunk):
+        if not len(chunk):
+            return
+        self.count += len(chunk)
+        for field in NUMERIC_FIELDS:
+            self.moments[field] = _merge_moments(self.moments[field], _chunk_moments(chunk, field))
+
+        rows = chunk[['type'] + NUMERIC_FIELDS].assign(_key=self.rng.random(len(chunk)))
+        sample = rows if self.sample is None else pd.concat([self.sample, rows], ignore_index=True)
+        if len(sample) > self.sample_size:
+            keep = np.argpartition(sample['_key'].to_numpy(), self.sample_size)[:self.sample_size]
+            sample = sample.iloc[keep].reset_index(drop=True)
+        self.sample = sample
+
+    def _global(self, field):
+        per_type = self.moments[field]
+        count = per_type['count'].sum()
+        mean = (per_type['count'] * per_type['mean']).sum() / count
+        m2 = (per_type['m2'] + per_type['count'] * (per_type['mean'] - mean) ** 2).sum()
+        return count, mean, m2, per_type['min'].min(), per_type['max'].max()
+
+    def type_counts(self):
+        if not self.count:
+            return {}
+        counts = self.moments[NUMERIC_FIELDS[0]]['count'].sort_values(ascending=False, kind='stable')
+        return {type_: int(n) for type_, n in counts.items()}
+
+    def mean(self, field):
+        return float(self._global(field)[1]) if self.count else None
+
+    def as_dict(self):
+        """The original summary_stats shape, which clients already read."""
+        return {
+            'count': self.count,
+            'avg_flowrate': self.mean('flowrate'),
+            'avg_pressure': self.mean('pressure'),
+            'avg_temperature': self.mean('temperature'),
+            'type_distribution': self.type_counts(),
+        }
+
+    def detailed(self):
+        """Versioned min/max/std/quantile stats, globally and per type."""
+        stats = {
+            'version': STATS_VERSION,
+            'count': self.count,
+            'quantiles': {
+                'method': 'exact' if self.count <= self.sample_size else 'sampled',
+                'sample_size': 0 if self.sample is None else len(self.sample),
+            },
+            'global': {},
+            'by_type': {},
+        }
+        if not self.count:
+            return stats
+
+        global_q = self.sample[NUMERIC_FIELDS].quantile(QUANTILES)
+        type_q = self.sample.groupby('type', sort=False)[NUMERIC_FIELDS].quantile(QUANTILES)
+        type_q = {field: type_q[field].unstack() for field in NUMERIC_FIELDS}
+        for field in NUMERIC_FIELDS:
+            stats['global'][field] = _describe(*self._global(field), global_q[field])
+
+        for type_, count in self.type_counts().items():
+            entry = {'count': count}
+            for field in NUMERIC_FIELDS:
+                row = self.moments[field].loc[type_]
+                # A rare type can be missing from a sampled set of rows.
+                quantiles = type_q[field].loc[type_] if type_ in type_q[field].index else None
+                entry[field] = _describe(row['count'], row['mean'], row['m2'], row['min'], row['max'], quantiles)
+            stats['by_type'][type_] = entry
+        return stats
+
+
+def compute_stats(chunks, **kwargs):
+    accumulator = StatsAccumulator(**kwargs)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator
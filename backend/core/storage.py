@@ -0,0 +1,242 @@
+"""
+Pluggable storage for the column data of a dataset's records.
+
+Record rows always live in ``core_equipmentrecord`` (listing, paging and
+filtering run against them). The store configured by ``RECORD_STORE``
+decides where analytical reads - aggregates, charts, whole-dataset CSV
+exports - get their columns from:
+
+* ``core.storage.ORMRecordStore`` reads them back through the ORM.
+* ``core.storage.ArrowRecordStore`` also writes every dataset to an
+  uncompressed Arrow IPC file at ingest and memory-maps it on read, so
+  columns come straight off the page cache with no SQL, row decoding or
+  model instances. ``read_table`` hands back the mapped Arrow table itself
+  for callers that can work batch by batch without copying.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from django.conf import settings
+from django.db.models import Avg, Count, F, IntegerField, Max, Min, StdDev, Sum
+from django.db.models.functions import Cast
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from .models import EquipmentRecord
+
+COLUMNS = ['equipment_name', 'type', 'flowrate', 'pressure', 'temperature']
+NUMERIC_FIELDS = ['flowrate', 'pressure', 'temperature']
+GROUP_FIELDS = ['type']
+
+# aggregate name -> (ORM aggregate, Arrow hash aggregate)
+AGGREGATES = {
+    'count': (Count, 'count'),
+    'sum': (Sum, 'sum'),
+    'mean': (Avg, 'mean'),
+    'min': (Min, 'min'),
+    'max': (Max, 'max'),
+    'std': (lambda field: StdDev(field, sample=True), 'stddev'),
+}
+
+
+def metric_name(func, field):
+    return f'{func}_{field}' if field else func
+
+
+def _plain(value):
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+class NullWriter:
+    def write(self, chunk):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class ORMRecordStore:
+    def open_writer(self, dataset_id):
+        # Rows are already inserted by the ingest; nothing else to write.
+        return NullWriter()
+
+    def read(self, dataset_id, columns=None, limit=None):
+        columns = list(columns or COLUMNS)
+        queryset = EquipmentRecord.objects.filter(dataset_id=dataset_id).order_by('id').values_list(*columns)
+        if limit is not None:
+            queryset = queryset[:limit]
+        return pd.DataFrame.from_records(list(queryset), columns=columns)
+
+    def aggregate(self, dataset_id, group_by, metrics):
+        queryset = EquipmentRecord.objects.filter(dataset_id=dataset_id)
+        annotations = {metric_name(func, field): AGGREGATES[func][0](field or 'id') for func, field in metrics}
+        if not group_by:
+            return [queryset.aggregate(**annotations)]
+        return list(queryset.values(group_by).annotate(**annotations).order_by(group_by))
+
+    def histogram(self, dataset_id, field, edges):
+        # Bucket numbers are computed in SQL; the (dataset, field) index
+        # covers the query, so SQLite never touches the table rows.
+        low, high, bins = edges[0], edges[-1], len(edges) - 1
+        bucket = Cast((F(field) - low) * (bins / (high - low)), IntegerField())
+        rows = (
+            EquipmentRecord.objects.filter(dataset_id=dataset_id)
+            .annotate(bucket=bucket).values('bucket')
+            .annotate(n=Count('*')).order_by()
+        )
+        counts = np.zeros(bins, dtype=np.int64)
+        for row in rows:
+            counts[min(max(row['bucket'], 0), bins - 1)] += row['n']
+        return counts
+
+    def iter_chunks(self, dataset_id, columns=None, chunk_size=None):
+        # Keyset over the primary key, so each chunk is an index range scan.
+        columns = list(columns or COLUMNS)
+        chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        queryset = EquipmentRecord.objects.filter(dataset_id=dataset_id).order_by('id')
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).values_list('id', *columns)[:chunk_size])
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield pd.DataFrame.from_records(rows, columns=['id'] + columns).drop(columns='id')
+
+    def delete(self, dataset_id):
+        pass
+
+
+class ArrowWriter:
+    def __init__(self, path, schema):
+        self.path = path
+        self.tmp_path = path.with_suffix('.arrow.tmp')
+        self.schema = schema
+        self.sink = pa.OSFile(str(self.tmp_path), 'wb')
+        self.writer = pa.ipc.new_file(self.sink, schema)
+        self.closed = False
+
+    def write(self, chunk):
+        self.writer.write_batch(pa.RecordBatch.from_pandas(chunk[COLUMNS], schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+        self.closed = True
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.writer.close()
+            except pa.ArrowException:
+                pass
+            self.sink.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ArrowRecordStore:
+    schema = pa.schema([
+        ('equipment_name', pa.string()),
+        ('type', pa.string()),
+        ('flowrate', pa.float64()),
+        ('pressure', pa.float64()),
+        ('temperature', pa.float64()),
+    ])
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.RECORD_STORE_DIR)
+
+    def path(self, dataset_id):
+        return self.root / f'dataset_{dataset_id}.arrow'
+
+    def open_writer(self, dataset_id):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return ArrowWriter(self.path(dataset_id), self.schema)
+
+    def read_table(self, dataset_id):
+        path = self.path(dataset_id)
+        if not path.exists():
+            return None
+        # The table's buffers keep the mapping alive after this returns.
+        return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+
+    def read(self, dataset_id, columns=None, limit=None):
+        columns = list(columns or COLUMNS)
+        table = self.read_table(dataset_id)
+        if table is None:
+            # Ingested before this store was enabled.
+            return ORMRecordStore().read(dataset_id, columns, limit)
+        if limit is not None:
+            table = table.slice(0, limit)
+        return pd.DataFrame({
+            name: table.column(name).to_numpy()
+            for name in columns
+        })
+
+    def aggregate(self, dataset_id, group_by, metrics):
+        table = self.read_table(dataset_id)
+        if table is None:
+            return ORMRecordStore().aggregate(dataset_id, group_by, metrics)
+
+        # Arrow's hash aggregates run over the mapped buffers directly.
+        aggregations = []
+        for func, field in metrics:
+            if not field:
+                aggregations.append(([], 'count_all'))
+            elif func == 'std':
+                aggregations.append((field, 'stddev', pc.VarianceOptions(ddof=1)))
+            else:
+                aggregations.append((field, AGGREGATES[func][1]))
+        keys = [group_by] if group_by else []
+        result = table.group_by(keys).aggregate(aggregations)
+        if group_by:
+            result = result.sort_by(group_by)
+
+        # Aggregate columns keep the requested order; key columns keep their name.
+        names = iter(metric_name(func, field) for func, field in metrics)
+        result = result.rename_columns([
+            column if column in keys else next(names) for column in result.column_names
+        ])
+        names = [metric_name(func, field) for func, field in metrics]
+        return [
+            {key: _plain(row[key]) for key in keys + names}
+            for row in result.to_pylist()
+        ]
+
+    def histogram(self, dataset_id, field, edges):
+        table = self.read_table(dataset_id)
+        if table is None:
+            return ORMRecordStore().histogram(dataset_id, field, edges)
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for chunk in table.column(field).chunks:
+            counts += np.histogram(chunk.to_numpy(), bins=edges)[0]
+        return counts
+
+    def iter_chunks(self, dataset_id, columns=None, chunk_size=None):
+        columns = list(columns or COLUMNS)
+        table = self.read_table(dataset_id)
+        if table is None:
+            yield from ORMRecordStore().iter_chunks(dataset_id, columns, chunk_size)
+            return
+        for batch in table.select(columns).to_batches(max_chunksize=chunk_size):
+            yield batch.to_pandas()
+
+    def delete(self, dataset_id):
+        self.path(dataset_id).unlink(missing_ok=True)
+
+
+def _load_store():
+    return import_string(settings.RECORD_STORE)()
+
+
+record_store = SimpleLazyObject(_load_store)
@@ -0,0 +1,66 @@
+"""
+Synthetic equipment data for benchmarks and load tests.
+
+Rows follow the upload schema (Equipment Name, Type, Flowrate, Pressure,
+Temperature), with readings drawn around plant-typical means. ``types``
+sets how many distinct equipment types appear: the five real ones first,
+then numbered ones (Type-5, Type-6, ...). The same arguments always give
+the same rows.
+
+iter_csv() generates a file CHUNK_ROWS rows at a time from one random
+stream, so a 10M-row CSV is written in bounded memory; files of up to
+CHUNK_ROWS rows hold exactly synthetic_records() of the same seed.
+"""
+import numpy as np
+import pandas as pd
+
+from .ingest import CSV_FIELDS
+
+TYPE_NAMES = ['Pump', 'Valve', 'Compressor', 'HeatExchanger', 'Reactor']
+CHUNK_ROWS = 250_000
+
+
+def type_names(types):
+    if types < 1:
+        raise ValueError('types must be at least 1')
+    return TYPE_NAMES[:types] + [f'Type-{i}' for i in range(len(TYPE_NAMES), types)]
+
+
+def _records(rng, n, names, start):
+    types = rng.choice(names, n)
+    return pd.DataFrame({
+        'equipment_name': [f'{t}-{i}' for i, t in enumerate(types, start)],
+        'type': types,
+        'flowrate': rng.normal(120, 30, n).round(2),
+        'pressure': rng.normal(6, 1.5, n).round(2),
+        'temperature': rng.normal(110, 15, n).round(2),
+    })
+
+
+def synthetic_records(n, seed=0, types=len(TYPE_NAMES)):
+    """``n`` rows as a frame of record fields (equipment_name, type, ...)."""
+    return _records(np.random.default_rng(seed), n, type_names(types), 0)
+
+
+def iter_csv(rows, seed=0, types=len(TYPE_NAMES)):
+    """The CSV of ``rows`` synthetic rows as encoded chunks, header first."""
+    rng = np.random.default_rng(seed)
+    names = type_names(types)
+    headers = {field: header for header, field in CSV_FIELDS.items()}
+    yield (','.join(headers.values()) + '\n').encode()
+    for start in range(0, rows, CHUNK_ROWS):
+        frame = _records(rng, min(CHUNK_ROWS, rows - start), names, start)
+        yield frame.to_csv(index=False, header=False).encode()
+
+
+def synthetic_csv(rows, seed=0, types=len(TYPE_NAMES)):
+    return b''.join(iter_csv(rows, seed, types))
+
+
+def write_csv(path, rows, seed=0, types=len(TYPE_NAMES)):
+    """Stream iter_csv() into ``path``; returns the bytes written."""
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in iter_csv(rows, seed, types):
+            size += f.write(chunk)
+    return size
@@ -1,3 +1,1307 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlencode, urlsplit
 
-# Create your tests here.
+import pandas as pd
+import pyarrow as pa
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .aggregates import parse_metrics
+from .anomalies import flag_anomalies
+from .auth import token_cache
+from . import cache as response_cache
+from .cache import BoundedLocMemCache
+from .export import CSV_HEADER, EXPORT_FIELDS
+from .management.commands.bench_sqlite import use_profile
+from .ingest import DuplicateUpload, IngestError, ingest_csv
+from . import ingest, jobs, reports
+from .models import Dataset, EquipmentRecord, IngestJob
+from .renderers import FastJSONRenderer
+from .retention import apply_retention
+from .serializers import DatasetSerializer, EquipmentRecordSerializer
+from .stats import QUANTILES, compute_stats
+from .storage import ArrowRecordStore, ORMRecordStore, record_store
+from .synthetic import synthetic_csv, synthetic_records
+from .trends import record_trend
+from .views import RecordCursorPagination
+
+
+def make_records(dataset, n=60):
+    types = ['Pump', 'Valve', 'Compressor']
+    EquipmentRecord.objects.bulk_create([
+        EquipmentRecord(
+            dataset=dataset,
+            equipment_name=f'E-{i}',
+            type=types[i % 3],
+            flowrate=100 + i,
+            # Few distinct pressures, so pages have to break ties on id.
+            pressure=5 + i % 4,
+            temperature=100 + i % 7,
+        )
+        for i in range(n)
+    ])
+
+
+class BaseTestCase(TestCase):
+    """
+    A user ``u`` with an authenticated ``self.client``, and empty caches.
+    Set ``records`` to also get ``self.dataset`` with that many make_records() rows.
+    """
+    records = None
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user('u', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        if self.records is not None:
+            self.dataset = Dataset.objects.create(filename='x.csv', summary_stats={'count': self.records})
+            make_records(self.dataset, n=self.records)
+
+    def token_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+
+class UploadTestCase(BaseTestCase):
+    """Uploads ingested inline, spooled to a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.enterContext(override_settings(INGEST_ASYNC=False, INGEST_SPOOL_DIR=spool_dir.name))
+        self.content = synthetic_csv(500, seed=1, types=4)
+
+    def upload(self, content, name='x.csv', client=None, **params):
+        return (client or self.client).post(
+            '/api/upload/', {'file': SimpleUploadedFile(name, content), **params}, format='multipart',
+        )
+
+
+class IngestTests(UploadTestCase):
+    def test_chunks_match_whole_file(self):
+        # What the single read + bulk_create upload stored.
+        frame = pd.read_csv(io.BytesIO(self.content))
+        expected_rows = list(frame.itertuples(index=False, name=None))
+        expected_stats = {
+            'count': len(frame),
+            'avg_flowrate': frame['Flowrate'].mean(),
+            'avg_pressure': frame['Pressure'].mean(),
+            'avg_temperature': frame['Temperature'].mean(),
+            'type_distribution': frame['Type'].value_counts().to_dict(),
+        }
+        for chunk_size in [64, 10_000]:
+            dataset = ingest_csv(io.BytesIO(self.content), 'x.csv', chunk_size=chunk_size)
+            rows = EquipmentRecord.objects.filter(dataset=dataset).order_by('id')
+            self.assertEqual(
+                list(rows.values_list('equipment_name', 'type', 'flowrate', 'pressure', 'temperature')),
+                expected_rows,
+            )
+            stats = dataset.summary_stats
+            self.assertEqual(stats['count'], expected_stats['count'])
+            self.assertEqual(stats['type_distribution'], expected_stats['type_distribution'])
+            for key in ['avg_flowrate', 'avg_pressure', 'avg_temperature']:
+                self.assertAlmostEqual(stats[key], expected_stats[key], places=9)
+
+    def test_bad_row_in_later_chunk_rolls_back(self):
+        lines = self.content.splitlines()
+        lines[400] = b'Bad-1,Pump,fast,5.0,100.0'
+        content = b'\n'.join(lines) + b'\n'
+        with self.assertRaisesMessage(IngestError, 'Flowrate'):
+            ingest_csv(io.BytesIO(content), 'x.csv', chunk_size=64)
+        # The chunks before the bad row had committed; none are left.
+        self.assertFalse(Dataset.all_objects.exists())
+        self.assertFalse(EquipmentRecord.objects.exists())
+
+        with override_settings(INGEST_CHUNK_SIZE=64):
+            job = self.upload(content).json()
+        self.assertEqual(job['phase'], 'failed')
+        self.assertIn('Flowrate', job['error'])
+        self.assertFalse(Dataset.all_objects.exists())
+        self.assertFalse(EquipmentRecord.objects.exists())
+
+    def test_non_finite_values(self):
+        for value in [b'inf', b'-inf', b'Infinity', b'nan']:
+            content = b'Equipment Name,Type,Flowrate,Pressure,Temperature\nP-1,Pump,1,2,3\nP-2,Pump,%s,2,3\n' % value
+            job = self.upload(content).json()
+            self.assertEqual((job['phase'], job['error']), ('failed', 'Column Flowrate contains non-numeric values'))
+        self.assertFalse(Dataset.all_objects.exists())
+        self.assertFalse(EquipmentRecord.objects.exists())
+
+    def test_dataset_hidden_until_ready(self):
+        seen = []
+
+        def progress(rows):
+            [staged] = Dataset.all_objects.all()
+            self.assertFalse(staged.ready)
+            self.assertFalse(Dataset.objects.exists())
+            self.assertEqual(self.client.get('/api/history/').json()['count'], 0)
+            self.assertEqual(self.client.get(f'/api/dataset/{staged.pk}/').json()['results'], [])
+            self.assertEqual(self.client.get(f'/api/dataset/{staged.pk}/summary/').status_code, 404)
+            seen.append(EquipmentRecord.objects.filter(dataset=staged).count())
+
+        dataset = ingest_csv(io.BytesIO(self.content), 'x.csv', chunk_size=200, progress=progress)
+        # Each chunk was committed before the next one was read.
+        self.assertEqual(seen, [200, 400, 500])
+        self.assertTrue(Dataset.objects.get(pk=dataset.pk).ready)
+        self.assertEqual(self.client.get('/api/history/').json()['count'], 1)
+
+    def test_identical_upload_finished_first(self):
+        # Two workers past the up-front duplicate check: the one to finish
+        # second is dropped at its last step, records and all.
+        def progress(rows):
+            if rows == 200:
+                ingest_csv(io.BytesIO(self.content), 'first.csv', content_hash='abc')
+
+        with self.assertRaises(DuplicateUpload) as raised:
+            ingest_csv(io.BytesIO(self.content), 'second.csv', chunk_size=200, progress=progress, content_hash='abc')
+        [dataset] = Dataset.all_objects.all()
+        self.assertEqual((raised.exception.dataset, dataset.filename), (dataset, 'first.csv'))
+        self.assertEqual(EquipmentRecord.objects.count(), 500)
+
+    def test_header_errors(self):
+        for content in [b'', b'Equipment Name,Type,Flowrate\nP-1,Pump,1\n']:
+            response = self.upload(content)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.upload(self.content, name='x.txt').status_code, 400)
+        self.assertFalse(Dataset.objects.exists())
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class IngestJobTests(UploadTestCase):
+    def run_queued(self, callbacks):
+        """Run the on_commit callbacks of a queued upload, with the worker pool inline."""
+        with override_settings(INGEST_ASYNC=True), \
+                mock.patch.object(jobs, 'get_executor', return_value=InlineExecutor()):
+            for callback in callbacks:
+                callback()
+
+    def test_queued_then_done(self):
+        with override_settings(INGEST_ASYNC=True), self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload(self.content)
+        self.assertEqual(response.status_code, 202)
+        url = f'/api/jobs/{response.json()["id"]}/'
+        self.assertEqual(response.json()['phase'], 'queued')
+        self.assertEqual(self.client.get(url).json()['phase'], 'queued')
+
+        phases = []
+        ingest = jobs.ingest_csv
+
+        def watched(file, filename, progress, **kwargs):
+            phases.append(IngestJob.objects.get().phase)
+
+            def reported(rows):
+                progress(rows)
+                phases.append(self.client.get(url).json()['rows_processed'])
+            return ingest(file, filename, progress=reported, **kwargs)
+
+        with override_settings(INGEST_CHUNK_SIZE=200), mock.patch.object(jobs, 'ingest_csv', watched):
+            self.run_queued(callbacks)
+        self.assertEqual(phases, ['ingesting', 200, 400, 500])
+        job = self.client.get(url).json()
+        self.assertEqual(job['phase'], 'done')
+        self.assertEqual(job['rows_processed'], 500)
+        self.assertEqual(Dataset.objects.get(pk=job['dataset']).summary_stats['count'], 500)
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_failed(self):
+        with override_settings(INGEST_ASYNC=True), self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload(self.content.replace(b',Pump,', b',,', 1))
+        self.assertEqual(response.status_code, 202)
+        self.run_queued(callbacks)
+        job = self.client.get(f'/api/jobs/{response.json()["id"]}/').json()
+        self.assertEqual(job['phase'], 'failed')
+        self.assertIn('Type', job['error'])
+        self.assertIsNone(job['dataset'])
+        self.assertFalse(Dataset.all_objects.exists())
+
+    def test_identical_uploads_queued_together(self):
+        with override_settings(INGEST_ASYNC=True), self.captureOnCommitCallbacks() as callbacks:
+            first = self.upload(self.content).json()
+        with override_settings(INGEST_ASYNC=True), self.captureOnCommitCallbacks() as more:
+            second = self.upload(self.content).json()
+        self.assertEqual((first['phase'], second['phase']), ('queued', 'queued'))
+        self.run_queued(callbacks + more)
+
+        [dataset] = Dataset.objects.all()
+        self.assertIsNotNone(dataset.content_hash)
+        first = self.client.get(f'/api/jobs/{first["id"]}/').json()
+        second = self.client.get(f'/api/jobs/{second["id"]}/').json()
+        self.assertEqual((first['phase'], first['deduplicated']), ('done', False))
+        self.assertEqual((second['phase'], second['deduplicated']), ('done', True))
+        self.assertEqual(first['dataset'], dataset.pk)
+        self.assertEqual(second['dataset'], dataset.pk)
+        self.assertEqual(EquipmentRecord.objects.count(), 500)
+
+    def test_jobs_visible_to_owner_and_staff(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        job_id = self.upload(self.content, client=other).json()['id']
+
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/jobs/').json()['count'], 0)
+        self.assertEqual(other.get(f'/api/jobs/{job_id}/').status_code, 200)
+        staff = APIClient()
+        staff.force_authenticate(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(staff.get(f'/api/jobs/{job_id}/').status_code, 200)
+
+    def test_force(self):
+        first = self.upload(self.content).json()
+        again = self.upload(self.content)
+        self.assertEqual(again.status_code, 200)
+        self.assertTrue(again.json()['deduplicated'])
+        self.assertEqual(again.json()['dataset'], first['dataset'])
+
+        forced = self.upload(self.content, force='true')
+        self.assertEqual(forced.status_code, 202)
+        self.assertFalse(forced.json()['deduplicated'])
+        self.assertNotEqual(forced.json()['dataset'], first['dataset'])
+        self.assertEqual(Dataset.objects.count(), 2)
+        # The hash moved to the forced re-ingest.
+        self.assertIsNone(Dataset.objects.get(pk=first['dataset']).content_hash)
+        self.assertIsNotNone(Dataset.objects.get(pk=forced.json()['dataset']).content_hash)
+
+
+class ConcurrentWriteTests(SimpleTestCase):
+    """
+    An upload and other writes on one SQLite file under the production
+    profile, from two threads: the writes go through while the ingest is
+    running instead of waiting for it (and failing) on the write lock.
+    """
+    databases = {'default'}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        # The test database is in memory; restore its connection afterwards.
+        original, test_connection = connections.settings['default'], connections['default']
+
+        def restore():
+            connections.close_all()
+            connections.settings['default'] = original
+            connections['default'] = test_connection
+        self.addCleanup(restore)
+
+        use_profile('production', self.tmp / 'db.sqlite3')
+        # A waiting writer gives up after 2 s instead of 30.
+        connections.settings['default']['OPTIONS'] = {**connections.settings['default']['OPTIONS'], 'timeout': 2}
+        call_command('migrate', verbosity=0)
+        self.enterContext(override_settings(INGEST_ASYNC=False, RETENTION_POLICY={'keep_last': None}))
+
+    def test_writes_during_ingest(self):
+        path = self.tmp / 'upload.csv'
+        path.write_bytes(synthetic_csv(1_000, seed=5))
+        user = User.objects.create_user('u')
+        job = IngestJob.objects.create(filename='upload.csv', created_by=user)
+
+        mid_ingest, written = threading.Event(), threading.Event()
+        ingest = jobs.ingest_csv
+
+        def paused(file, filename, progress, **kwargs):
+            def reported(rows):
+                progress(rows)
+                if rows == 200:
+                    mid_ingest.set()
+                    written.wait(10)
+            return ingest(file, filename, progress=reported, chunk_size=200, **kwargs)
+
+        def worker():
+            try:
+                jobs.run_job(job.pk, path)
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(jobs, 'ingest_csv', paused):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            try:
+                self.assertTrue(mid_ingest.wait(10))
+                # What requests write while an upload runs.
+                queued = IngestJob.objects.create(filename='next.csv', created_by=user)
+                Token.objects.get_or_create(user=user)
+                User.objects.filter(pk=user.pk).update(email='u@example.com')
+                self.assertEqual(IngestJob.objects.get(pk=job.pk).rows_processed, 200)
+            finally:
+                written.set()
+                thread.join()
+
+        job.refresh_from_db()
+        self.assertEqual((job.phase, job.rows_processed), (IngestJob.PHASE_DONE, 1_000))
+        self.assertEqual(Dataset.objects.get().summary_stats['count'], 1_000)
+        self.assertEqual(IngestJob.objects.get(pk=queued.pk).phase, IngestJob.PHASE_QUEUED)
+
+
+class RecordStoreTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.arrow, self.orm = ArrowRecordStore(root.name), ORMRecordStore()
+        with mock.patch.object(ingest, 'record_store', self.arrow):
+            self.dataset = ingest_csv(io.BytesIO(synthetic_csv(1_000, seed=2, types=6)), 'x.csv', chunk_size=300)
+
+    def test_same_results_as_orm(self):
+        pk = self.dataset.pk
+        self.assertTrue(self.arrow.path(pk).exists())
+        pd.testing.assert_frame_equal(self.arrow.read(pk), self.orm.read(pk))
+        pd.testing.assert_frame_equal(self.arrow.read(pk, ['type', 'pressure'], limit=10),
+                                      self.orm.read(pk, ['type', 'pressure'], limit=10))
+        pd.testing.assert_frame_equal(
+            pd.concat(self.arrow.iter_chunks(pk, ['flowrate'], 250), ignore_index=True),
+            pd.concat(self.orm.iter_chunks(pk, ['flowrate'], 250), ignore_index=True),
+        )
+
+        metrics = [('count', None), ('sum', 'flowrate'), ('mean', 'pressure'),
+                   ('min', 'temperature'), ('max', 'temperature'), ('std', 'flowrate')]
+        for group_by in [None, 'type']:
+            arrow, orm = self.arrow.aggregate(pk, group_by, metrics), self.orm.aggregate(pk, group_by, metrics)
+            self.assertEqual(len(arrow), len(orm))
+            for a, o in zip(arrow, orm):
+                self.assertEqual(a.keys(), o.keys())
+                for key in a:
+                    if isinstance(a[key], float):
+                        self.assertAlmostEqual(a[key], o[key], places=6)
+                    else:
+                        self.assertEqual(a[key], o[key])
+
+        edges = [0, 50, 100, 150, 200, 250]
+        self.assertEqual(list(self.arrow.histogram(pk, 'flowrate', edges)),
+                         list(self.orm.histogram(pk, 'flowrate', edges)))
+
+    def test_fallback_and_delete(self):
+        # Datasets ingested before the store was enabled read through the ORM.
+        other = Dataset.objects.create(filename='y.csv')
+        make_records(other, n=10)
+        pd.testing.assert_frame_equal(self.arrow.read(other.pk), self.orm.read(other.pk))
+        self.arrow.delete(self.dataset.pk)
+        self.assertFalse(self.arrow.path(self.dataset.pk).exists())
+
+
+class RetentionPolicyTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Newest first: 1, 3, 10 and 30 days old, 10/20/30/40 records.
+        self.datasets = []
+        for age, n in [(1, 10), (3, 20), (10, 30), (30, 40)]:
+            dataset = Dataset.objects.create(filename=f'{age}d.csv', summary_stats={'count': n})
+            Dataset.objects.filter(pk=dataset.pk).update(upload_timestamp=timezone.now() - timedelta(days=age))
+            make_records(dataset, n=n)
+            self.datasets.append(dataset.pk)
+
+    def assertKept(self, kept, **policy):
+        with override_settings(RETENTION_POLICY={'keep_last': None, 'max_age_days': None,
+                                                 'max_total_rows': None, **policy}):
+            dry = apply_retention(dry_run=True)
+            self.assertEqual(Dataset.objects.count(), 4)
+            report = apply_retention()
+        kept = [self.datasets[i] for i in kept]
+        self.assertEqual(sorted(Dataset.objects.values_list('pk', flat=True)), sorted(kept))
+        self.assertEqual(set(EquipmentRecord.objects.values_list('dataset', flat=True)), set(kept))
+        self.assertEqual(report['datasets'], 4 - len(kept))
+        self.assertEqual((dry['datasets'], dry['records']), (report['datasets'], report['records']))
+
+    def test_keep_last(self):
+        self.assertKept([0, 1], keep_last=2)
+
+    def test_max_age(self):
+        self.assertKept([0, 1], max_age_days=5)
+
+    def test_max_total_rows(self):
+        self.assertKept([0, 1], max_total_rows=35)
+
+    def test_newest_always_kept(self):
+        self.assertKept([0], max_age_days=0.5, max_total_rows=5)
+
+    def test_invalidates_cached_responses(self):
+        oldest = self.datasets[-1]
+        summary = f'/api/dataset/{oldest}/summary/'
+        self.assertEqual(self.client.get(summary).status_code, 200)
+        self.assertEqual(self.client.get('/api/history/').json()['count'], 4)
+        apply_retention(keep_last=3)
+        self.assertEqual(self.client.get(summary).status_code, 404)
+        history = self.client.get('/api/history/').json()
+        self.assertEqual(history['count'], 3)
+        self.assertNotIn(oldest, [row['id'] for row in history['results']])
+
+    def test_abandoned_ingests(self):
+        # Not ready: one a day old (its process died), one still ingesting.
+        abandoned, ingesting = [Dataset.all_objects.create(filename=f'{n}.csv', ready=False) for n in 'ab']
+        Dataset.all_objects.filter(pk=abandoned.pk).update(upload_timestamp=timezone.now() - timedelta(days=2))
+        make_records(abandoned, n=5)
+        make_records(ingesting, n=5)
+
+        report = apply_retention(keep_last=10)
+        self.assertEqual((report['datasets'], report['records']), (1, 5))
+        self.assertEqual(Dataset.objects.count(), 4)
+        self.assertEqual(list(Dataset.all_objects.filter(ready=False)), [ingesting])
+        # Staging datasets never count against the policy.
+        apply_retention(keep_last=1)
+        self.assertEqual(list(Dataset.all_objects.values_list('pk', flat=True).order_by('pk')),
+                         [self.datasets[0], ingesting.pk])
+
+
+class StreamingStatsTests(TestCase):
+    def setUp(self):
+        self.frame = synthetic_records(20_000, seed=4, types=6)
+
+    def chunks(self, size):
+        return [self.frame.iloc[start:start + size] for start in range(0, len(self.frame), size)]
+
+    def assertDescribes(self, described, values, quantile_tolerance=None):
+        self.assertEqual(described['count'], len(values))
+        self.assertAlmostEqual(described['mean'], values.mean(), places=9)
+        self.assertAlmostEqual(described['std'], values.std(), places=9)
+        self.assertEqual((described['min'], described['max']), (values.min(), values.max()))
+        for q in QUANTILES:
+            value = described[f'p{round(q * 100):02d}']
+            if quantile_tolerance is None:
+                self.assertAlmostEqual(value, values.quantile(q), places=9)
+            else:
+                # A sampled quantile lands near the true one in rank.
+                self.assertAlmostEqual((values <= value).mean(), q, delta=quantile_tolerance)
+
+    def test_chunked_matches_pandas(self):
+        stats = compute_stats(self.chunks(1_333), seed=0).detailed()
+        self.assertEqual(stats['quantiles']['method'], 'exact')
+        for field in ['flowrate', 'pressure', 'temperature']:
+            self.assertDescribes(stats['global'][field], self.frame[field])
+            for type_, group in self.frame.groupby('type'):
+                self.assertDescribes(stats['by_type'][type_][field], group[field])
+        self.assertEqual(
+            {type_: entry['count'] for type_, entry in stats['by_type'].items()},
+            self.frame['type'].value_counts().to_dict(),
+        )
+
+    def test_sampled_quantiles(self):
+        stats = compute_stats(self.chunks(1_000), sample_size=4_000, seed=0).detailed()
+        self.assertEqual(stats['quantiles'], {'method': 'sampled', 'sample_size': 4_000})
+        for field in ['flowrate', 'pressure', 'temperature']:
+            self.assertDescribes(stats['global'][field], self.frame[field], quantile_tolerance=0.02)
+
+
+class AggregateTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = ingest_csv(io.BytesIO(synthetic_csv(2_000, seed=5, types=4)), 'x.csv', chunk_size=500)
+        self.url = f'/api/dataset/{self.dataset.pk}/aggregate/'
+
+    def get(self, group_by, metrics):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'group_by': group_by or '', 'metrics': metrics})
+        self.assertEqual(response.status_code, 200)
+        scanned = any('core_equipmentrecord' in q['sql'] for q in queries.captured_queries)
+        return response.json()['results'], scanned
+
+    def assertRowsEqual(self, rows, expected):
+        self.assertEqual(len(rows), len(expected))
+        for row, other in zip(rows, expected):
+            self.assertEqual(row.keys(), other.keys())
+            for key, value in row.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(value, other[key], places=6)
+                else:
+                    self.assertEqual(value, other[key])
+
+    def test_stats_path_matches_record_store(self):
+        metrics = 'count,mean:flowrate,min:pressure,max:temperature,std:flowrate'
+        for group_by in [None, 'type']:
+            rows, scanned = self.get(group_by, metrics)
+            self.assertFalse(scanned)
+            expected = record_store.aggregate(self.dataset.pk, group_by, parse_metrics(metrics))
+            self.assertRowsEqual(rows, expected)
+
+    def test_record_store_path(self):
+        rows, scanned = self.get('type', 'sum:pressure,mean:pressure')
+        self.assertTrue(scanned)
+        frame = synthetic_records(2_000, seed=5, types=4).groupby('type')['pressure']
+        self.assertRowsEqual(rows, [
+            {'type': type_, 'sum_pressure': values.sum(), 'mean_pressure': values.mean()}
+            for type_, values in frame
+        ])
+
+    def test_invalid(self):
+        for params in [{}, {'metrics': 'median:flowrate'}, {'metrics': 'mean:colour'},
+                       {'metrics': 'count', 'group_by': 'equipment_name'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.client.get('/api/dataset/999/aggregate/', {'metrics': 'count'}).status_code, 404)
+
+
+@override_settings(SCATTER_MAX_POINTS=500, SCATTER_MAX_BINS=16, HISTOGRAM_MAX_BINS=20, TOP_N_MAX=7)
+class ChartBoundsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = ingest_csv(io.BytesIO(synthetic_csv(3_000, seed=6, types=5)), 'x.csv')
+        self.url = f'/api/dataset/{self.dataset.pk}'
+
+    def get(self, path, **params):
+        response = self.client.get(f'{self.url}/{path}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_scatter_points(self):
+        data = self.get('scatter', max_points=100)
+        self.assertLessEqual(data['returned'], 100)
+        # Every type keeps some points, however small its share.
+        self.assertEqual(set(data['points']['type']), set(self.dataset.summary_stats['type_distribution']))
+        self.assertEqual(self.get('scatter', max_points=100)['points'], data['points'])
+        # Clamped to SCATTER_MAX_POINTS; quotas round down per type.
+        returned = self.get('scatter', max_points=10**9)['returned']
+        self.assertLessEqual(returned, 500)
+        self.assertGreater(returned, 500 - 5)
+
+    def test_bins(self):
+        grid = self.get('scatter', mode='bin', bins=10**6)
+        self.assertEqual((len(grid['counts']), len(grid['counts'][0])), (16, 16))
+        self.assertEqual(sum(map(sum, grid['counts'])), 3_000)
+        histogram = self.get('histogram', field='pressure', bins=10**6)
+        self.assertEqual((len(histogram['counts']), len(histogram['edges'])), (20, 21))
+        self.assertEqual(sum(histogram['counts']), 3_000)
+
+    def test_top_n(self):
+        values = sorted(EquipmentRecord.objects.filter(dataset=self.dataset).values_list('temperature', flat=True))
+        top = self.get('top', field='temperature', n=1_000)
+        self.assertEqual(top['n'], 7)
+        self.assertEqual([row['temperature'] for row in top['results']], values[::-1][:7])
+        bottom = self.get('bottom', field='temperature', n=3)
+        self.assertEqual([row['temperature'] for row in bottom['results']], values[:3])
+
+    def test_invalid(self):
+        for path, params in [('scatter', {'max_points': 0}), ('scatter', {'mode': 'hex'}),
+                             ('histogram', {'bins': 'many'}), ('histogram', {'field': 'colour'}),
+                             ('top', {'n': -1})]:
+            response = self.client.get(f'{self.url}/{path}/', params)
+            self.assertEqual(response.status_code, 400, (path, params))
+            self.assertIn('error', response.json())
+
+
+class RecordPaginationTests(BaseTestCase):
+    records = 60
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/dataset/{self.dataset.pk}/'
+
+    def test_default_page_size(self):
+        for url in [self.url, f'/api/async/dataset/{self.dataset.pk}/']:
+            with mock.patch.object(RecordCursorPagination, 'page_size', 25):
+                data = self.token_client(self.user).get(url).json()
+            self.assertEqual(len(data['results']), 25, url)
+            self.assertIsNotNone(data['next'])
+        self.assertEqual(RecordCursorPagination.page_size, settings.RECORDS_PAGE_SIZE)
+        self.assertEqual(len(self.client.get(self.url).json()['results']), 60)
+
+    def test_count_and_summary_on_first_page_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.url, {'page_size': 25}).json()
+        self.assertEqual(first['count'], 60)
+        self.assertEqual(first['summary'], {'count': 60})
+        # The count comes from the stored summary, not a COUNT(*).
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first['next']).json()
+        self.assertNotIn('count', second)
+        self.assertNotIn('summary', second)
+        # Only the ETag's timestamp lookup touches the dataset.
+        self.assertFalse(any('summary_stats' in q['sql'] for q in queries.captured_queries))
+
+        counted = self.client.get(first['next'] + '&count=true').json()
+        self.assertEqual(counted['count'], 60)
+        self.assertNotIn('summary', counted)
+
+    def cursor(self, position, reverse=False):
+        query = urlencode({'p': position, **({'r': 1} if reverse else {})})
+        return base64.b64encode(query.encode()).decode()
+
+    def pages(self, url, link='next'):
+        """The ids of each page from ``url`` on, following ``link``."""
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([r['id'] for r in data['results']])
+            last, url = url, data[link]
+        return pages, last
+
+    def test_cursor_walk_with_ties(self):
+        records = EquipmentRecord.objects.filter(dataset=self.dataset)
+        for ordering, order_by in [('pressure', ['pressure', 'id']), ('-pressure', ['-pressure', '-id']),
+                                   ('temperature', ['temperature', 'id']), ('-id', ['-id'])]:
+            forward, last = self.pages(f'{self.url}?page_size=7&ordering={ordering}')
+            expected = list(records.order_by(*order_by).values_list('id', flat=True))
+            self.assertEqual(sum(forward, []), expected, ordering)
+            self.assertEqual(len(forward), 9)
+            # Back from the last page through `previous`, the same pages in reverse.
+            backward, _ = self.pages(last, link='previous')
+            self.assertEqual(backward, forward[::-1], ordering)
+
+    def test_seek_past_equal_values(self):
+        first = self.client.get(self.url, {'page_size': 7, 'ordering': 'pressure'}).json()
+        last = EquipmentRecord.objects.get(pk=first['results'][-1]['id'])
+        # Fifteen records share the lowest pressure; the cursor holds value and id.
+        cursor = parse_qs(urlsplit(first['next']).query)['cursor'][0]
+        self.assertEqual(parse_qs(base64.b64decode(cursor).decode())['p'], [f'{last.pressure}|{last.id}'])
+
+        second = self.client.get(self.url, {'page_size': 7, 'ordering': 'pressure',
+                                            'cursor': self.cursor(f'{last.pressure}|{last.id}')}).json()
+        expected = EquipmentRecord.objects.filter(dataset=self.dataset).order_by('pressure', 'id')[7:14]
+        self.assertEqual([r['id'] for r in second['results']], [r.id for r in expected])
+        self.assertEqual({r['pressure'] for r in second['results']}, {last.pressure})
+
+    def test_malformed_cursor(self):
+        for params in [{'cursor': 'not base64!'},
+                       {'cursor': self.cursor('5.0'), 'ordering': 'pressure'},
+                       {'cursor': self.cursor('high|3'), 'ordering': 'pressure'},
+                       {'cursor': self.cursor('5.0|x'), 'ordering': 'pressure'},
+                       {'cursor': self.cursor('x')}]:
+            for url in [self.url, f'/api/async/dataset/{self.dataset.pk}/']:
+                response = self.token_client(self.user).get(url, params)
+                self.assertEqual(response.status_code, 404, (url, params))
+                self.assertIn('detail', response.json())
+
+    def test_arrow_pages_match_json(self):
+        def arrow_page(url, params=None):
+            response = self.client.get(url, params, HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+            self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+            table = pa.ipc.open_stream(response.content).read_all()
+            self.assertEqual(table.column_names, EXPORT_FIELDS)
+            extra = {key.decode(): json.loads(value) for key, value in table.schema.metadata.items()}
+            return table.to_pylist(), extra
+
+        params = {'page_size': 25, 'ordering': '-pressure'}
+        rows, extra = arrow_page(self.url, params)
+        first = self.client.get(self.url, params).json()
+        self.assertEqual(rows, [{field: r[field] for field in EXPORT_FIELDS} for r in first['results']])
+        self.assertEqual(extra['next'], first['next'])
+        self.assertEqual((extra['count'], extra['summary']), (60, {'count': 60}))
+
+        # The metadata links walk the same pages as the JSON ones.
+        seen, path = rows, extra['next']
+        while path:
+            rows, extra = arrow_page(path)
+            self.assertNotIn('summary', extra)
+            seen += rows
+            path = extra['next']
+        expected = EquipmentRecord.objects.filter(dataset=self.dataset).order_by('-pressure', '-id')
+        self.assertEqual(seen, list(expected.values(*EXPORT_FIELDS)))
+
+
+class RecordFilterTests(BaseTestCase):
+    records = 60
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/dataset/{self.dataset.pk}/'
+
+    def walk(self, query):
+        response = self.client.get(f'{self.url}?{query}&page_size=7')
+        ids = [r['id'] for r in response.json()['results']]
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            ids += [r['id'] for r in response.json()['results']]
+        return ids
+
+    def test_filters_and_ordering(self):
+        records = EquipmentRecord.objects.filter(dataset=self.dataset)
+        expected = records.filter(type='Pump', pressure__gt=6).order_by('id')
+        self.assertEqual(self.walk('type=Pump&pressure__gt=6'), [r.id for r in expected])
+
+        expected = records.filter(flowrate__gte=110, flowrate__lt=140).order_by('-pressure', '-id')
+        self.assertEqual(self.walk('flowrate__gte=110&flowrate__lt=140&ordering=-pressure'), [r.id for r in expected])
+
+        expected = records.filter(type__in=['Pump', 'Valve']).order_by('temperature', 'id')
+        self.assertEqual(self.walk('type=Pump,Valve&ordering=temperature'), [r.id for r in expected])
+
+    def test_filtered_count(self):
+        data = self.client.get(f'{self.url}?type=Valve&count=true').json()
+        self.assertEqual(data['count'], 20)
+        self.assertNotIn('count', self.client.get(f'{self.url}?type=Valve').json())
+
+    def test_invalid_number(self):
+        response = self.client.get(f'{self.url}?pressure__gt=high')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+def record_query_plans(client, url, params=None):
+    """EXPLAIN QUERY PLAN of each core_equipmentrecord query a GET runs."""
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url, params)
+    plans = []
+    with connection.cursor() as cursor:
+        for query in queries.captured_queries:
+            if 'core_equipmentrecord' in query['sql']:
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                plans.append(' / '.join(row[-1] for row in cursor.fetchall()))
+    return plans
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked against SQLite')
+class RecordFilterQueryPlanTests(BaseTestCase):
+    """The records endpoint's queries must be index range scans."""
+    records = 60
+
+    def plan(self, query):
+        url = f'/api/dataset/{self.dataset.pk}/?{query}&page_size=5'
+        response = self.client.get(url)
+        # Follow one cursor so the keyset condition is in the plan too.
+        return record_query_plans(self.client, response.json()['next'])[0]
+
+    def assertPlan(self, query, index, sorted_by_index=True):
+        plan = self.plan(query)
+        self.assertIn(f'INDEX {index} ', plan)
+        self.assertNotIn('SCAN core_equipmentrecord', plan)
+        if sorted_by_index:
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_type(self):
+        self.assertPlan('type=Pump', 'record_dataset_type_idx')
+
+    def test_range(self):
+        self.assertPlan('pressure__gt=6&ordering=pressure', 'record_dataset_pressure_idx')
+        self.assertPlan('flowrate__lt=150&ordering=-flowrate', 'record_dataset_flowrate_idx')
+
+    def test_type_and_range(self):
+        self.assertPlan('type=Pump&pressure__gte=6&ordering=-pressure', 'record_type_pressure_idx')
+        self.assertPlan('type=Valve&temperature__lt=104&ordering=temperature', 'record_type_temp_idx')
+
+    def test_ordering(self):
+        self.assertPlan('ordering=-temperature', 'record_dataset_temp_idx')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked against SQLite')
+class ValueIndexQueryPlanTests(BaseTestCase):
+    """Top/bottom-N and histograms read the (dataset, field) indexes only."""
+    records = 60
+
+    def plans(self, action, **params):
+        plans = record_query_plans(self.client, f'/api/dataset/{self.dataset.pk}/{action}/', params)
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertNotIn('SCAN core_equipmentrecord', plan)
+        return plans
+
+    def test_top_and_bottom(self):
+        # Rows come off the index in order: no sort step.
+        for action, field, index in [('top', 'temperature', 'record_dataset_temp_idx'),
+                                     ('bottom', 'flowrate', 'record_dataset_flowrate_idx')]:
+            [plan] = self.plans(action, field=field, n=3)
+            self.assertIn(f'USING INDEX {index} ', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_histogram(self):
+        # Min/max and the bucket counts never touch the table rows.
+        for plan in self.plans('histogram', field='pressure', bins=4):
+            self.assertIn('USING COVERING INDEX record_dataset_pressure_idx ', plan)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=7)
+class ExportTests(BaseTestCase):
+    records = 60
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/dataset/{self.dataset.pk}/export/'
+        self.rows = list(EquipmentRecord.objects.filter(dataset=self.dataset).order_by('id').values_list(*EXPORT_FIELDS))
+
+    def export(self, fmt, encoding='', url=None, **params):
+        response = self.client.get(url or self.url, {'format': fmt, **params}, HTTP_ACCEPT_ENCODING=encoding)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_round_trip(self):
+        response, body = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        header, *rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(header, CSV_HEADER)
+        self.assertEqual(len(rows), 60)
+        # An export is a valid upload, and ingests to the same records.
+        copy = ingest_csv(io.BytesIO(body), 'copy.csv')
+        fields = EXPORT_FIELDS[1:]
+        self.assertEqual(
+            list(EquipmentRecord.objects.filter(dataset=copy).order_by('id').values_list(*fields)),
+            [row[1:] for row in self.rows],
+        )
+
+    def test_csv_from_record_store(self):
+        _, from_table = self.export('csv', ordering='-id')
+        with tempfile.TemporaryDirectory() as root, mock.patch.object(ingest, 'record_store', ArrowRecordStore(root)):
+            dataset = ingest_csv(io.BytesIO(synthetic_csv(100, seed=6)), 'y.csv', chunk_size=30)
+            with mock.patch('core.export.record_store', ArrowRecordStore(root)):
+                with CaptureQueriesContext(connection) as queries:
+                    _, body = self.export('csv', url=f'/api/dataset/{dataset.pk}/export/')
+                _, filtered = self.export('csv', url=f'/api/dataset/{dataset.pk}/export/', flowrate__gt=-1e9)
+        # The whole dataset comes off the Arrow file; filters still read the table.
+        self.assertFalse(any('core_equipmentrecord' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(body, synthetic_csv(100, seed=6).replace(b'\n', b'\r\n'))
+        self.assertEqual(filtered, body)
+        # ?ordering=-id reads the table too.
+        header, *rows = from_table.decode().splitlines()
+        self.assertEqual(rows[0].split(',')[0], 'E-59')
+
+    def test_ndjson(self):
+        _, body = self.export('ndjson')
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(lines, [dict(zip(EXPORT_FIELDS, row)) for row in self.rows])
+
+    def test_arrow(self):
+        response, body = self.export('arrow')
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = pa.ipc.open_stream(body).read_all()
+        self.assertEqual(table.column_names, EXPORT_FIELDS)
+        self.assertEqual([tuple(row.values()) for row in table.to_pylist()], self.rows)
+
+    def test_gzip_and_filters(self):
+        _, plain = self.export('ndjson', type='Pump')
+        response, body = self.export('ndjson', encoding='gzip, deflate', type='Pump')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), plain)
+        self.assertEqual(len(plain.splitlines()), 20)
+
+    def test_gzip_refused(self):
+        for encoding in ['gzip;q=0', 'deflate, gzip; q=0.0', 'x-gzip-not', 'gzipped', 'identity', '']:
+            response, body = self.export('ndjson', encoding=encoding, type='Pump')
+            self.assertFalse(response.has_header('Content-Encoding'), encoding)
+            self.assertEqual(len(body.splitlines()), 20)
+        for encoding in ['GZIP', 'br;q=1, gzip;q=0.5', 'deflate,gzip']:
+            response, _ = self.export('ndjson', encoding=encoding, type='Pump')
+            self.assertEqual(response['Content-Encoding'], 'gzip', encoding)
+
+    def test_errors_are_json(self):
+        for url, params, code in [(self.url, {'format': 'csv', 'pressure__gt': 'x'}, 400),
+                                  (self.url, {'format': 'arrow', 'pressure__gt': 'x'}, 400),
+                                  ('/api/dataset/999/export/', {'format': 'ndjson'}, 404),
+                                  (self.url, {'format': 'xml'}, 404)]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, code, params)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIsInstance(response.json(), dict)
+        response = APIClient().get(self.url, {'format': 'csv'})
+        self.assertEqual((response.status_code, response['Content-Type']), (401, 'application/json'))
+
+
+class FastJSONRendererTests(BaseTestCase):
+    """The values() + orjson pages are byte for byte the serializer + JSONRenderer ones."""
+    records = 20
+
+    def setUp(self):
+        super().setUp()
+        # Floats orjson spells differently from json.dumps, and characters
+        # JSONRenderer escapes.
+        EquipmentRecord.objects.bulk_create([
+            EquipmentRecord(dataset=self.dataset, equipment_name='Süd- - ', type='Pump',
+                            flowrate=1e16, pressure=0.00001, temperature=-0.0),
+            EquipmentRecord(dataset=self.dataset, equipment_name='"quoted"\\', type='Valve',
+                            flowrate=1 / 3, pressure=1e-7, temperature=123456789.125),
+        ])
+        self.dataset.summary_stats = {'count': 22, 'avg_flowrate': 2 / 3, 'max_flowrate': 1e16}
+        self.dataset.save()
+        Dataset.objects.create(filename='Ω  .csv', summary_stats={'count': 0, 'avg_pressure': 1e-5})
+
+    def assertRendersLike(self, response, data):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, JSONRenderer().render(data))
+
+    def test_record_pages(self):
+        url = f'/api/dataset/{self.dataset.pk}/'
+        records = EquipmentRecord.objects.filter(dataset=self.dataset)
+        for params, ordering in [({'page_size': 25}, ['id']), ({'page_size': 10, 'ordering': '-flowrate'}, ['-flowrate', '-id'])]:
+            response = self.client.get(url, params)
+            page = records.order_by(*ordering)[:params['page_size']]
+            self.assertRendersLike(response, {
+                'next': response.json()['next'],
+                'previous': None,
+                'results': EquipmentRecordSerializer(page, many=True).data,
+                'count': 22,
+                'summary': self.dataset.summary_stats,
+            })
+
+    def test_history(self):
+        response = self.client.get('/api/history/')
+        datasets = Dataset.objects.order_by('-upload_timestamp')
+        self.assertRendersLike(response, {
+            'count': 2,
+            'next': None,
+            'previous': None,
+            'results': DatasetSerializer(datasets, many=True).data,
+        })
+
+    def test_edge_values(self):
+        for data in [[1e16, 1e-5, -0.0, 1e308, 5e-324, 0.1 + 0.2], {'a b': 'c d', 'é': '\x00'},
+                     {'nested': [{'x': 123456789012345678}, None, True]}]:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ConditionalRequestTests(BaseTestCase):
+    records = 60
+
+    def test_dataset_not_modified(self):
+        for url in [f'/api/dataset/{self.dataset.pk}/', f'/api/dataset/{self.dataset.pk}/summary/']:
+            etag = self.client.get(url)['ETag']
+            # Only the upload timestamp lookup runs before the 304.
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_history_etag_changes_with_datasets(self):
+        etag = self.client.get('/api/history/')['ETag']
+        self.assertEqual(self.client.get('/api/history/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Dataset.objects.create(filename='y.csv')
+        self.assertEqual(self.client.get('/api/history/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTests(BaseTestCase):
+    records = 60
+
+    def test_retention_invalidates(self):
+        url = f'/api/dataset/{self.dataset.pk}/summary/'
+        self.assertEqual(self.client.get(url).json(), {'count': 60})
+        self.assertEqual(self.client.get('/api/history/').json()['count'], 1)
+
+        Dataset.objects.create(filename='y.csv')
+        apply_retention(keep_last=1)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get('/api/history/').json()['results'][0]['filename'], 'y.csv')
+
+    def test_history_follows_database_without_invalidation(self):
+        # Writes from another process change the table, not this process's
+        # cache generation; the cached body must still follow the ETag.
+        response_cache.reset_stats()
+        generation = response_cache.generation('history')
+        for path in ['/api/history/', '/api/async/history/']:
+            client = self.token_client(self.user)
+            self.assertEqual([d['filename'] for d in client.get(path).json()['results']], ['x.csv'])
+            self.assertEqual(client.get(path).json()['count'], 1)
+
+            added = Dataset.objects.create(filename='y.csv')
+            response = client.get(path)
+            self.assertEqual([d['filename'] for d in response.json()['results']], ['y.csv', 'x.csv'])
+            self.assertEqual(response['ETag'], client.get(path)['ETag'])
+
+            Dataset.objects.filter(pk=added.pk).delete()
+            self.assertEqual(client.get(path).json()['count'], 1)
+        self.assertEqual(response_cache.generation('history'), generation)
+        # Each state is computed once per endpoint, then served from the
+        # cache; after the delete the first state's body is current again.
+        self.assertEqual(response_cache.stats()['endpoints']['history'], {'hits': 6, 'misses': 4, 'hit_rate': 0.6})
+
+    def test_lru_eviction_by_bytes(self):
+        store = BoundedLocMemCache('test-lru', {'OPTIONS': {'MAX_BYTES': 3000}})
+        store.clear()
+        for i in range(3):
+            store.set(f'k{i}', 'x' * 900)
+        store.get('k0')
+        store.set('k3', 'x' * 900)
+        self.assertIsNone(store.get('k1'))
+        self.assertIsNotNone(store.get('k0'))
+        self.assertLessEqual(store.usage()['bytes'], 3000)
+
+
+class ReportTests(BaseTestCase):
+    records = 60
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/dataset/{self.dataset.pk}/report/'
+        report_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(report_dir.cleanup)
+        self.report_dir = Path(report_dir.name)
+        self.enterContext(override_settings(REPORT_ASYNC=False, REPORT_DIR=self.report_dir))
+
+    def test_report_stored_and_reused(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        [stored] = self.report_dir.glob('*.pdf')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        Dataset.objects.create(filename='y.csv')
+        apply_retention(keep_last=1)
+        self.assertFalse(stored.exists())
+
+    def test_missing_dataset(self):
+        self.assertEqual(self.client.get('/api/dataset/999/report/').status_code, 404)
+
+    def report_path(self):
+        return reports.report_path(self.dataset.pk, self.dataset.upload_timestamp)
+
+    def test_claimed_by_another_render(self):
+        path = self.report_path()
+        lock, progress = path.with_suffix('.lock'), path.with_suffix('.progress')
+        lock.write_text('other')
+        progress.write_text(json.dumps({'rows_done': 30, 'rows_total': 60}))
+
+        self.assertFalse(reports.render_report(self.dataset.pk, str(path)))
+        self.assertEqual(lock.read_text(), 'other')
+        self.assertTrue(progress.exists())
+        self.assertFalse(path.exists())
+
+        # Another process's render is reported, not queued a second time.
+        with override_settings(REPORT_ASYNC=True), mock.patch.object(reports, 'get_executor') as executor:
+            response = self.client.get(self.url)
+        executor.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['percent'], 50.0)
+
+    def test_stale_lock_taken_over(self):
+        path = self.report_path()
+        lock = path.with_suffix('.lock')
+        lock.write_text('dead')
+        abandoned = timezone.now().timestamp() - settings.REPORT_LOCK_TIMEOUT - 1
+        os.utime(lock, (abandoned, abandoned))
+
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(list(self.report_dir.iterdir()), [path])
+
+    @override_settings(REPORT_MAX_RECORDS=10)
+    def test_records_capped(self):
+        drawn = []
+        draw = reports.canvas.Canvas.drawString
+
+        def record(pdf, x, y, text, *args, **kwargs):
+            drawn.append(text)
+            return draw(pdf, x, y, text, *args, **kwargs)
+
+        with mock.patch.object(reports.canvas.Canvas, 'drawString', autospec=True, side_effect=record):
+            self.assertTrue(reports.render_report(self.dataset.pk, str(self.report_path())))
+        self.assertIn('Showing the first 10 of 60 records; the CSV export has all of them.', drawn)
+        names = {record.equipment_name for record in EquipmentRecord.objects.filter(dataset=self.dataset)}
+        self.assertEqual(len([text for text in drawn if text in names]), 10)
+
+
+class CompareTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a = Dataset.objects.create(filename='a.csv')
+        self.b = Dataset.objects.create(filename='b.csv')
+        make_records(self.a, n=6)
+        make_records(self.b, n=6)
+        EquipmentRecord.objects.filter(dataset=self.b, equipment_name='E-1').update(flowrate=150)
+        EquipmentRecord.objects.filter(dataset=self.b, equipment_name='E-2').update(type='Pump')
+        EquipmentRecord.objects.filter(dataset=self.b, equipment_name='E-5').update(equipment_name='E-9')
+
+    def test_compare(self):
+        data = self.client.get(f'/api/compare/?a={self.a.pk}&b={self.b.pk}').json()
+        self.assertEqual(data['summary'], {'changed': 2, 'added': 1, 'removed': 1, 'unchanged': 3})
+        statuses = {row['equipment_name']: row['status'] for row in data['results']}
+        self.assertEqual(statuses, {'E-1': 'changed', 'E-2': 'changed', 'E-5': 'removed', 'E-9': 'added'})
+        [e1] = [row for row in data['results'] if row['equipment_name'] == 'E-1']
+        self.assertEqual(e1['flowrate_delta'], 49.0)
+        self.assertEqual(data['type_shifts']['Pump']['count_delta'], 1)
+
+        data = self.client.get(f'/api/compare/?a={self.a.pk}&b={self.b.pk}&ordering=flowrate_delta&page_size=1').json()
+        self.assertEqual(data['results'][0]['equipment_name'], 'E-1')
+        self.assertEqual(data['count'], 4)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(f'/api/compare/?a={self.a.pk}').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/compare/?a={self.a.pk}&b=999').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/compare/?a={self.a.pk}&b={self.b.pk}&status=gone').status_code, 400)
+
+
+class EquipmentTrendTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.datasets = []
+        for shift in range(3):
+            dataset = Dataset.objects.create(filename=f'shift{shift}.csv')
+            make_records(dataset, n=6)
+            EquipmentRecord.objects.filter(dataset=dataset, equipment_name='E-1').update(flowrate=100 + shift)
+            record_trend(dataset)
+            self.datasets.append(dataset)
+
+    def test_trend(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/equipment/E-1/trend/').json()
+        self.assertEqual([point['dataset'] for point in data['results']], [d.pk for d in self.datasets])
+        self.assertEqual([point['flowrate'] for point in data['results']], [100, 101, 102])
+
+        since = self.datasets[1].upload_timestamp.isoformat()
+        data = self.client.get('/api/equipment/E-1/trend/', {'since': since}).json()
+        self.assertEqual(data['count'], 2)
+
+    def test_unknown_equipment(self):
+        self.assertEqual(self.client.get('/api/equipment/nope/trend/').status_code, 404)
+
+
+class AnomalyTests(BaseTestCase):
+    records = 60
+
+    def setUp(self):
+        super().setUp()
+        self.outlier = EquipmentRecord.objects.create(
+            dataset=self.dataset, equipment_name='Hot', type='Pump', flowrate=100, pressure=6, temperature=500,
+        )
+        stats = compute_stats(record_store.iter_chunks(self.dataset.pk)).detailed()
+        self.counts = flag_anomalies(self.dataset.pk, stats)
+
+    def test_flags(self):
+        self.assertEqual(self.counts['records'], 1)
+        self.assertEqual(self.counts['by_type'], {'Pump': 1})
+        self.assertEqual(self.counts['by_rule']['temperature_iqr'], 1)
+        self.assertEqual(self.counts['by_rule']['pressure_iqr'], 0)
+
+    def test_listing(self):
+        url = f'/api/dataset/{self.dataset.pk}/anomalies/'
+        [row] = self.client.get(url).json()['results']
+        self.assertEqual(row['id'], self.outlier.pk)
+        self.assertIn('temperature_iqr', row['flags'])
+        self.assertEqual(self.client.get(url, {'rule': 'pressure_zscore'}).json()['results'], [])
+        self.assertEqual(self.client.get(url, {'rule': 'nope'}).status_code, 400)
+
+
+class SearchTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.datasets = []
+        for shift in range(2):
+            dataset = Dataset.objects.create(filename=f'shift{shift}.csv')
+            make_records(dataset, n=15)
+            record_trend(dataset)
+            self.datasets.append(dataset)
+
+    def test_ranking(self):
+        data = self.client.get('/api/search/', {'q': 'E-1'}).json()
+        # E-1 and E-10..E-14, in both datasets.
+        self.assertEqual(data['count'], 12)
+        names = [row['equipment_name'] for row in data['results']]
+        self.assertEqual(names[:2], ['E-1', 'E-1'])
+        self.assertEqual(set(names[2:]), {f'E-{i}' for i in range(10, 15)})
+        self.assertEqual(self.client.get('/api/search/', {'q': 'valve'}).json()['count'], 10)
+
+    def test_dataset_scope(self):
+        data = self.client.get('/api/search/', {'q': 'E-1', 'dataset': self.datasets[0].pk}).json()
+        self.assertEqual({row['dataset'] for row in data['results']}, {self.datasets[0].pk})
+        apply_retention(keep_last=1)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'E-1'}).json()['count'], 6)
+
+    def test_bad_query(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': ' "* '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'E', 'dataset': 'x'}).status_code, 400)
+
+
+class TokenCacheTests(BaseTestCase):
+    records = 0
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.token_client(self.user)
+        self.admin_client = self.token_client(User.objects.create_superuser('admin', password='pw'))
+        self.url = f'/api/dataset/{self.dataset.pk}/stats/'
+
+    def test_cached_lookup(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(APIClient().get(self.url, HTTP_AUTHORIZATION='Token nope').status_code, 401)
+
+    def test_deactivated_user(self):
+        self.client.get(self.url)
+        self.admin_client.patch(f'/api/users/{self.user.pk}/', {'is_active': False}, format='json')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_logout(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.post('/api/logout/').status_code, 204)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class AsyncViewTests(BaseTestCase):
+    records = 60
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.token_client(self.user)
+
+    def assertSame(self, path, params=None):
+        sync = self.client.get(f'/api/{path}', params)
+        cache.clear()
+        response = self.client.get(f'/api/async/{path}', params)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), sync.content)
+        self.assertEqual(response.get('ETag'), sync.get('ETag'))
+        return response
+
+    def test_same_payloads(self):
+        pk = self.dataset.pk
+        self.assertSame('history/')
+        self.assertSame(f'dataset/{pk}/', {'page_size': 7, 'ordering': '-pressure'})
+        self.assertSame(f'dataset/{pk}/', {'type': 'Pump', 'count': 'true'})
+        self.assertSame(f'dataset/{pk}/', {'pressure__gt': 'x'})
+        self.assertSame(f'dataset/{pk}/summary/')
+        self.assertSame(f'dataset/{pk}/aggregate/', {'group_by': 'type', 'metrics': 'mean:flowrate,count'})
+        self.assertSame(f'dataset/{pk}/aggregate/', {'metrics': 'nope'})
+        self.assertSame('dataset/999/summary/')
+
+    def test_cursor_and_conditional(self):
+        url = f'/api/async/dataset/{self.dataset.pk}/'
+        first = self.client.get(url, {'page_size': 50}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(second['results']), 60)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_async_cache_calls(self):
+        url = f'/api/async/dataset/{self.dataset.pk}/summary/'
+        backend = type(caches['default'])
+        with mock.patch.object(backend, 'aget', autospec=True, side_effect=backend.aget) as aget, \
+                mock.patch.object(backend, 'aset', autospec=True, side_effect=backend.aset) as aset:
+            self.client.get(url)
+            self.client.get(url)
+        self.assertTrue(aget.called)
+        aset.assert_called_once()
+        self.assertEqual(response_cache.stats()['endpoints']['summary'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_authentication(self):
+        url = f'/api/async/dataset/{self.dataset.pk}/summary/'
+        self.assertEqual(APIClient().get(url).status_code, 401)
+        self.assertEqual(APIClient().get(url, HTTP_AUTHORIZATION='Token nope').status_code, 401)
+
+
+class SyntheticDataTests(TestCase):
+    def test_csv_ingests_as_generated(self):
+        content = synthetic_csv(2_500, seed=3, types=8)
+        self.assertEqual(synthetic_csv(2_500, seed=3, types=8), content)
+        dataset = ingest_csv(io.BytesIO(content), 'synthetic.csv')
+        records = synthetic_records(2_500, seed=3, types=8)
+        self.assertEqual(dataset.summary_stats['count'], 2_500)
+        self.assertEqual(records['type'].nunique(), 8)
+        self.assertEqual(
+            list(EquipmentRecord.objects.filter(dataset=dataset).order_by('id')
+                 .values_list('equipment_name', 'type', 'flowrate', 'pressure', 'temperature')),
+            list(records.itertuples(index=False, name=None)),
+        )
@@ -0,0 +1,59 @@
+"""
+Per-equipment history across uploads.
+
+Every dataset is a point-in-time snapshot. At ingest, its records are rolled
+up into ``EquipmentTrend``: one row per equipment name holding the mean
+readings (and a count, for names listed more than once). Because the row
+carries the upload time, one unit's whole history is a single range scan
+of ``(equipment_name, uploaded_at)`` that doesn't depend on how many
+datasets exist or how big they are.
+"""
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import EquipmentRecord, EquipmentTrend
+
+TREND_VALUES = ['dataset_id', 'uploaded_at', 'type', 'readings', 'flowrate', 'pressure', 'temperature']
+
+
+class TrendQueryError(ValueError):
+    pass
+
+
+def record_trend(dataset):
+    """Roll a freshly ingested dataset's records up into EquipmentTrend."""
+    trend, record = EquipmentTrend._meta, EquipmentRecord._meta
+    quote = connection.ops.quote_name
+    # A name listed under more than one type in one upload keeps the first
+    # type alphabetically.
+    sql = (
+        'INSERT INTO {trend} (equipment_name, dataset_id, uploaded_at, type, readings, '
+        'flowrate, pressure, temperature) '
+        'SELECT equipment_name, dataset_id, %s, MIN(type), COUNT(*), '
+        'AVG(flowrate), AVG(pressure), AVG(temperature) '
+        'FROM {record} WHERE dataset_id = %s GROUP BY equipment_name, dataset_id'
+    ).format(trend=quote(trend.db_table), record=quote(record.db_table))
+    uploaded = connection.ops.adapt_datetimefield_value(dataset.upload_timestamp)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [uploaded, dataset.pk])
+        return cursor.rowcount
+
+
+def parse_time(param, name):
+    if not param:
+        return None
+    value = parse_datetime(param)
+    if value is None:
+        raise TrendQueryError(f'{name} must be an ISO 8601 datetime, e.g. 2026-01-31T06:00:00Z')
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def trend(equipment_name, since=None, until=None):
+    """A unit's rollup rows, oldest first, optionally within [since, until]."""
+    points = EquipmentTrend.objects.filter(equipment_name=equipment_name)
+    if since:
+        points = points.filter(uploaded_at__gte=since)
+    if until:
+        points = points.filter(uploaded_at__lte=until)
+    return points.order_by('uploaded_at').values(*TREND_VALUES)
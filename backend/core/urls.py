@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UploadViewSet, HistoryViewSet, DatasetDetailViewSet, CustomAuthToken, UserViewSet
+from . import async_views
+from .views import UploadViewSet, HistoryViewSet, DatasetDetailViewSet, CustomAuthToken, LogoutView, UserViewSet, IngestJobViewSet, CacheStatsView, CompareView, EquipmentTrendView, SearchView
 # from rest_framework_nested import routers # REMOVED
 # Requirement: /api/dataset/<id>/...
 # I can use DRF routers.
@@ -9,6 +10,7 @@ router = DefaultRouter()
 router.register(r'upload', UploadViewSet, basename='upload')
 router.register(r'history', HistoryViewSet, basename='history')
 router.register(r'users', UserViewSet, basename='users')
+router.register(r'jobs', IngestJobViewSet, basename='jobs')
 # For Dataset Detail, we want /dataset/<pk>/
 # And /dataset/<pk>/report/
 # And /dataset/<pk>/ (list records?)
@@ -29,11 +31,55 @@ dataset_report = DatasetDetailViewSet.as_view({
 dataset_summary = DatasetDetailViewSet.as_view({
     'get': 'summary'
 })
+dataset_stats = DatasetDetailViewSet.as_view({
+    'get': 'stats'
+})
+dataset_aggregate = DatasetDetailViewSet.as_view({
+    'get': 'aggregate'
+})
+dataset_scatter = DatasetDetailViewSet.as_view({
+    'get': 'scatter'
+})
+dataset_histogram = DatasetDetailViewSet.as_view({
+    'get': 'histogram'
+})
+dataset_top = DatasetDetailViewSet.as_view({
+    'get': 'top'
+})
+dataset_bottom = DatasetDetailViewSet.as_view({
+    'get': 'bottom'
+})
+dataset_anomalies = DatasetDetailViewSet.as_view({
+    'get': 'anomalies'
+})
+# Manual routes don't pick up @action options the way the router does;
+# pass them through so export gets its CSV/NDJSON renderers.
+dataset_export = DatasetDetailViewSet.as_view({
+    'get': 'export'
+}, **DatasetDetailViewSet.export.kwargs)
 
 urlpatterns = [
     path('login/', CustomAuthToken.as_view()),
+    path('logout/', LogoutView.as_view(), name='logout'),
+    path('cache/', CacheStatsView.as_view(), name='cache-stats'),
+    path('compare/', CompareView.as_view(), name='compare'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('equipment/<path:name>/trend/', EquipmentTrendView.as_view(), name='equipment-trend'),
+    # Async (ASGI) versions of the dashboard's read endpoints; see core.async_views.
+    path('async/history/', async_views.history, name='async-history'),
+    path('async/dataset/<int:dataset_pk>/', async_views.records, name='async-dataset-records'),
+    path('async/dataset/<int:dataset_pk>/summary/', async_views.summary, name='async-dataset-summary'),
+    path('async/dataset/<int:dataset_pk>/aggregate/', async_views.aggregate, name='async-dataset-aggregate'),
     path('', include(router.urls)),
     path('dataset/<int:dataset_pk>/', dataset_list, name='dataset-records'),
     path('dataset/<int:dataset_pk>/report/', dataset_report, name='dataset-report'),
     path('dataset/<int:dataset_pk>/summary/', dataset_summary, name='dataset-summary'),
+    path('dataset/<int:dataset_pk>/stats/', dataset_stats, name='dataset-stats'),
+    path('dataset/<int:dataset_pk>/aggregate/', dataset_aggregate, name='dataset-aggregate'),
+    path('dataset/<int:dataset_pk>/scatter/', dataset_scatter, name='dataset-scatter'),
+    path('dataset/<int:dataset_pk>/histogram/', dataset_histogram, name='dataset-histogram'),
+    path('dataset/<int:dataset_pk>/top/', dataset_top, name='dataset-top'),
+    path('dataset/<int:dataset_pk>/bottom/', dataset_bottom, name='dataset-bottom'),
+    path('dataset/<int:dataset_pk>/export/', dataset_export, name='dataset-export'),
+    path('dataset/<int:dataset_pk>/anomalies/', dataset_anomalies, name='dataset-anomalies'),
 ]
@@ -5,17 +5,25 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
-from .models import Dataset, EquipmentRecord
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.text import compress_sequence
+from .models import Dataset, EquipmentRecord, IngestJob
+from .ingest import validate_header, IngestError
+from .jobs import submit_upload
+from .aggregates import aggregate, parse_group_by, parse_metrics, AggregateQueryError
+from . import anomalies, auth, charts, compare, export, reports, search, trends
+from .renderers import ArrowRenderer, CSVRenderer, ExportRenderer, FastJSONRenderer, NDJSONRenderer
+from rest_framework.renderers import BrowsableAPIRenderer
 from .serializers import DatasetSerializer, EquipmentRecordSerializer
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import json
+import pyarrow as pa
 from django.contrib.auth.models import User
 from .serializers import DatasetSerializer, EquipmentRecordSerializer, UserSerializer
-from .serializers import DatasetSerializer, EquipmentRecordSerializer, UserSerializer
+from .serializers import RECORD_VALUES, DATASET_VALUES, dataset_rows, trend_rows
+from .serializers import IngestJobSerializer
 from rest_framework.permissions import IsAdminUser
-import pandas as pd
 
 class CustomAuthToken(ObtainAuthToken):
     def post(self, request, *args, **kwargs):
@@ -33,6 +41,15 @@ class CustomAuthToken(ObtainAuthToken):
             'is_superuser': user.is_superuser
         })
 
+class LogoutView(generics.GenericAPIView):
+    """POST /api/logout/: revoke the caller's token."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # Deleting the token also drops it from the auth cache (core.auth).
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class UploadViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
@@ -45,56 +62,41 @@ class UploadViewSet(viewsets.ViewSet):
              return Response({'error': 'Invalid file type. Only CSV allowed.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            df = pd.read_csv(file)
-            required_cols = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-            if not all(col in df.columns for col in required_cols):
-                 return Response({'error': f'Missing columns. Required: {required_cols}'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # numeric validation
-            for col in ['Flowrate', 'Pressure', 'Temperature']:
-                if not pd.to_numeric(df[col], errors='coerce').notnull().all():
-                     return Response({'error': f'Column {col} contains non-numeric values'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Compute stats
-            stats = {
-                'count': int(len(df)),
-                'avg_flowrate': float(df['Flowrate'].mean()),
-                'avg_pressure': float(df['Pressure'].mean()),
-                'avg_temperature': float(df['Temperature'].mean()),
-                'type_distribution': df['Type'].value_counts().to_dict()
-            }
-
-            # Save Dataset
-            dataset = Dataset.objects.create(filename=file.name, summary_stats=stats)
-
-            # Bulk Create Records
-            records = [
-                EquipmentRecord(
-                    dataset=dataset,
-                    equipment_name=row['Equipment Name'],
-                    type=row['Type'],
-                    flowrate=row['Flowrate'],
-                    pressure=row['Pressure'],
-                    temperature=row['Temperature']
-                ) for _, row in df.iterrows()
-            ]
-            EquipmentRecord.objects.bulk_create(records)
-
-            # Cleanup older than 5
-            all_datasets = Dataset.objects.order_by('-upload_timestamp')
-            if all_datasets.count() > 5:
-                to_delete = all_datasets[5:]
-                for d in to_delete:
-                    d.delete()
-            
-            # Return full serialized dataset
-            serializer = DatasetSerializer(dataset)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-from rest_framework.pagination import PageNumberPagination
+            validate_header(file)
+        except IngestError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Parsing, inserts and cleanup run on the ingest worker pool; the
+        # client polls /api/jobs/<id>/ for progress and the resulting dataset.
+        # A byte-identical re-upload comes back already done (200) unless
+        # ?force=true asks for a fresh ingest.
+        force = str(request.data.get('force', request.query_params.get('force', ''))).lower() in ('1', 'true', 'yes')
+        job = submit_upload(file, request.user, force=force)
+        serializer = IngestJobSerializer(job)
+        if job.deduplicated:
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+class IngestJobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = IngestJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = IngestJob.objects.order_by('-created_at')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from django.db.models import F, Q
+from .filters import RecordFilterBackend, ORDERING_FIELDS, parse_filters
+from .conditional import dataset_conditional, dataset_etag, dataset_last_modified, history_conditional, report_conditional
+from .conditional import history_state, history_tag
+from . import cache as response_cache
+from .cache import dataset_namespace
+from django.conf import settings
 
 class HistoryPagination(PageNumberPagination):
     page_size = 50
@@ -102,10 +104,29 @@ class HistoryPagination(PageNumberPagination):
     max_page_size = 100
 
 class HistoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Dataset.objects.order_by('-upload_timestamp')
+    queryset = Dataset.objects.defer('stats').order_by('-upload_timestamp')
     serializer_class = DatasetSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = HistoryPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    @history_conditional
+    def list(self, request, *args, **kwargs):
+        def compute():
+            # Same payload as DatasetSerializer, built from values() rows.
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset.values(*DATASET_VALUES))
+            return self.get_paginated_response(dataset_rows(page)).data
+
+        # Page links are absolute, so the host and path are part of the key.
+        # So is the dataset state the ETag is built from: an upload or delete
+        # by another process changes the key without reaching this process's
+        # cache generation, and the body never lags behind the ETag.
+        params = response_cache.query_params(request) + [
+            ('host', request.get_host()), ('path', request.path), ('state', history_tag(history_state(request))),
+        ]
+        data = response_cache.get_or_set('history', 'history', params, compute, settings.RESPONSE_CACHE_TIMEOUT)
+        return Response(data)
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('-date_joined')
@@ -118,75 +139,437 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response({"error": "Cannot delete your own account"}, status=status.HTTP_400_BAD_REQUEST)
         return super().destroy(request, *args, **kwargs)
 
+def reverse_ordering(ordering):
+    """('-pressure', '-id') -> ('pressure', 'id'), the order a previous page is read in."""
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+class RecordCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (ordering field, id).
+
+    The cursor holds the last row's value *and* id, so every position is
+    unique: a page is one index seek past that pair, with no OFFSET however
+    many records share a value, and there is no COUNT(*). Clients follow
+    the opaque `next` link.
+    """
+    ordering = 'id'
+    page_size = settings.RECORDS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.RECORDS_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        field = super().get_ordering(request, queryset, view)[0]
+        if field.lstrip('-') == 'id':
+            return (field,)
+        # Tie-break on id in the same direction, which the index also covers.
+        return (field, '-id' if field.startswith('-') else 'id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = super()._get_position_from_instance(instance, ordering)
+        if len(ordering) == 1:
+            return position
+        # Arrow pages are read as values() dicts rather than instances.
+        record_id = instance['id'] if isinstance(instance, dict) else instance.id
+        return f'{position}|{record_id}'
+
+    def _seek(self, queryset, position, backwards):
+        field = self.ordering[0].lstrip('-')
+        op = 'lt' if backwards else 'gt'
+        try:
+            if len(self.ordering) == 1:
+                return queryset.filter(**{f'{field}__{op}': int(position)})
+            value, last_id = position.split('|')
+            value, last_id = float(value), int(last_id)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        # field >= value bounds the index range; the OR skips the rows with
+        # that same value which the previous page already returned.
+        return queryset.filter(**{f'{field}__{op}e': value}).filter(
+            Q(**{f'{field}__{op}': value}) | Q(**{f'id__{op}': last_id})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset up to the query, seeking on the
+        # compound position instead of the first ordering field alone.
+        # Positions are unique, so the cursor offset is never needed. The
+        # rows it returns go to set_page(); async views fetch them with
+        # the async ORM in between.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        current_position = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            queryset = self._seek(queryset, current_position, reverse != self.ordering[0].startswith('-'))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse = bool(self.cursor and self.cursor.reverse)
+        current_position = self.cursor.position if self.cursor else None
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
 class DatasetDetailViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = EquipmentRecordSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = RecordCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = [RecordFilterBackend, OrderingFilter]
+    ordering_fields = ORDERING_FIELDS
+    ordering = ['id']
 
     def get_queryset(self):
         dataset_id = self.kwargs['dataset_pk']
         return EquipmentRecord.objects.filter(dataset_id=dataset_id)
 
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == 'list':
+            renderers.append(ArrowRenderer())
+        return renderers
+
+    def handle_exception(self, exc):
+        # Errors (bad filters, unknown dataset, auth, an unknown ?format=)
+        # are raised before any rows stream, and go out as JSON rather than
+        # under the CSV/NDJSON/Arrow content type the client asked for.
+        response = super().handle_exception(exc)
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if renderer is None or isinstance(renderer, ExportRenderer):
+            self.request.accepted_renderer = FastJSONRenderer()
+            self.request.accepted_media_type = FastJSONRenderer.media_type
+        return response
+
+    @dataset_conditional
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-        # Inject summary into response
-        try:
-            dataset_pk = self.kwargs['dataset_pk']
-            dataset = Dataset.objects.get(pk=dataset_pk)
-            
-            # Ensure response.data is mutable and is a dict (Pagination enabled)
-            if hasattr(response.data, 'copy'):
-                 data = response.data
-            else:
-                 data = response.data
-
-            if isinstance(data, dict):
-                data['summary'] = dataset.summary_stats
-            
-            # If for some reason it's not a dict (e.g. pagination disabled), wrap it
-            # But we enforced pagination in settings.
-            
-        except Dataset.DoesNotExist:
-            pass 
+        arrow = request.accepted_renderer.format == 'arrow'
+        queryset = self.filter_queryset(self.get_queryset())
+        if dataset_last_modified(request, self.kwargs['dataset_pk']) is None:
+            # Unknown, or still being ingested: its committed records stay
+            # hidden until the dataset is ready. The lookup is the ETag's.
+            queryset = queryset.none()
+        if arrow:
+            # Accept: application/vnd.apache.arrow.stream - the page goes
+            # from values() rows straight into Arrow columns, skipping the
+            # serializer. Links, count and summary ride in the schema metadata.
+            page = self.paginate_queryset(queryset.values(*export.EXPORT_FIELDS))
+            table = pa.Table.from_batches([export.record_batch([tuple(row.values()) for row in page])])
+            extra = {'next': self.paginator.get_next_link(), 'previous': self.paginator.get_previous_link()}
+        else:
+            # values() dicts already match EquipmentRecordSerializer's output,
+            # so the page skips model instances and per-field serialization.
+            page = self.paginate_queryset(queryset.values(*RECORD_VALUES))
+            response = self.get_paginated_response(page)
+            extra = response.data
+
+        # The first page carries the dataset summary; later pages skip the
+        # dataset lookup entirely. The record count is read from the summary
+        # (never a COUNT(*)) and is sent on later pages only if ?count=true.
+        # A filtered listing is only counted on ?count=true, with an indexed
+        # COUNT over the filtered rows.
+        first_page = not request.query_params.get(self.paginator.cursor_query_param)
+        want_count = request.query_params.get('count', '').lower() in ('1', 'true', 'yes')
+        filtered = bool(parse_filters(request.query_params))
+        if filtered and want_count:
+            extra['count'] = queryset.count()
+        if first_page or (want_count and not filtered):
+            dataset = Dataset.objects.only('summary_stats').filter(pk=self.kwargs['dataset_pk']).first()
+            if dataset is not None:
+                if not filtered:
+                    extra['count'] = dataset.summary_stats.get('count', 0)
+                if first_page:
+                    extra['summary'] = dataset.summary_stats
+
+        if arrow:
+            metadata = {key: json.dumps(value) for key, value in extra.items()}
+            return Response(table.replace_schema_metadata(metadata))
         return response
 
     @action(detail=False, methods=['get'])
+    @dataset_conditional
     def summary(self, request, dataset_pk=None):
-        dataset = get_object_or_404(Dataset, pk=dataset_pk)
-        return Response(dataset.summary_stats)
+        def compute():
+            return get_object_or_404(Dataset.objects.only('summary_stats'), pk=dataset_pk).summary_stats
+
+        return Response(response_cache.get_or_set(
+            dataset_namespace(dataset_pk), 'summary', [], compute, settings.RESPONSE_CACHE_TIMEOUT,
+        ))
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request, dataset_pk=None):
+        dataset = get_object_or_404(Dataset.objects.only('stats'), pk=dataset_pk)
+        return Response(dataset.stats)
+
+    @action(detail=False, methods=['get'])
+    def aggregate(self, request, dataset_pk=None):
+        get_object_or_404(Dataset.objects.only('id'), pk=dataset_pk)
+        try:
+            group_by = parse_group_by(request.query_params.get('group_by'))
+            metrics = parse_metrics(request.query_params.get('metrics'))
+        except AggregateQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'dataset': int(dataset_pk),
+            'group_by': group_by,
+            'results': aggregate(dataset_pk, group_by, metrics),
+        })
+
+    @action(detail=False, methods=['get'])
+    def scatter(self, request, dataset_pk=None):
+        get_object_or_404(Dataset.objects.only('id'), pk=dataset_pk)
+        try:
+            data = charts.scatter(dataset_pk, request.query_params)
+        except charts.ChartQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
 
     @action(detail=False, methods=['get'])
+    def histogram(self, request, dataset_pk=None):
+        get_object_or_404(Dataset.objects.only('id'), pk=dataset_pk)
+        try:
+            data = charts.histogram(dataset_pk, request.query_params)
+        except charts.ChartQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+    def _extremes(self, request, dataset_pk, descending):
+        get_object_or_404(Dataset.objects.only('id'), pk=dataset_pk)
+        try:
+            field, n, records = charts.extremes(dataset_pk, request.query_params, descending)
+        except charts.ChartQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'field': field,
+            'order': 'desc' if descending else 'asc',
+            'n': n,
+            'results': EquipmentRecordSerializer(records, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def top(self, request, dataset_pk=None):
+        return self._extremes(request, dataset_pk, descending=True)
+
+    @action(detail=False, methods=['get'])
+    def bottom(self, request, dataset_pk=None):
+        return self._extremes(request, dataset_pk, descending=False)
+
+    @action(detail=False, methods=['get'])
+    def anomalies(self, request, dataset_pk=None):
+        # Only flagged records, read off the partial record_anomaly_idx.
+        # ?rule=pressure_zscore,temperature_iqr keeps those breaking any of
+        # the given rules. Cursor-paged like the listing.
+        get_object_or_404(Dataset.objects.only('id'), pk=dataset_pk)
+        queryset = self.get_queryset().filter(anomaly__gt=0)
+        if request.query_params.get('rule'):
+            names = {anomalies.rule_name(*rule): bit for rule, bit in anomalies.RULES.items()}
+            mask = 0
+            for name in request.query_params['rule'].split(','):
+                if name not in names:
+                    return Response({'error': f'Unknown rule "{name}". Choose from: {list(names)}'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                mask |= names[name]
+            queryset = queryset.annotate(matched=F('anomaly').bitand(mask)).filter(matched__gt=0)
+
+        page = self.paginate_queryset(queryset.values(*RECORD_VALUES))
+        for row in page:
+            row['flags'] = anomalies.flag_names(row['anomaly'])
+        return self.get_paginated_response(page)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer, ArrowRenderer])
+    def export(self, request, dataset_pk=None):
+        # ?format=csv|ndjson|arrow (or the Accept header) picks the renderer; the
+        # records filters and ordering apply as on the listing. Rows are
+        # streamed, and gzipped on the fly for clients that accept it.
+        get_object_or_404(Dataset.objects.only('id'), pk=dataset_pk)
+        queryset = self.filter_queryset(self.get_queryset())
+        fmt = request.accepted_renderer.format
+        whole = not parse_filters(request.query_params) and tuple(queryset.query.order_by) in ((), ('id',))
+        if fmt == 'csv' and whole:
+            stream = export.stream_dataset_csv(dataset_pk)
+        else:
+            stream = {
+                'csv': export.stream_csv,
+                'ndjson': export.stream_ndjson,
+                'arrow': export.stream_arrow,
+            }[fmt](queryset)
+
+        response = StreamingHttpResponse(stream, content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="dataset_{dataset_pk}.{fmt}"'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if export.accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response.streaming_content = compress_sequence(stream)
+            response['Content-Encoding'] = 'gzip'
+        return response
+
+    @action(detail=False, methods=['get'])
+    @report_conditional
     def report(self, request, dataset_pk=None):
-        dataset = get_object_or_404(Dataset, pk=dataset_pk)
-        records = EquipmentRecord.objects.filter(dataset=dataset)[:20] # Preview
+        # The full report is drawn in the background; until it is on disk
+        # this answers 202 with progress, and the client polls.
+        uploaded = dataset_last_modified(request, dataset_pk)
+        if uploaded is None:
+            raise NotFound()
+        path = reports.request_report(dataset_pk, uploaded)
+        if path is None:
+            progress = reports.status(dataset_pk, uploaded)
+            if progress['status'] == 'failed':
+                return Response({'error': f"Report generation failed: {progress['error']}"},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            response = Response(progress, status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = '2'
+            response['Cache-Control'] = 'no-store'
+            return response
+        response = FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=f'report_{dataset_pk}.pdf',
+            content_type='application/pdf',
+        )
+        # Validators for a report drawn during this very request.
+        response['ETag'] = dataset_etag(request, dataset_pk)
+        response['Last-Modified'] = http_date(uploaded.timestamp())
+        return response
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="report_{dataset.id}.pdf"'
+class ComparePagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
 
-        p = canvas.Canvas(response, pagesize=letter)
-        p.drawString(100, 750, f"Report for Dataset: {dataset.filename}")
-        p.drawString(100, 730, f"Uploaded: {dataset.upload_timestamp}")
-        
-        y = 700
-        p.drawString(100, y, "Summary Statistics:")
-        y -= 20
-        stats = dataset.summary_stats
-        p.drawString(120, y, f"Count: {stats.get('count')}")
-        y -= 15
-        p.drawString(120, y, f"Avg Flowrate: {stats.get('avg_flowrate')}")
-        y -= 15
-        p.drawString(120, y, f"Avg Pressure: {stats.get('avg_pressure')}")
-        y -= 15
-        p.drawString(120, y, f"Avg Temp: {stats.get('avg_temperature')}")
-
-        y -= 40
-        p.drawString(100, y, "Data Preview (First 20 rows):")
-        y -= 20
-        for record in records:
-            if y < 50:
-                p.showPage()
-                y = 750
-            p.drawString(100, y, f"{record.equipment_name} | {record.type} | {record.flowrate}")
-            y -= 15
-
-        p.save()
+
+class CompareView(generics.GenericAPIView):
+    """
+    GET /api/compare/?a=<id>&b=<id>: what changed from dataset a to b.
+    ?status=changed,added,removed,unchanged filters the paged rows
+    (default: all but unchanged); ?ordering=<field>_delta puts the largest
+    changes first.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    pagination_class = ComparePagination
+
+    def get(self, request):
+        try:
+            a, b = int(request.query_params['a']), int(request.query_params['b'])
+        except (KeyError, ValueError):
+            return Response({'error': 'a and b must be dataset ids, e.g. ?a=1&b=2'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            statuses = compare.parse_statuses(request.query_params.get('status'))
+            ordering = compare.parse_ordering(request.query_params.get('ordering'))
+        except compare.CompareQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        found = {row['id']: row for row in Dataset.objects.filter(id__in=[a, b]).values(*DATASET_VALUES)}
+        for dataset_id in (a, b):
+            if dataset_id not in found:
+                raise NotFound(f'Dataset {dataset_id} not found')
+
+        result = compare.compare(a, b, found[b]['upload_timestamp'])
+        datasets = {row['id']: row for row in dataset_rows(found.values())}
+        frame = compare.select(result['frame'], statuses, ordering)
+        # Page over row positions, then take just those rows from the frame.
+        positions = self.paginate_queryset(range(len(frame)))
+        response = self.get_paginated_response(compare.rows(frame.iloc[positions]))
+        response.data = {
+            'a': datasets[a],
+            'b': datasets[b],
+            'summary': result['summary'],
+            'type_shifts': result['type_shifts'],
+            **response.data,
+        }
         return response
+
+
+class EquipmentTrendView(generics.GenericAPIView):
+    """
+    GET /api/equipment/<name>/trend/: the unit's readings in every upload
+    it appears in, oldest first. ?since= / ?until= (ISO 8601) bound the
+    upload time.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request, name):
+        try:
+            since = trends.parse_time(request.query_params.get('since'), 'since')
+            until = trends.parse_time(request.query_params.get('until'), 'until')
+        except trends.TrendQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        points = trend_rows(trends.trend(name, since, until))
+        if not points and not (since or until):
+            raise NotFound(f'No equipment named "{name}"')
+        return Response({'equipment_name': name, 'count': len(points), 'results': points})
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SearchView(generics.GenericAPIView):
+    """
+    GET /api/search/?q=<words>: equipment whose name or type starts with
+    every word, one hit per dataset a unit appears in, best match first.
+    ?dataset=<id> searches a single dataset.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    pagination_class = SearchPagination
+
+    def get(self, request):
+        dataset_id = request.query_params.get('dataset')
+        try:
+            dataset_id = int(dataset_id) if dataset_id else None
+        except ValueError:
+            return Response({'error': 'dataset must be a dataset id'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            hits = search.search(request.query_params.get('q'), dataset_id)
+        except search.SearchQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        page = self.paginate_queryset(hits)
+        results = []
+        for hit, point in zip(page, trend_rows(page)):
+            result = {'equipment_name': hit['equipment_name'], **point}
+            if 'score' in hit:
+                result['score'] = hit['score']
+            results.append(result)
+        return self.get_paginated_response(results)
+
+
+class CacheStatsView(generics.GenericAPIView):
+    """Hit/miss counters of the response cache in this process, for sizing it."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({**response_cache.stats(), 'token_cache': auth.token_cache.stats()})
+
+    def delete(self, request):
+        response_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
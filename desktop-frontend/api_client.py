@@ -1,13 +1,20 @@
 import requests
 import json
 import os
+import time
+import pyarrow as pa
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
 
 class APIClient:
     BASE_URL = "http://127.0.0.1:8000/api"
     TOKEN_FILE = "auth_token.txt"
 
+    ETAG_CACHE_SIZE = 64
+
     def __init__(self):
         self.token = self.load_token()
+        self._etag_cache = {}
 
     def load_token(self):
         if os.path.exists(self.TOKEN_FILE):
@@ -21,6 +28,12 @@ class APIClient:
             f.write(token)
 
     def logout(self):
+        if self.token:
+            try:
+                # Revokes the token server-side; the local copy goes either way.
+                requests.post(f"{self.BASE_URL}/logout/", headers=self.get_headers())
+            except Exception:
+                pass
         self.token = None
         if os.path.exists(self.TOKEN_FILE):
             os.remove(self.TOKEN_FILE)
@@ -34,7 +47,7 @@ class APIClient:
     def _handle_response(self, response):
         print(f"[API] {response.request.method} {response.url} - Status: {response.status_code}")
         try:
-            if response.status_code in [200, 201]:
+            if response.status_code in [200, 201, 202]:
                 return True, response.json(), None
             elif response.status_code == 401:
                 return False, None, "Session expired. Please login again."
@@ -48,6 +61,24 @@ class APIClient:
         except Exception as e:
             return False, None, str(e)
 
+    def _conditional_get(self, url, params=None, headers=None):
+        # Dataset resources never change once ingested: send back the ETag we
+        # last saw and reuse the stored response when the server says 304.
+        headers = dict(headers or self.get_headers())
+        key = (url, tuple(sorted((params or {}).items())), headers.get("Accept"))
+        cached = self._etag_cache.get(key)
+        if cached is not None:
+            headers["If-None-Match"] = cached.headers["ETag"]
+        response = requests.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            return cached
+        if response.status_code == 200 and response.headers.get("ETag"):
+            self._etag_cache.pop(key, None)
+            self._etag_cache[key] = response
+            while len(self._etag_cache) > self.ETAG_CACHE_SIZE:
+                self._etag_cache.pop(next(iter(self._etag_cache)))
+        return response
+
     def login(self, username, password):
         try:
             url = f"{self.BASE_URL}/login/"
@@ -61,11 +92,35 @@ class APIClient:
         except Exception as e:
             return False, str(e)
 
-    def upload_dataset(self, file_path):
+    def upload_dataset(self, file_path, on_progress=None, poll_interval=0.5):
+        # The server answers 202 with an ingest job; poll it until the
+        # dataset is ready and return the job payload (with 'dataset' id).
         try:
             url = f"{self.BASE_URL}/upload/"
-            files = {'file': open(file_path, 'rb')}
-            response = requests.post(url, files=files, headers=self.get_headers())
+            with open(file_path, 'rb') as f:
+                response = requests.post(url, files={'file': f}, headers=self.get_headers())
+            success, job, error = self._handle_response(response)
+            if not success:
+                return success, job, error
+
+            while job.get('phase') not in ('done', 'failed'):
+                time.sleep(poll_interval)
+                success, job, error = self.get_job(job['id'])
+                if not success:
+                    return success, job, error
+                if on_progress:
+                    on_progress(job)
+
+            if job['phase'] == 'failed':
+                return False, None, job.get('error') or "Ingest failed"
+            return True, job, None
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_job(self, job_id):
+        try:
+            url = f"{self.BASE_URL}/jobs/{job_id}/"
+            response = requests.get(url, headers=self.get_headers())
             return self._handle_response(response)
         except Exception as e:
             return False, None, str(e)
@@ -73,7 +128,7 @@ class APIClient:
     def get_history(self):
         try:
             url = f"{self.BASE_URL}/history/"
-            response = requests.get(url, headers=self.get_headers())
+            response = self._conditional_get(url)
             print(f"[DEBUG] GET /history/ Response: {response.text[:200]}...") # Log raw response
             
             success, data, error = self._handle_response(response)
@@ -93,16 +148,129 @@ class APIClient:
         # Maps to GET /api/dataset/<id>/ which now includes summary in response
         try:
             url = f"{self.BASE_URL}/dataset/{dataset_id}/"
-            response = requests.get(url, headers=self.get_headers())
+            response = self._conditional_get(url)
             print(f"[DEBUG] GET /dataset/{dataset_id}/ Response: {response.text[:200]}...") # Log raw response
             return self._handle_response(response)
         except Exception as e:
             return False, None, str(e)
 
-    def get_dataset_report(self, dataset_id, save_path):
+    def get_dataset_records(self, dataset_id, page_size=None, cursor_url=None, **filters):
+        # Same page as get_dataset_details, but as an Arrow stream: the columns
+        # come back as NumPy arrays ready for the charts, with no JSON per row.
+        # next/previous/count/summary are JSON values in the schema metadata.
+        # Pages hold 1,000 records unless page_size says otherwise (at most
+        # 10,000); pass the previous page's "next" as cursor_url for the next.
+        try:
+            url = cursor_url or f"{self.BASE_URL}/dataset/{dataset_id}/"
+            params = None if cursor_url else dict(filters, **({"page_size": page_size} if page_size else {}))
+            headers = dict(self.get_headers(), Accept=ARROW_STREAM)
+            response = self._conditional_get(url, params=params, headers=headers)
+            if response.status_code != 200:
+                return self._handle_response(response)
+            table = pa.ipc.open_stream(response.content).read_all()
+            data = {key.decode(): json.loads(value) for key, value in (table.schema.metadata or {}).items()}
+            data['columns'] = {name: table.column(name).to_numpy() for name in table.column_names}
+            return True, data, None
+        except Exception as e:
+            return False, None, str(e)
+
+    def export_dataset_columns(self, dataset_id, **filters):
+        # Every (filtered) record of the dataset as NumPy columns, via the
+        # streamed Arrow export.
+        try:
+            url = f"{self.BASE_URL}/dataset/{dataset_id}/export/"
+            response = requests.get(url, params=dict(filters, format="arrow"), headers=self.get_headers())
+            if response.status_code != 200:
+                return self._handle_response(response)
+            table = pa.ipc.open_stream(response.content).read_all()
+            return True, {name: table.column(name).to_numpy() for name in table.column_names}, None
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_dataset_scatter(self, dataset_id, x="flowrate", y="pressure", size="temperature", max_points=2000):
+        # Server-side stratified sample, so the chart stays bounded on big datasets
+        try:
+            url = f"{self.BASE_URL}/dataset/{dataset_id}/scatter/"
+            params = {"x": x, "y": y, "size": size, "max_points": max_points}
+            response = requests.get(url, params=params, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_dataset_top(self, dataset_id, field="flowrate", n=5):
+        try:
+            url = f"{self.BASE_URL}/dataset/{dataset_id}/top/"
+            response = requests.get(url, params={"field": field, "n": n}, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_dataset_histogram(self, dataset_id, field="flowrate", bins=10):
+        try:
+            url = f"{self.BASE_URL}/dataset/{dataset_id}/histogram/"
+            response = requests.get(url, params={"field": field, "bins": bins}, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_dataset_anomalies(self, dataset_id, rule=None, page_size=None, cursor_url=None):
+        try:
+            url = cursor_url or f"{self.BASE_URL}/dataset/{dataset_id}/anomalies/"
+            params = {}
+            if not cursor_url:
+                if rule:
+                    params["rule"] = rule
+                if page_size:
+                    params["page_size"] = page_size
+            response = requests.get(url, params=params, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def compare_datasets(self, a, b, status=None, ordering=None, page=1, page_size=100):
+        try:
+            url = f"{self.BASE_URL}/compare/"
+            params = {"a": a, "b": b, "page": page, "page_size": page_size}
+            if status:
+                params["status"] = status
+            if ordering:
+                params["ordering"] = ordering
+            response = requests.get(url, params=params, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_equipment_trend(self, equipment_name, since=None, until=None):
+        try:
+            url = f"{self.BASE_URL}/equipment/{requests.utils.quote(equipment_name, safe='')}/trend/"
+            params = {key: value for key, value in (("since", since), ("until", until)) if value}
+            response = requests.get(url, params=params, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def search_equipment(self, q, dataset_id=None, page=1, page_size=20):
+        try:
+            url = f"{self.BASE_URL}/search/"
+            params = {"q": q, "page": page, "page_size": page_size}
+            if dataset_id:
+                params["dataset"] = dataset_id
+            response = requests.get(url, params=params, headers=self.get_headers())
+            return self._handle_response(response)
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_dataset_report(self, dataset_id, save_path, timeout=600):
         try:
             url = f"{self.BASE_URL}/dataset/{dataset_id}/report/"
+            deadline = time.monotonic() + timeout
             response = requests.get(url, headers=self.get_headers(), stream=True)
+            # 202 while the server is still drawing the report; poll until it's ready.
+            while response.status_code == 202 and time.monotonic() < deadline:
+                time.sleep(float(response.headers.get("Retry-After", 2)))
+                response = requests.get(url, headers=self.get_headers(), stream=True)
+            if response.status_code == 202:
+                return False, None, "Report is still being generated. Try again shortly."
             if response.status_code == 200:
                 with open(save_path, 'wb') as f:
                     for chunk in response.iter_content(chunk_size=8192):
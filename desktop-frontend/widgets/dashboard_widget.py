@@ -76,18 +76,22 @@ class DashboardWidget(QWidget):
         if not self.api_client: return
         self.lbl_title.setText(f"Loading Dataset {dataset_id}...")
         
-        success, data, error = self.api_client.get_dataset_details(dataset_id)
+        success, data, error = self.api_client.get_dataset_records(dataset_id)
         if success:
             summary = data.get('summary', {})
-            results = data.get('results', [])
-            # Fallback
-            if not summary and 'avg_flowrate' in data: summary = data
-            self.update_ui(summary, results, dataset_id)
+            columns = data.get('columns', {})
+            ok, scatter, _ = self.api_client.get_dataset_scatter(dataset_id)
+            ok_top, top, _ = self.api_client.get_dataset_top(dataset_id)
+            ok_hist, hist, _ = self.api_client.get_dataset_histogram(dataset_id)
+            self.update_ui(summary, columns, dataset_id,
+                           scatter if ok else None,
+                           top.get('results') if ok_top else None,
+                           hist if ok_hist else None)
         else:
             self.lbl_title.setText("Error Loading Dataset")
             QMessageBox.warning(self, "Error", f"Failed: {error}")
 
-    def update_ui(self, summary, results, dataset_id):
+    def update_ui(self, summary, columns, dataset_id, scatter=None, top=None, histogram=None):
         count_val = str(summary.get('count', '--'))
         self.lbl_title.setText(f"CHEMICAL VIZ PRO: ID {dataset_id} • {count_val} UNITS")
         
@@ -113,15 +117,29 @@ class DashboardWidget(QWidget):
         ax1.set_facecolor(bg_color)
         ax1.set_title("PERFORMANCE CLUSTERS (Flow vs Pressure)", color='#f8fafc', fontsize=10, pad=10, loc='left')
         
-        if results:
-            x = [r.get('flowrate', 0) for r in results]
-            y = [r.get('pressure', 0) for r in results]
-            sizes = [(r.get('temperature', 0) / 10) * 10 for r in results] # Scale size by temp
+        # Prefer the server-side sample (bounded size, covers the whole dataset)
+        if scatter and scatter.get('points'):
+            points = scatter['points']
+        elif columns:
+            # Record columns (NumPy arrays) from the Arrow page
+            points = {
+                'x': columns['flowrate'],
+                'y': columns['pressure'],
+                'size': columns['temperature'],
+                'type': columns['type'],
+            }
+        else:
+            points = None
+
+        if points and len(points['x']):
+            x = points['x']
+            y = points['y']
+            sizes = [(t / 10) * 10 for t in points.get('size', [100] * len(x))] # Scale size by temp
             
             # Simple color mapping by type
-            types = list(set([r.get('type') for r in results]))
+            types = sorted(set(points['type']))
             colors_map = ['#38bdf8', '#818cf8', '#c084fc', '#f472b6', '#e879f9']
-            c = [colors_map[types.index(r.get('type')) % len(colors_map)] for r in results]
+            c = [colors_map[types.index(t) % len(colors_map)] for t in points['type']]
             
             ax1.scatter(x, y, s=sizes, c=c, alpha=0.7, edgecolors='none')
             ax1.set_xlabel("Flowrate (L/min)", color=text_color, fontsize=8)
@@ -137,8 +155,12 @@ class DashboardWidget(QWidget):
         ax2.set_facecolor(bg_color)
         ax2.set_title("TOP FLOWRATE (L/min)", color='#f8fafc', fontsize=10, pad=10, loc='left')
         
-        if results:
-            sorted_res = sorted(results, key=lambda x: x.get('flowrate', 0), reverse=True)[:5]
+        if top is None and columns:
+            order = columns['flowrate'].argsort()[::-1][:5]
+            top = [{'equipment_name': columns['equipment_name'][i], 'flowrate': columns['flowrate'][i]} for i in order]
+
+        if top:
+            sorted_res = top
             names = [x.get('equipment_name', '?') for x in sorted_res]
             val_flow = [x.get('flowrate', 0) for x in sorted_res]
             y_pos = range(len(names))
@@ -186,9 +208,14 @@ class DashboardWidget(QWidget):
         ax4.set_facecolor(bg_color)
         ax4.set_title("FLOW DISTRIBUTION", color='#f8fafc', fontsize=10, pad=10, loc='left')
         
-        if results:
-            flows = [r.get('flowrate', 0) for r in results]
-            ax4.hist(flows, bins=10, color='#22d3ee', alpha=0.7, rwidth=0.85)
+        if histogram and histogram.get('counts'):
+            # Pre-binned on the server over the whole dataset
+            edges = histogram['edges']
+            ax4.hist(edges[:-1], bins=edges, weights=histogram['counts'], color='#22d3ee', alpha=0.7, rwidth=0.85)
+            ax4.tick_params(colors=text_color, labelsize=8)
+            for spine in ax4.spines.values(): spine.set_edgecolor('#334155')
+        elif columns:
+            ax4.hist(columns['flowrate'], bins=10, color='#22d3ee', alpha=0.7, rwidth=0.85)
             ax4.tick_params(colors=text_color, labelsize=8)
             for spine in ax4.spines.values(): spine.set_edgecolor('#334155')
 
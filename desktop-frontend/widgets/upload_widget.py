@@ -3,6 +3,7 @@ from PyQt5.QtCore import Qt, QThread, pyqtSignal
 
 class UploadThread(QThread):
     finished = pyqtSignal(bool, object, str) # success, data, error
+    progress = pyqtSignal(object) # ingest job status
 
     def __init__(self, api_client, file_path):
         super().__init__()
@@ -10,7 +11,7 @@ class UploadThread(QThread):
         self.file_path = file_path
 
     def run(self):
-        success, data, error = self.api_client.upload_dataset(self.file_path)
+        success, data, error = self.api_client.upload_dataset(self.file_path, on_progress=self.progress.emit)
         self.finished.emit(success, data, str(error) if error else "")
 
 class UploadWidget(QWidget):
@@ -70,14 +71,18 @@ class UploadWidget(QWidget):
         
         self.thread = UploadThread(self.api_client, filename)
         self.thread.finished.connect(self.on_upload_finished)
+        self.thread.progress.connect(self.on_upload_progress)
         self.thread.start()
 
+    def on_upload_progress(self, job):
+        self.label.setText(f"{job.get('phase', '').title()}: {job.get('rows_processed', 0):,} rows")
+
     def on_upload_finished(self, success, data, error):
         self.progress_bar.setVisible(False)
         self.btn_upload.setEnabled(True)
         
         if success:
-            dataset_id = data.get('id')
+            dataset_id = data.get('dataset')
             self.label.setText("Upload Successful!")
             self.uploadSuccess.emit(dataset_id)
         else:
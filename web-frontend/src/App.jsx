@@ -6,6 +6,7 @@ import Dashboard from './components/Dashboard';
 import Sidebar from './components/Sidebar';
 import UserManagement from './components/UserManagement';
 import styles from './App.module.css';
+import { api } from './api';
 
 const App = () => {
   const [token, setToken] = useState(localStorage.getItem('token'));
@@ -30,6 +31,7 @@ const App = () => {
   };
 
   const handleLogout = () => {
+    api.logout().catch(() => {});
     setToken(null);
     setIsAdmin(false);
     localStorage.removeItem('token');
@@ -46,6 +46,8 @@ client.interceptors.response.use(
 
 export const api = {
     login: (username, password) => client.post('/login/', { username, password }),
+    // The header is read now: the caller clears the stored token right after.
+    logout: () => client.post('/logout/', null, { headers: { Authorization: `Token ${localStorage.getItem('token')}` } }),
 
     uploadDataset: (file, onUploadProgress) => {
         const formData = new FormData();
@@ -56,14 +58,34 @@ export const api = {
         });
     },
 
+    // Upload returns 202 with an ingest job; poll it until phase is done/failed
+    getJob: (id) => client.get(`/jobs/${id}/`),
+
     getHistory: () => client.get('/history/'),
 
-    // Dataset Detail now returns { count, next, results: [records], summary: {...} }
-    getDatasetDetail: (id, page = 1) => client.get(`/dataset/${id}/?page=${page}`),
+    // Dataset Detail returns { next, previous, results: [records], count, summary } for the
+    // first page of records (1,000 by default, ?page_size= up to 10,000). Later pages:
+    // getDatasetPage(response.data.next), whose cursor link already holds the filters.
+    getDatasetDetail: (id, params = {}) => client.get(`/dataset/${id}/`, { params }),
+    getDatasetPage: (nextUrl) => client.get(nextUrl),
 
     getDatasetSummary: (id) => client.get(`/dataset/${id}/summary/`),
 
-    getDatasetReport: (id) => client.get(`/dataset/${id}/report/`, { responseType: 'blob' }),
+    getDatasetAnomalies: (id, params = {}) => client.get(`/dataset/${id}/anomalies/`, { params }),
+    compareDatasets: (a, b, params = {}) => client.get('/compare/', { params: { a, b, ...params } }),
+
+    getEquipmentTrend: (name, params = {}) => client.get(`/equipment/${encodeURIComponent(name)}/trend/`, { params }),
+    searchEquipment: (q, params = {}) => client.get('/search/', { params: { q, ...params } }),
+
+    // The server answers 202 with progress until the PDF is ready.
+    getDatasetReport: async (id) => {
+        for (;;) {
+            const response = await client.get(`/dataset/${id}/report/`, { responseType: 'blob' });
+            if (response.status !== 202) return response;
+            const wait = Number(response.headers['retry-after'] || 2) * 1000;
+            await new Promise((resolve) => setTimeout(resolve, wait));
+        }
+    },
 
     // User Management (Admin Only)
     getUsers: () => client.get('/users/'),
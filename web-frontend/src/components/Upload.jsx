@@ -59,8 +59,15 @@ const Upload = ({ onUploadSuccess }) => {
             await new Promise(r => setTimeout(r, 800));
 
             const response = await api.uploadDataset(file);
-            const data = response.data;
-            const id = data.id || data.results?.id;
+            let job = response.data;
+            while (job.phase !== 'done' && job.phase !== 'failed') {
+                await new Promise(r => setTimeout(r, 500));
+                job = (await api.getJob(job.id)).data;
+            }
+            if (job.phase === 'failed') {
+                throw new Error(job.error);
+            }
+            const id = job.dataset;
 
             setSuccessMsg("DATASET INGESTED SUCCESSFULLY");
             setTimeout(() => {